@@ -0,0 +1,186 @@
+from models import *
+from horizon import RollingHorizonPlanner
+from calendar import monthrange
+from columnar import columnar
+import argparse
+import contextlib
+import io
+import json
+import math
+import random
+import sys
+import time
+
+PHASES = ("schedule_pat", "schedule_remaining_shift4", "schedule_remaining_shifts")
+PHASE_HEADERS = ("PAT (s)", "Shift 4 (s)", "Day shifts (s)")
+DEFAULT_SIZES = (10, 25, 50, 100, 250, 500)
+DEFAULT_MONTHS = (1, 3, 12)
+
+def generate_roster(num_doctors, start_year, start_month, num_months=1, seed=0, night_specialists=1):
+    """
+    Build a seeded, realistic-looking roster for benchmarks and tests.
+
+    The first night_specialists doctors work nights only (the first of them is PAT); the rest get varied
+    shift preferences, a few requested days off per month (or, for flip_shifts part-timers, a few days
+    they can work), and min / max shifts sized so the roster roughly covers four shifts a day.
+
+    Args:
+        num_doctors (int): Number of doctors, night specialists included.
+        start_year (int): Year of the first month.
+        start_month (int): First month (1-12).
+        num_months (int): Number of months to generate days off for.
+        seed (int): Random seed; the same arguments always give the same roster.
+        night_specialists (int): Number of night-only doctors.
+
+    Returns:
+        list: List of Doctor objects.
+    """
+    rng = random.Random(seed)
+    months = [divmod(start_month - 1 + offset, 12) for offset in range(num_months)]
+    month_days = [
+        [date(start_year + year, month + 1, day) for day in range(1, monthrange(start_year + year, month + 1)[1] + 1)]
+        for year, month in months
+    ]
+    share = 4 * 30 / max(1, num_doctors - night_specialists)  # average shifts per doctor per month
+
+    doctors = []
+    for i in range(num_doctors):
+        if i < night_specialists:
+            doctor = Doctor(
+                name="PAT" if i == 0 else f"Nocturnist {i}",
+                days_off={day for days in month_days for day in rng.sample(days, rng.randint(0, 6))},
+                shift_prefs=[0, 0, 0, 5],
+                min_shifts=12,
+                max_shifts=16,
+                flip_shifts=False,
+                doc_type="Nocturnist",
+            )
+            doctors.append(doctor)
+            continue
+
+        flip_shifts = rng.random() < 0.15
+        days_off = set()
+        for days in month_days:
+            if flip_shifts:  # part-timers list the few days they can work
+                days_off |= set(days) - set(rng.sample(days, rng.randint(4, 10)))
+            else:
+                days_off |= set(rng.sample(days, rng.randint(0, 8)))
+        min_shifts = max(1, round(share * rng.uniform(0.5, 0.9)))
+        doctor = Doctor(
+            name=f"Doctor {i}",
+            days_off=days_off,
+            shift_prefs=[rng.choice((0, 1, 2, 3, 4, 5, 5)) for _ in range(3)] + [rng.choice((0, 0, 1, 2, 3, 4, 5))],
+            min_shifts=min_shifts,
+            max_shifts=min_shifts + max(1, round(share * rng.uniform(0.3, 0.8))),
+            flip_shifts="Yes" if flip_shifts else False,
+            doc_type="Part Time" if flip_shifts else "Full Time",
+        )
+        doctors.append(doctor)
+
+    # Nights at the end of the previous month: PAT on a run, another doctor on the last night
+    first_day = month_days[0][0]
+    doctors[0].previous_month_shifts = [(first_day - timedelta(days=n), 4) for n in (3, 2)]
+    if num_doctors > night_specialists:
+        doctors[night_specialists].previous_month_shifts = [(first_day - timedelta(days=1), 4)]
+    return doctors
+
+class BenchmarkPlanner(RollingHorizonPlanner):
+    def __init__(self, *args, **kwargs):
+        """
+        RollingHorizonPlanner that schedules each month the way main.py does and times every phase.
+        """
+        super().__init__(*args, **kwargs)
+        self.phase_times = dict.fromkeys(PHASES, 0.0)
+
+    def solve(self, scheduler):
+        scheduler.initialize_consecutive_shifts_from_previous_month()
+        for phase in PHASES:
+            start = time.perf_counter()
+            if phase == "schedule_remaining_shifts":
+                scheduler.schedule_remaining_shifts(self.num_shifts)
+            else:
+                getattr(scheduler, phase)()
+            self.phase_times[phase] += time.perf_counter() - start
+
+def run_benchmark(num_doctors, num_months, seed=0, num_shifts=4, start_year=2024, start_month=1):
+    """
+    Schedule a generated roster over a number of months and time each scheduling phase.
+
+    Returns:
+        dict: Sizes, seconds per phase, total seconds, and shifts filled per second.
+    """
+    doctors = generate_roster(num_doctors, start_year, start_month, num_months, seed)
+    planner = BenchmarkPlanner(doctors, start_year, start_month, num_months, num_shifts=num_shifts)
+    with contextlib.redirect_stdout(io.StringIO()):  # unfilled shift warnings
+        calendars = planner.run()
+
+    filled = sum(1 for calendar in calendars for cal_day in calendar for doctor in cal_day.shifts.values() if doctor)
+    total = sum(planner.phase_times.values())
+    return {
+        "doctors": num_doctors,
+        "months": num_months,
+        "seed": seed,
+        **{phase: round(seconds, 6) for phase, seconds in planner.phase_times.items()},
+        "total": round(total, 6),
+        "shifts_filled": filled,
+        "shifts_per_second": round(filled / total, 1) if total else None,
+    }
+
+def scaling_exponents(results):
+    """
+    Fit total time ~ doctors^k for each number of months (least squares on the log-log points).
+
+    Returns:
+        dict: Months -> exponent k (1 means linear in the number of doctors).
+    """
+    exponents = {}
+    for months in sorted({result["months"] for result in results}):
+        points = [(math.log(r["doctors"]), math.log(r["total"])) for r in results if r["months"] == months and r["total"] > 0]
+        if len({x for x, y in points}) < 2:
+            continue
+        mean_x = sum(x for x, y in points) / len(points)
+        mean_y = sum(y for x, y in points) / len(points)
+        slope = sum((x - mean_x) * (y - mean_y) for x, y in points) / sum((x - mean_x) ** 2 for x, y in points)
+        exponents[months] = round(slope, 2)
+    return exponents
+
+def run_suite(sizes=DEFAULT_SIZES, months=DEFAULT_MONTHS, seed=0, repeat=1, num_shifts=4):
+    """
+    Run every (doctors, months) combination, keeping the fastest of repeat runs.
+
+    Returns:
+        list: One run_benchmark result per combination.
+    """
+    results = []
+    for num_months in months:
+        for num_doctors in sizes:
+            runs = [run_benchmark(num_doctors, num_months, seed, num_shifts) for _ in range(repeat)]
+            results.append(min(runs, key=lambda result: result["total"]))
+    return results
+
+def print_report(results):
+    headers = ["Doctors", "Months"] + list(PHASE_HEADERS) + ["Total (s)", "Shifts/s"]
+    rows = [[r["doctors"], r["months"]] + [f"{r[phase]:.4f}" for phase in PHASES] + [f"{r['total']:.4f}", r["shifts_per_second"]]
+            for r in results]
+    print(columnar(rows, headers, no_borders=True))
+    for months, exponent in scaling_exponents(results).items():
+        print(f"{months} month(s): total time grows like doctors^{exponent}")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Time the scheduler on generated rosters.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=list(DEFAULT_SIZES), help="roster sizes (doctors)")
+    parser.add_argument("--months", type=int, nargs="+", default=list(DEFAULT_MONTHS), help="horizon lengths (months)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--repeat", type=int, default=1, help="runs per combination (the fastest is kept)")
+    parser.add_argument("--num-shifts", type=int, choices=[3, 4], default=4)
+    parser.add_argument("--json", help="also write the results to this JSON file")
+    args = parser.parse_args(sys.argv[1:] if argv is None else argv)
+
+    results = run_suite(args.sizes, args.months, args.seed, args.repeat, args.num_shifts)
+    print_report(results)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"results": results, "scaling": scaling_exponents(results)}, f, indent=2)
+
+if __name__ == "__main__":
+    main()
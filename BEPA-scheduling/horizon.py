@@ -0,0 +1,133 @@
+from models import *
+from scheduler import Scheduler
+from calendar import monthrange
+
+CARRY_OVER_DAYS = 4  # days of the previous month each month sees, as load_previous_month_shifts reads them
+
+class RollingHorizonPlanner:
+    def __init__(self, doctors, start_year, start_month, num_months, num_shifts=4, mode="greedy",
+                 time_limit=10.0, improve_time=0, last_shift4_doctor=None, lookahead_days=0):
+        """
+        Schedule several consecutive months in one go, carrying the end of each month into the next in memory.
+
+        Each month is solved with Scheduler.solve. Before it starts, every doctor's previous_month_shifts is
+        rebuilt from the months already planned (so night specialists' clusters and rest days continue
+        across the boundary), the last other doctor to work a 4 shift is handed on, and the night shifts
+        each doctor has worked so far are given to the shift 4 planner so nights stay fair over the whole horizon.
+
+        With lookahead_days set, each month is solved together with the first days of the next month and
+        only its own days are kept; the next month then re-plans those days with the real carry-over.
+        The lookahead days are part of the same Scheduler, so shifts planned on them count toward each
+        doctor's min_shifts and max_shifts for the month. A month never goes over max_shifts because of
+        this, but a doctor may end it with fewer shifts of its own than min_shifts asks for.
+
+        Args:
+            doctors (list): List of Doctor objects. days_off may hold dates in any of the months, and the
+                first month starts from their previous_month_shifts.
+            start_year (int): Year of the first month.
+            start_month (int): First month to schedule (1-12).
+            num_months (int): Number of consecutive months to schedule.
+            num_shifts (int): Number of shifts per day (3 or 4).
+            mode (str): Scheduling mode passed to Scheduler.solve ("greedy" or "cp").
+            time_limit (float): Seconds the "cp" search may spend on each month.
+            improve_time (float): Seconds of improve_schedule to run on each month (0 to skip).
+            last_shift4_doctor (str): Doctor (other than a night specialist) who most recently worked a 4 shift before the
+                first month, if its previous_month_shifts don't say.
+            lookahead_days (int): Days of the following month to plan along with each month. Shifts on
+                these days count toward the month's min_shifts and max_shifts while it is solved.
+        """
+        self.doctors = doctors
+        self.start_year = start_year
+        self.start_month = start_month
+        self.num_months = num_months
+        self.num_shifts = num_shifts
+        self.mode = mode
+        self.time_limit = time_limit
+        self.improve_time = improve_time
+        self.last_shift4_doctor = last_shift4_doctor
+        self.lookahead_days = lookahead_days
+
+        # Every shift kept so far, per doctor, across the whole horizon
+        self.ledgers = {doctor: ShiftLedger() for doctor in doctors}
+        self.calendars = []
+
+    def months(self):
+        """
+        Yield (year, month) for each month of the horizon in order.
+        """
+        for offset in range(self.num_months):
+            year, month = divmod(self.start_month - 1 + offset, 12)
+            yield self.start_year + year, month + 1
+
+    def run(self):
+        """
+        Schedule every month of the horizon.
+
+        Returns:
+            list: One calendar (list of CalDay objects) per month.
+        """
+        for year, month in self.months():
+            self.calendars.append(self.schedule_month(year, month))
+        return self.calendars
+
+    def schedule_month(self, year, month):
+        """
+        Schedule one month from the state the previous months left behind, and keep its shifts.
+        The solve covers the month plus lookahead_days, and every shift in that window counts toward
+        the doctors' min_shifts and max_shifts; only the month's own days are kept.
+
+        Returns:
+            list: The month's calendar.
+        """
+        num_days = monthrange(year, month)[1]
+        first_day = date(year, month, 1)
+        window = [CalDay(first_day + timedelta(days=i)) for i in range(num_days + self.lookahead_days)]
+
+        if self.calendars:
+            self.carry_over(first_day)
+        self.reset_counters()
+
+        scheduler = Scheduler(self.doctors, window, self.last_shift4_doctor, interactive=False)
+        scheduler.prior_night_shifts = {
+            doctor: sum(1 for shift_types in ledger.shifts.values() if "s4" in shift_types)
+            for doctor, ledger in self.ledgers.items()
+        }
+        self.solve(scheduler)
+
+        calendar = window[:num_days]
+        for cal_day in calendar:
+            for shift_type, doctor in cal_day.shifts.items():
+                if doctor:
+                    self.ledgers.setdefault(doctor, ShiftLedger()).record(cal_day.date, shift_type)
+                    if shift_type == "s4" and not doctor.is_night_specialist:
+                        self.last_shift4_doctor = doctor.name
+        return calendar
+
+    def solve(self, scheduler):
+        """
+        Fill one month's scheduler (override to change how each month is scheduled).
+        """
+        scheduler.solve(self.num_shifts, self.mode, self.time_limit, self.improve_time)
+
+    def carry_over(self, first_day):
+        """
+        Rebuild every doctor's previous_month_shifts from the kept shifts just before first_day,
+        in the same (date, shift number) form load_previous_month_shifts produces.
+        """
+        carried_days = [first_day - timedelta(days=i) for i in range(CARRY_OVER_DAYS, 0, -1)]
+        for doctor in self.doctors:
+            ledger = self.ledgers[doctor]
+            doctor.previous_month_shifts = [
+                (day, int(shift_type[1])) for day in carried_days for shift_type in sorted(ledger.shift_types_on(day))
+            ]
+
+    def reset_counters(self):
+        """
+        Zero the per-month shift counters before a month is scheduled.
+        """
+        for doctor in self.doctors:
+            doctor.total_shifts = 0
+            doctor.night_shifts = 0
+            doctor.weekend_shifts = 0
+            doctor.last_shift_date = datetime.min.date()
+            doctor.initialize_consecutive_shifts()
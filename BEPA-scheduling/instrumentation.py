@@ -0,0 +1,135 @@
+from collections import Counter
+from contextlib import contextmanager
+import cProfile
+import functools
+import json
+import pstats
+import time
+
+class Instrumentation:
+    def __init__(self, profile=False):
+        """
+        Collects timings, counters and diagnostic events from a Scheduler run.
+
+        Attach one with Scheduler(..., instrumentation=Instrumentation()). A Scheduler without one skips
+        every hook after a single None check, so leaving it off costs nothing.
+
+        Args:
+            profile (bool): Also run cProfile over every timed phase.
+        """
+        self.timers = Counter()      # phase -> seconds
+        self.calls = Counter()       # phase -> times entered
+        self.counters = Counter()    # e.g. candidates examined, shift 4 retries
+        self.rejections = Counter()  # reason -> candidates rejected for it
+        self.events = []             # e.g. unfilled shifts, with why nobody was available
+        self.profiler = cProfile.Profile() if profile else None
+        self.depth = 0
+
+        # Candidates still in the running during the current availability check, and why the others dropped out
+        self.remaining = 0
+        self.last_rejections = {}
+
+    @contextmanager
+    def phase(self, name):
+        """
+        Time a block of work under the given phase name (nested phases are timed separately).
+        """
+        self.calls[name] += 1
+        if self.profiler and not self.depth:
+            self.profiler.enable()
+        self.depth += 1
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.timers[name] += time.perf_counter() - start
+            self.depth -= 1
+            if self.profiler and not self.depth:
+                self.profiler.disable()
+
+    def count(self, name, n=1):
+        self.counters[name] += n
+
+    def start_filter(self, candidates):
+        """
+        Begin an availability check over the given number of candidates.
+        """
+        self.counters["candidates_examined"] += candidates
+        self.remaining = candidates
+        self.last_rejections = {}
+
+    def filter_step(self, reason, remaining):
+        """
+        Record how many candidates the last availability rule rejected.
+
+        Args:
+            reason (str): The rule that was just applied.
+            remaining (int): Candidates still available after it.
+        """
+        rejected = self.remaining - remaining
+        if rejected:
+            self.rejections[reason] += rejected
+            self.last_rejections[reason] = rejected
+        self.remaining = remaining
+
+    def record(self, event, **details):
+        """
+        Keep a diagnostic event, e.g. record("unfilled_shift", date="2024-01-05", shift="s2").
+        """
+        self.events.append({"event": event, **details})
+
+    def profile_stats(self, limit=25):
+        """
+        Returns:
+            list: The functions with the most cumulative time in the profiled phases, as dicts.
+        """
+        if not self.profiler:
+            return []
+        stats = pstats.Stats(self.profiler)
+        rows = sorted(stats.stats.items(), key=lambda item: item[1][3], reverse=True)[:limit]
+        return [
+            {
+                "function": f"{filename}:{line}({name})",
+                "calls": calls,
+                "total_time": round(total_time, 6),
+                "cumulative_time": round(cumulative_time, 6),
+            }
+            for (filename, line, name), (primitive_calls, calls, total_time, cumulative_time, callers) in rows
+        ]
+
+    def to_dict(self):
+        return {
+            "timers": {name: round(seconds, 6) for name, seconds in self.timers.items()},
+            "calls": dict(self.calls),
+            "counters": dict(self.counters),
+            "rejections": dict(self.rejections),
+            "events": self.events,
+            "profile": self.profile_stats(),
+        }
+
+    def to_json(self, path=None):
+        """
+        Export everything collected as JSON.
+
+        Args:
+            path (str): File to write to; if None the JSON text is returned instead.
+        """
+        text = json.dumps(self.to_dict(), indent=2, default=str)
+        if path is None:
+            return text
+        with open(path, "w") as f:
+            f.write(text)
+
+def timed_phase(name):
+    """
+    Decorator for Scheduler methods: time the call as a phase when the scheduler has instrumentation.
+    """
+    def decorator(method):
+        @functools.wraps(method)
+        def wrapper(self, *args, **kwargs):
+            if self.instrumentation is None:
+                return method(self, *args, **kwargs)
+            with self.instrumentation.phase(name):
+                return method(self, *args, **kwargs)
+        return wrapper
+    return decorator
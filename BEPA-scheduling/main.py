@@ -1,13 +1,20 @@
 from utils import *
 from scheduler import *
 from models import *
+from instrumentation import Instrumentation
 import sys
 from calendar import monthrange
+import argparse
+import json
 import os
+import shutil
 
-def main():
+def clear_screen(interactive=True):
+    if interactive:
+        os.system('cls' if os.name == 'nt' else 'clear')
 
-    os.system('cls' if os.name == 'nt' else 'clear')
+def prompt_agreement():
+    clear_screen()
     inp1 = input("Tu eres garbajo que muerte para dinero. Type 'yes' to agree with this statement: ")
     while inp1.lower().strip() != "yes":
         print()
@@ -15,67 +22,180 @@ def main():
         inp1 = input("Tu eres garbajo que muerte para dinero. Type 'yes' to agree with this statement: ")
     print()
     inp1 = input("Glad you agree. Now that that's settled, let's get to scheduling. Press enter to continue: ")
-    os.system('cls' if os.name == 'nt' else 'clear')
-    print("Loading inputs...")
-
-    filepath = os.path.abspath(sys.argv[1]) #path to Excel file
-    month, year = load_month_and_year(filepath) #load in month and year as ints
-    
-    doctors = load_doctor_inputs(filepath) #load in doctor inputs (Name, Doc Type, Min / Max Shifts, Shift Prefs, Flip Shifts)
-    load_shifts_requested_off(filepath, doctors, month, year)
-    load_previous_month_shifts(filepath, doctors, month, year)
-    #print_doctor_info(doctors)
+    clear_screen()
 
-    num_days = monthrange(year, month)[1]
-    calendar = [CalDay(date(year, month, day)) for day in range(1, num_days+1)]
-    scheduler = Scheduler(doctors, calendar)
-    scheduler.initialize_consecutive_shifts_from_previous_month()
-    clear_scheduled_shifts(filepath)
-
-    os.system('cls' if os.name == 'nt' else 'clear')
+def prompt_new_schedule():
+    clear_screen()
     inp = input("Type 'Y' to make a new schedule from scratch, and type 'N' to only schedule the day shifts: ").strip().upper()
     while inp != "Y" and inp != "N":
         inp = input("Geoff, you ignorant slut. Type 'Y' to make a new schedule from scratch, and type 'N' to only schedule the day shifts: ").strip().upper()
+    return inp == "Y"
 
-    if inp == "Y":
-        scheduler.schedule_pat()
-        scheduler.schedule_remaining_shift4()
-        write_scheduled_shifts(filepath, calendar, month, year)
-        # Load manually adjusted 4-shifts from Excel before scheduling
-        inp = input("When you're done setting the night shifts, save and close out of the Excel document. Press enter when you are ready to continue, you abominable nincompoop: ")
-    
-    os.system('cls' if os.name == 'nt' else 'clear')
-    read_manual_shift4_assignments(filepath, calendar, doctors, month, year,scheduler)
-    #print_calendar(calendar)
-    #debug_print_doctor_shifts(doctors)
-
+def prompt_num_shifts():
     # Ask user how many shifts they want to schedule per day
     while True:
         try:
             num_shifts = int(input("How many shifts should be scheduled per day? (Enter 3 or 4): "))
             if num_shifts in [3, 4]:
-                break
+                return num_shifts
             else:
-                os.system('cls' if os.name == 'nt' else 'clear')
+                clear_screen()
                 print("Honestly Geoff, how could you screw this up? Enter 3 or 4. It's not that hard.")
                 print()
         except ValueError:
-            os.system('cls' if os.name == 'nt' else 'clear')
+            clear_screen()
             print("Honestly Geoff, how could you screw this up? Enter 3 or 4. It's not that hard.")
             print()
 
+def run_schedule(filepath, new_schedule=None, num_shifts=None, last_shift4_doctor=None, interactive=True,
+                 mode="greedy", time_limit=10.0, improve_time=0, engine=None, output_path=None, instrumentation=None):
+    """
+    Schedule one month from an Excel workbook and write the result back into it.
+
+    Any answer left as None is asked for at the keyboard when interactive is True. With interactive set to
+    False nothing blocks: there is no screen clearing, no pause to review the night shifts and Excel is never
+    opened, so many months or sites can be run one after another in the same process.
+
+    Args:
+        filepath (str): Path to the Excel workbook.
+        new_schedule (bool): True to schedule night shifts from scratch, False to only schedule the day shifts
+            around the night shifts already in the workbook.
+        num_shifts (int): Number of shifts to schedule per day (3 or 4).
+        last_shift4_doctor (str): Doctor (other than a night specialist) who most recently worked a 4 shift, if the previous
+            month's shifts don't say.
+        interactive (bool): Whether to prompt for missing answers and pause for the night shift review.
+        mode (str): Day shift scheduler, "greedy" or "cp" (see Scheduler.solve).
+        time_limit (float): Seconds the "cp" search may spend improving its first solution.
+        improve_time (float): Seconds of Scheduler.improve_schedule to run on the day shifts (0 to skip).
+        engine (str): How the workbook is read and cleared, "xlwings" (live Excel) or "openpyxl" (file only).
+        output_path (str): Write the schedule to a copy of the workbook at this path, so filepath is only read.
+            Required with the openpyxl engine, whose saves drop the formula results the next run reads.
+        instrumentation (Instrumentation): Optional collector of timings and diagnostics for both schedulers.
+
+    Returns:
+        list: The calendar with the finished schedule.
+    """
+    if not interactive and (new_schedule is None or num_shifts is None):
+        raise ValueError("new_schedule and num_shifts are required when running non-interactively")
+    if num_shifts is not None and num_shifts not in (3, 4):
+        raise ValueError(f"num_shifts must be 3 or 4, not {num_shifts}")
+    if (engine or DEFAULT_EXCEL_ENGINE) == "openpyxl" and not output_path:
+        raise ValueError("output_path is required with the openpyxl engine, which can't save the workbook's formula results")
+
+    print("Loading inputs...")
+    filepath = os.path.abspath(filepath) #path to Excel file
+    if output_path:
+        output_path = os.path.abspath(output_path)
+        shutil.copyfile(filepath, output_path) #every later write (and the night shift review) goes to the copy
+    inputs = load_workbook_inputs(filepath, engine) #read the workbook once and load everything from memory
+    month, year = load_month_and_year(inputs) #load in month and year as ints
+
+    doctors = load_doctor_inputs(inputs) #load in doctor inputs (Name, Doc Type, Min / Max Shifts, Shift Prefs, Flip Shifts)
+    load_shifts_requested_off(inputs, doctors, month, year)
+    load_previous_month_shifts(inputs, doctors, month, year)
+    #print_doctor_info(doctors)
+
+    num_days = monthrange(year, month)[1]
+    calendar = [CalDay(date(year, month, day)) for day in range(1, num_days+1)]
+    scheduler = Scheduler(doctors, calendar, last_shift4_doctor, interactive, instrumentation)
+    scheduler.initialize_consecutive_shifts_from_previous_month()
+    workbook_path = output_path or filepath
+    clear_scheduled_shifts(workbook_path, engine)
+
+    if new_schedule is None:
+        new_schedule = prompt_new_schedule()
+
+    if new_schedule:
+        scheduler.schedule_pat()
+        scheduler.schedule_remaining_shift4()
+        # Load manually adjusted 4-shifts from Excel before scheduling
+        if interactive:
+            # Batch runs skip the review, and their night shifts are written with the day shifts at the end
+            write_scheduled_shifts(workbook_path, calendar, month, year, open_file=True)
+            input("When you're done setting the night shifts, save and close out of the Excel document. Press enter when you are ready to continue, you abominable nincompoop: ")
+
+    clear_screen(interactive)
+    if not new_schedule:
+        # The night shifts already in the workbook were loaded with the other inputs
+        read_manual_shift4_assignments(inputs, calendar, doctors, month, year, scheduler)
+    elif interactive:
+        # Re-read the workbook to pick up the night shifts adjusted by hand
+        read_manual_shift4_assignments(workbook_path, calendar, doctors, month, year, scheduler)
+    #print_calendar(calendar)
+    #debug_print_doctor_shifts(doctors)
+
+    if num_shifts is None:
+        num_shifts = prompt_num_shifts()
+
     # Initialize scheduler and schedule shifts
-    os.system('cls' if os.name == 'nt' else 'clear')
-    scheduler = Scheduler(doctors, calendar)
+    clear_screen(interactive)
+    scheduler = Scheduler(doctors, calendar, last_shift4_doctor, interactive, instrumentation)
     scheduler.initialize_consecutive_shifts_from_previous_month()
-    scheduler.schedule_remaining_shifts(num_shifts)
+    if mode == "cp":
+        shift_types = scheduler.configure_day_shifts(num_shifts)
+        scheduler.solve_open_shifts(shift_types, time_limit)
+    else:
+        scheduler.schedule_remaining_shifts(num_shifts)
+    if improve_time > 0:
+        scheduler.improve_schedule(shift_types=scheduler.configure_day_shifts(num_shifts), time_limit=improve_time)
    #print_calendar(calendar)
 
-    os.system('cls' if os.name == 'nt' else 'clear')
-    print("All done, ya filthy animal. Be glad you have a son who is as brilliant as I am. And don't forget: tu eres garbajo que muerte para dinero.")
-    print()
-    inp = input("Press enter to view the final schedule: ")
-    write_scheduled_shifts(filepath, calendar, month, year)
+    if interactive:
+        clear_screen()
+        print("All done, ya filthy animal. Be glad you have a son who is as brilliant as I am. And don't forget: tu eres garbajo que muerte para dinero.")
+        print()
+        input("Press enter to view the final schedule: ")
+    write_scheduled_shifts(workbook_path, calendar, month, year, open_file=interactive)
+    return calendar
+
+def load_run_config(path):
+    """
+    Load run options from a JSON config file, e.g.
+    {"new_schedule": true, "num_shifts": 4, "last_shift4_doctor": "ABC", "mode": "cp"}.
+
+    Returns:
+        dict: Keyword arguments for run_schedule.
+    """
+    with open(path) as f:
+        return json.load(f)
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description="Build the monthly BEPA schedule in an Excel workbook.")
+    parser.add_argument("filepath", nargs="+", help="Excel workbook(s) to schedule; several run one after another")
+    parser.add_argument("--config", help="JSON file with run options (command-line flags take precedence)")
+    parser.add_argument("--non-interactive", action="store_true", help="never prompt, pause, clear the screen or open Excel")
+    parser.add_argument("--new-schedule", dest="new_schedule", action="store_true", default=None, help="schedule night shifts from scratch")
+    parser.add_argument("--day-shifts-only", dest="new_schedule", action="store_false", help="keep the workbook's night shifts")
+    parser.add_argument("--num-shifts", type=int, choices=[3, 4], help="shifts to schedule per day")
+    parser.add_argument("--last-shift4-doctor", help="doctor (other than PAT or another night specialist) who most recently worked a 4 shift")
+    parser.add_argument("--mode", choices=["greedy", "cp"], help="day shift scheduler")
+    parser.add_argument("--time-limit", type=float, help="seconds for the cp search")
+    parser.add_argument("--improve-time", type=float, help="seconds of local-search improvement on the day shifts")
+    parser.add_argument("--output", dest="output_path", help="write the schedule to this file instead of the input workbook (one input only; required with --engine openpyxl)")
+    parser.add_argument("--stats", help="write phase timings, counters and unfilled shift diagnostics to this JSON file")
+    parser.add_argument("--profile", action="store_true", help="include a cProfile summary in --stats")
+    parser.add_argument("--engine", choices=["xlwings", "openpyxl"], help="read the workbook through Excel or straight from the file")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(sys.argv[1:] if argv is None else argv)
+
+    options = load_run_config(args.config) if args.config else {}
+    for key in ("new_schedule", "num_shifts", "last_shift4_doctor", "mode", "time_limit", "improve_time", "engine", "output_path"):
+        if getattr(args, key) is not None:
+            options[key] = getattr(args, key)
+    options["interactive"] = not args.non_interactive and options.get("interactive", True)
+    if options.get("output_path") and len(args.filepath) > 1:
+        raise SystemExit("--output can only be used with a single workbook")
+
+    if options["interactive"]:
+        prompt_agreement()
+
+    instrumentation = Instrumentation(profile=args.profile) if args.stats else None
+    for filepath in args.filepath:
+        run_schedule(filepath, instrumentation=instrumentation, **options)
+    if instrumentation:
+        instrumentation.to_json(args.stats)
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -1,6 +1,20 @@
 from datetime import *
+from array import array
+from collections.abc import MutableMapping
+
+SHIFT_TYPES = ("s1", "s2", "s3", "s4")
+SHIFT_INDEX = {shift_type: i for i, shift_type in enumerate(SHIFT_TYPES)}
+
+# Doctor types (matched case-insensitively) that work nights only, in planned clusters
+NIGHT_SPECIALIST_TYPES = {"nocturnist", "night specialist"}
 
 class Doctor:
+    __slots__ = (
+        "name", "days_off", "shift_prefs", "min_shifts", "max_shifts", "flip_shifts", "doc_type",
+        "total_shifts", "night_shifts", "weekend_shifts", "consecutive_shifts", "last_shift_date",
+        "previous_month_shifts",
+    )
+
     def __init__(self, name, days_off, shift_prefs, min_shifts, max_shifts, flip_shifts, doc_type):
         """
         Initialize a doctor with their attributes.
@@ -32,6 +46,18 @@ class Doctor:
         # Initialize consecutive shifts based on the last month
         self.initialize_consecutive_shifts()
 
+    @property
+    def is_night_specialist(self):
+        """
+        True for doctors whose nights are planned in clusters before anyone else's: those with a doc_type
+        in NIGHT_SPECIALIST_TYPES. Only a doctor with no doc_type at all falls back to the name, so PAT
+        is still recognized in workbooks that predate the doctor type.
+        """
+        doc_type = str(self.doc_type or "").strip().lower()
+        if doc_type:
+            return doc_type in NIGHT_SPECIALIST_TYPES
+        return self.name == "PAT"
+
     def initialize_consecutive_shifts(self):
         """
         Calculate the initial consecutive shifts based on the previous month's data.
@@ -76,8 +102,120 @@ class Doctor:
             self.weekend_shifts += 1
         self.last_shift_date = cal_day
 
+    def unassign_shift(self, cal_day, shift_type):
+        """
+        Take back a shift given with assign_shift (last_shift_date is left to the caller).
+
+        Args:
+            cal_day (CalendarDay): The day the shift was on.
+            shift_type (str): The type of shift being removed.
+        """
+        self.total_shifts -= 1
+        if shift_type == "s4":
+            self.night_shifts -= 1
+        if cal_day.weekend:
+            self.weekend_shifts -= 1
+
+
+class ShiftMatrix:
+    __slots__ = ("doctors", "doctor_ids", "num_days", "cells")
+
+    def __init__(self, doctors=(), num_days=0):
+        """
+        Compact store of shift assignments: one small integer doctor id per (day, shift) cell.
+
+        A month of four shifts costs a few hundred bytes, so many candidate schedules can be kept
+        alive at once. Copies share the doctor registry and only duplicate the cell array.
+
+        Args:
+            doctors (list): Doctors to register up front; their list position is their id.
+            num_days (int): Number of calendar days covered by the matrix.
+        """
+        self.doctors = list(doctors)
+        self.doctor_ids = {doctor: i for i, doctor in enumerate(self.doctors)}
+        self.num_days = num_days
+        self.cells = array("h", [-1]) * (num_days * len(SHIFT_TYPES))  # -1 marks an empty shift
+
+    def id_of(self, doctor):
+        """
+        Get the integer id of a doctor, registering the doctor if it has not been seen before.
+        """
+        doctor_id = self.doctor_ids.get(doctor)
+        if doctor_id is None:
+            doctor_id = len(self.doctors)
+            self.doctors.append(doctor)
+            self.doctor_ids[doctor] = doctor_id
+        return doctor_id
+
+    def get(self, day_index, shift_type):
+        """
+        Returns:
+            Doctor or None: The doctor assigned to the shift, or None if it is empty.
+        """
+        doctor_id = self.cells[day_index * len(SHIFT_TYPES) + SHIFT_INDEX[shift_type]]
+        return self.doctors[doctor_id] if doctor_id >= 0 else None
+
+    def set(self, day_index, shift_type, doctor):
+        """
+        Assign a doctor to a shift (or clear it when doctor is None).
+        """
+        cell = day_index * len(SHIFT_TYPES) + SHIFT_INDEX[shift_type]
+        self.cells[cell] = self.id_of(doctor) if doctor is not None else -1
+
+    def day_assignments(self, day_index):
+        """
+        Yield (shift_type, doctor) pairs for the filled shifts of a day.
+        """
+        start = day_index * len(SHIFT_TYPES)
+        for shift_type, doctor_id in zip(SHIFT_TYPES, self.cells[start:start + len(SHIFT_TYPES)]):
+            if doctor_id >= 0:
+                yield shift_type, self.doctors[doctor_id]
+
+    def copy(self):
+        """
+        Returns:
+            ShiftMatrix: An independent copy of the assignments sharing the same doctor registry.
+        """
+        matrix = ShiftMatrix.__new__(ShiftMatrix)
+        matrix.doctors = self.doctors
+        matrix.doctor_ids = self.doctor_ids
+        matrix.num_days = self.num_days
+        matrix.cells = array("h", self.cells)
+        return matrix
+
+
+class DayShifts(MutableMapping):
+    __slots__ = ("matrix", "day_index")
+
+    def __init__(self, matrix, day_index):
+        """
+        Dict-like view of one day's row in a ShiftMatrix, keyed by shift type ('s1'..'s4').
+        """
+        self.matrix = matrix
+        self.day_index = day_index
+
+    def __getitem__(self, shift_type):
+        return self.matrix.get(self.day_index, shift_type)
+
+    def __setitem__(self, shift_type, doctor):
+        self.matrix.set(self.day_index, shift_type, doctor)
+
+    def __delitem__(self, shift_type):
+        self.matrix.set(self.day_index, shift_type, None)
+
+    def __iter__(self):
+        return iter(SHIFT_TYPES)
+
+    def __len__(self):
+        return len(SHIFT_TYPES)
+
+    def __repr__(self):
+        return repr(dict(self.items()))
+
 
 class CalDay:
+    __slots__ = ("date", "weekend", "shifts")
+
     def __init__(self, date):
         """
         Initialize a calendar day with empty shifts.
@@ -87,7 +225,19 @@ class CalDay:
         """
         self.date = date
         self.weekend = self.date.weekday() in {5, 6}  # True if Saturday or Sunday
-        self.shifts = {"s1": None, "s2": None, "s3": None, "s4": None}
+        self.shifts = DayShifts(ShiftMatrix(num_days=1), 0)
+
+    def bind(self, matrix, day_index):
+        """
+        Move this day's assignments into a row of a shared ShiftMatrix and view that row from now on.
+
+        Args:
+            matrix (ShiftMatrix): The matrix holding the whole calendar's assignments.
+            day_index (int): The row of the matrix that belongs to this day.
+        """
+        for shift_type, doctor in self.shifts.items():
+            matrix.set(day_index, shift_type, doctor)
+        self.shifts = DayShifts(matrix, day_index)
 
     def is_shift_filled(self, shift_type):
         """
@@ -119,4 +269,171 @@ class CalDay:
 
     def __repr__(self):
         assigned = {shift: doc.name if doc else None for shift, doc in self.shifts.items()}
-        return f"<CalendarDay {self.date} - Assignments: {assigned}>"
\ No newline at end of file
+        return f"<CalendarDay {self.date} - Assignments: {assigned}>"
+
+class ShiftLedger:
+    __slots__ = ("shifts", "runs")
+
+    def __init__(self):
+        """
+        Initialize an empty record of the shifts a single doctor works, keyed by date.
+
+        Every date worked also maps to the [start, end] bounds of the run of consecutive
+        worked days it belongs to, so run lengths can be answered without walking the calendar.
+        """
+        self.shifts = {}  # date -> set of shift types worked that day
+        self.runs = {}    # date -> [run_start, run_end], shared by every date in the run
+
+    def record(self, day, shift_type):
+        """
+        Record that the doctor works a shift on a given date.
+
+        Args:
+            day (datetime.date): The date of the shift.
+            shift_type (str): The shift type ('s1', 's2', 's3', 's4').
+        """
+        if day in self.shifts:
+            self.shifts[day].add(shift_type)
+            return
+        self.shifts[day] = {shift_type}
+
+        # Join the runs on either side of this day (if any) into a single run
+        left = self.runs.get(day - timedelta(days=1))
+        right = self.runs.get(day + timedelta(days=1))
+        run = left if left else [day, day]
+        run[1] = right[1] if right else day
+        self.runs[day] = run
+        if right:
+            current = day + timedelta(days=1)
+            while current <= run[1]:
+                self.runs[current] = run
+                current += timedelta(days=1)
+
+    def remove(self, day, shift_type):
+        """
+        Forget a shift recorded with record, splitting its run if the day is no longer worked.
+
+        Args:
+            day (datetime.date): The date of the shift.
+            shift_type (str): The shift type ('s1', 's2', 's3', 's4').
+        """
+        shift_types = self.shifts.get(day)
+        if not shift_types or shift_type not in shift_types:
+            return
+        shift_types.discard(shift_type)
+        if shift_types:
+            return
+        del self.shifts[day]
+
+        # The days before keep the run's list; the days after (if any) get a new one
+        run = self.runs.pop(day)
+        run_end = run[1]
+        if run[0] == day:
+            run[0] = day + timedelta(days=1)
+            return
+        run[1] = day - timedelta(days=1)
+        if run_end > day:
+            right = [day + timedelta(days=1), run_end]
+            current = right[0]
+            while current <= run_end:
+                self.runs[current] = right
+                current += timedelta(days=1)
+
+    def last_day(self):
+        """
+        Returns:
+            datetime.date or None: The latest date worked, or None if no shifts are recorded.
+        """
+        return max(self.shifts, default=None)
+
+    def worked_on(self, day):
+        """
+        Returns:
+            bool: True if the doctor works any shift on the given date.
+        """
+        return day in self.shifts
+
+    def worked_shift(self, day, shift_type):
+        """
+        Returns:
+            bool: True if the doctor works the given shift type on the given date.
+        """
+        return shift_type in self.shifts.get(day, ())
+
+    def shift_types_on(self, day):
+        """
+        Returns:
+            set: The shift types the doctor works on the given date (empty if not working).
+        """
+        return self.shifts.get(day, set())
+
+    def run_ending_at(self, day):
+        """
+        Returns:
+            int: Number of consecutive days worked up to and including the given date.
+        """
+        run = self.runs.get(day)
+        return (day - run[0]).days + 1 if run else 0
+
+    def run_starting_at(self, day):
+        """
+        Returns:
+            int: Number of consecutive days worked from the given date onwards.
+        """
+        run = self.runs.get(day)
+        return (run[1] - day).days + 1 if run else 0
+
+class ScheduleSnapshot:
+    __slots__ = ("dates", "matrix", "counters", "last_shift4_doctor")
+
+    def __init__(self, dates, matrix, counters, last_shift4_doctor=None):
+        """
+        Frozen state of a schedule: its assignments and every doctor's shift counters.
+
+        The assignments are a private ShiftMatrix that shares the doctor registry, so a snapshot of a
+        month costs a few hundred bytes plus one tuple per doctor and never copies Doctor objects.
+        Take them with Scheduler.snapshot and go back to one with Scheduler.restore.
+
+        Args:
+            dates (tuple): The calendar dates, one per matrix row.
+            matrix (ShiftMatrix): The assignments (not modified afterwards).
+            counters (tuple): Per doctor, in roster order, (total_shifts, night_shifts, weekend_shifts,
+                consecutive_shifts, last_shift_date).
+            last_shift4_doctor (Doctor): The scheduler's last_doctor_shift4.
+        """
+        self.dates = dates
+        self.matrix = matrix
+        self.counters = counters
+        self.last_shift4_doctor = last_shift4_doctor
+
+    def doctor_on(self, day_index, shift_type):
+        """
+        Returns:
+            Doctor or None: The doctor on a shift in this snapshot.
+        """
+        return self.matrix.get(day_index, shift_type)
+
+    def calendar(self):
+        """
+        Returns:
+            list: New CalDay objects holding this snapshot's assignments (editing them leaves the snapshot alone).
+        """
+        matrix = self.matrix.copy()
+        calendar = [CalDay(day) for day in self.dates]
+        for i, cal_day in enumerate(calendar):
+            cal_day.shifts = DayShifts(matrix, i)
+        return calendar
+
+    def diff(self, other):
+        """
+        Compare with another snapshot taken from the same Scheduler.
+
+        Returns:
+            list of tuples: (day index, shift type, doctor here, doctor in other) for every shift that differs.
+        """
+        return [
+            (cell // len(SHIFT_TYPES), SHIFT_TYPES[cell % len(SHIFT_TYPES)],
+             self.matrix.doctors[mine] if mine >= 0 else None, other.matrix.doctors[theirs] if theirs >= 0 else None)
+            for cell, (mine, theirs) in enumerate(zip(self.matrix.cells, other.matrix.cells))
+            if mine != theirs
+        ]
@@ -0,0 +1,89 @@
+import numpy as np
+
+# Why a doctor can't take a shift, one bit per rule (a doctor's code is 0 when they are available)
+REJECT_DAY_OFF = 1 << 0            # requested off (for shift 4 clusters, also the day after a cluster night)
+REJECT_ZERO_PREFERENCE = 1 << 1    # shift preference of 0
+REJECT_ALREADY_SCHEDULED = 1 << 2  # already working another shift that day
+REJECT_TURNAROUND = 1 << 3         # worked a later shift the day before
+REJECT_SHIFT4_REST = 1 << 4        # worked a 4-shift in either of the last 2 days
+REJECT_CONSECUTIVE_CAP = 1 << 5    # would work more than 5 days in a row
+REJECT_MAX_SHIFTS = 1 << 6         # would reach max_shifts (shift 4 clusters only; day shifts just rank them last)
+REJECT_NIGHT_SPECIALIST = 1 << 7   # night specialists, whose clusters are planned before the shift 4 gaps
+
+REJECTION_REASONS = {
+    REJECT_DAY_OFF: "day_off",
+    REJECT_ZERO_PREFERENCE: "zero_preference",
+    REJECT_ALREADY_SCHEDULED: "already_scheduled",
+    REJECT_TURNAROUND: "turnaround",
+    REJECT_SHIFT4_REST: "shift4_rest",
+    REJECT_CONSECUTIVE_CAP: "consecutive_cap",
+    REJECT_MAX_SHIFTS: "max_shifts",
+    REJECT_NIGHT_SPECIALIST: "night_specialist",
+}
+
+def describe_rejection(code):
+    """
+    Returns:
+        list: The names of the rules set in a rejection code, in bit order.
+    """
+    return [reason for bit, reason in REJECTION_REASONS.items() if code & bit]
+
+class RejectionIndex:
+    def __init__(self, doctors):
+        """
+        Record of which rules kept each doctor off each (day, shift), as one uint8 code per doctor.
+
+        The Scheduler records every day shift availability check (the latest check of a shift wins)
+        and every shift 4 night or cluster that no doctor could take.
+
+        Args:
+            doctors (list): List of Doctor objects; codes are stored in this order.
+        """
+        self.doctors = doctors
+        self.codes = {}  # (date, shift type) -> numpy array of rejection codes
+
+    def record(self, day, shift_type, codes):
+        self.codes[day, shift_type] = codes
+
+    def codes_for(self, day, shift_type):
+        """
+        Returns:
+            numpy.ndarray or None: The recorded codes, or None if the shift was never checked.
+        """
+        return self.codes.get((day, shift_type))
+
+    def reasons(self, day, shift_type):
+        """
+        Explain a recorded availability check.
+
+        Args:
+            day (datetime.date): Day of the shift.
+            shift_type (str): Shift type ("s1" - "s4").
+
+        Returns:
+            dict: Doctor -> names of the rules that excluded them, for every excluded doctor.
+        """
+        codes = self.codes_for(day, shift_type)
+        if codes is None:
+            return {}
+        return {self.doctors[i]: describe_rejection(int(codes[i])) for i in np.flatnonzero(codes)}
+
+    def closest_to_eligible(self, day, shift_type, k=5):
+        """
+        The excluded doctors who broke the fewest rules for a shift, e.g. who to ask first when it went unfilled.
+
+        Args:
+            day (datetime.date): Day of the shift.
+            shift_type (str): Shift type ("s1" - "s4").
+            k (int): Maximum number of doctors to return.
+
+        Returns:
+            list of tuples: (Doctor, rule names), fewest rules first (ties keep roster order).
+        """
+        codes = self.codes_for(day, shift_type)
+        if codes is None:
+            return []
+        excluded = np.flatnonzero(codes)
+        rules_broken = np.unpackbits(codes[excluded].astype(np.uint8)[:, None], axis=1).sum(axis=1)
+        order = excluded[np.argsort(rules_broken, kind="stable")][:k]
+        return [(self.doctors[i], describe_rejection(int(codes[i]))) for i in order]
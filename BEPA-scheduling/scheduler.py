@@ -1,26 +1,231 @@
 from models import *
+from solver import CPSolver, LocalSearch, normalize_shift_index
+from instrumentation import timed_phase
+from rejections import *
 from datetime import date, timedelta
+import heapq
+import numpy as np
+
+# Costs used by the dynamic-programming shift 4 gap planner (lower is better)
+UNFILLED_SHIFT4_COST = 100                       # per night left without a doctor
+CLUSTER_SIZE_COST = {1: 30, 2: 8, 3: 0, 4: 2}    # clusters of 3 are ideal, singletons are what night staff hate
+SHIFT4_PREFERENCE_COST = 3                       # per night, per point below the top shift 4 preference (5)
+SHIFT4_FAIRNESS_COST = 1                         # per night, per night shift the doctor has over the least loaded candidate
+SHIFT4_FAIRNESS_MAX_LEAD = 40                    # night shifts over the least loaded candidate that still add cost
+REPEAT_SHIFT4_DOCTOR_COST = 4                    # per cluster given to the doctor who worked the last shift 4
+
+PAT_MAX_CLUSTER_SIZE = 4  # longest run of nights PAT is scheduled for
+PAT_MIN_CLUSTER_SIZE = 3  # shortest PAT cluster, except at either end of the month
+PAT_REST_DAYS = 3         # nights off between PAT clusters
+
+# Costs used by the dynamic-programming PAT planner (lower is better)
+PAT_SHORTFALL_COST = 50   # per night PAT works below min_shifts
+PAT_IDLE_NIGHT_COST = 1   # per night PAT could still have worked (below max_shifts)
+PAT_PLAN_BEAM_WIDTH = 20  # states per day plan_night_specialists' first, quick pass keeps
+
+def most_nights_ahead(free, max_cluster, longest_cluster):
+    """
+    For every day, the most nights a night specialist could work from that day to the end of the
+    month on their own (ignoring max_shifts), by their (cluster length, cluster carried over, nights
+    off) at the start of the day. None where they would have to work a night they can't.
+
+    Args:
+        free (list): Per day, whether the specialist could work that night.
+        max_cluster (int): Longest cluster.
+        longest_cluster (int): Longest cluster a state may hold (a carried-over one can be longer).
+
+    Returns:
+        list: One dict per day, plus one for past the end of the month.
+    """
+    keys = [(cluster, from_last_month, rest)
+            for cluster in range(longest_cluster + 1)
+            for from_last_month in ((False, True) if cluster else (False,))
+            for rest in ((0,) if cluster else range(PAT_REST_DAYS + 1))]
+    ahead = [None] * len(free) + [dict.fromkeys(keys, 0)]
+    for day_index in range(len(free) - 1, -1, -1):
+        later = ahead[day_index + 1]
+        today = {}
+        for cluster, from_last_month, rest in keys:
+            options = []
+            if free[day_index]:
+                if cluster and cluster < max_cluster:
+                    options.append(later[(cluster + 1, from_last_month, 0)])
+                elif not cluster and rest >= PAT_REST_DAYS:
+                    options.append(later[(1, False, 0)])
+                options = [nights + 1 for nights in options if nights is not None]
+            if not cluster or cluster >= PAT_MIN_CLUSTER_SIZE or from_last_month:
+                options.append(later[(0, False, 1) if cluster else (0, False, min(rest + 1, PAT_REST_DAYS))])
+            today[(cluster, from_last_month, rest)] = max((nights for nights in options if nights is not None), default=None)
+        ahead[day_index] = today
+    return ahead
+
+def shift4_gap_cost(length):
+    """
+    Cost of the cheapest way to split a gap of open nights into clusters for other doctors
+    (by CLUSTER_SIZE_COST), e.g. 0 for 3 or 6 nights and 30 for a single night.
+    """
+    best = [0] + [None] * length
+    for n in range(1, length + 1):
+        best[n] = min(cost + best[n - size] for size, cost in CLUSTER_SIZE_COST.items() if size <= n)
+    return best[length]
+
+# Clusters of 3 are free, so from 6 nights on a gap costs the same as one 3 nights shorter: gap
+# lengths are tracked exactly up to 8 and then by length mod 3 (9 counts as 6, 10 as 7, ...)
+SHIFT4_GAP_CLASSES = 8
+SHIFT4_GAP_COSTS = [shift4_gap_cost(length) for length in range(SHIFT4_GAP_CLASSES + 1)]
 
 class Scheduler:
-    def __init__(self, doctors, calendar):
+    def __init__(self, doctors, calendar, last_shift4_doctor=None, interactive=True, instrumentation=None):
         """
         Initialize the scheduler with doctors, a calendar, and optional previous month data.
 
         Args:
             doctors (list): List of Doctor objects.
             calendar (list): List of CalDay objects for the month.
-            previous_month_data (dict): Optional data for shifts from the last 4 days of the previous month.
+            last_shift4_doctor (str): Name of the doctor (other than a night specialist) who most recently worked a 4 shift,
+                used when the previous month's shifts don't say.
+            interactive (bool): If True, prompt for last_shift4_doctor when it is needed and wasn't given.
+            instrumentation (Instrumentation): Optional collector of phase timings, counters and unfilled
+                shift diagnostics (None turns every hook off).
         """
         self.doctors = doctors
         self.calendar = calendar
         self.last_doctor_shift4 = None
+        self.interactive = interactive
+        self.instrumentation = instrumentation
 
-        self.set_initial_last_shift4()
+        self.pat_max_cluster = PAT_MAX_CLUSTER_SIZE
 
-    def set_initial_last_shift4(self):
+        # Doctors whose night clusters schedule_pat plans before anyone else's (see Doctor.is_night_specialist)
+        self.night_specialists = [doc for doc in self.doctors if doc.is_night_specialist]
+
+        # Night shifts each doctor worked in earlier months (set by RollingHorizonPlanner), so the
+        # shift 4 planner can even them out across months and not just within this one
+        self.prior_night_shifts = {}
+
+        # Date lookups used by every availability check (avoids scanning the calendar)
+        self.date_to_index = {cal_day.date: i for i, cal_day in enumerate(self.calendar)}
+
+        # Compact day x shift -> doctor id matrix; each CalDay.shifts becomes a view of its row
+        self.assignments = ShiftMatrix(self.doctors, len(self.calendar))
+        for i, cal_day in enumerate(self.calendar):
+            cal_day.bind(self.assignments, i)
+
+        # Changes since the oldest open savepoint (None when no savepoint is open)
+        self.undo_log = None
+
+        # Nights in a row each doctor could still work from each day, for PAT cluster sizing
+        # (built on first use, see build_free_runs)
+        self.free_runs = None
+        self.free_run_cap = 0
+        self.night_available = None
+
+        # Per-doctor record of the shifts already on the calendar, kept in sync by assign_shift,
+        # plus the same assignments as a (doctors x days x shifts) boolean mask
+        self.ledgers = {}
+        self.assigned_mask = None
+        self.sync_with_calendar()
+
+        # Availability rules that don't depend on assignments (days off, preferences, previous month)
+        self.static_rejections = None
+        self.static_availability = None
+        self.build_static_availability()
+
+        # Why each doctor was left out of each shift checked so far
+        self.rejections = RejectionIndex(self.doctors)
+
+        # Doctors currently on a run of consecutive shifts (consecutive_shifts > 0)
+        self.doctors_on_run = set()
+        self.consecutive_counts = None
+        self.sync_consecutive_counts()
+
+        self.set_initial_last_shift4(last_shift4_doctor)
+
+    def sync_with_calendar(self):
         """
-        Determine the last doctor (other than PAT) who worked a 4 shift in the previous month.
-        If no such doctor is found, prompt the user for input.
+        Rebuild every doctor's ShiftLedger and the assignment mask from the shifts currently on the calendar.
+        Call this after editing CalDay.shifts directly instead of going through assign_shift.
+        """
+        self.ledgers = {doctor: ShiftLedger() for doctor in self.doctors}
+        self.assigned_mask = np.zeros((len(self.doctors), len(self.calendar), len(SHIFT_TYPES)), dtype=bool)
+        for i, cal_day in enumerate(self.calendar):
+            for shift_type, doctor in self.assignments.day_assignments(i):
+                self.ledgers.setdefault(doctor, ShiftLedger()).record(cal_day.date, shift_type)
+                doctor_id = self.assignments.doctor_ids[doctor]
+                if doctor_id < len(self.doctors):
+                    self.assigned_mask[doctor_id, i, SHIFT_INDEX[shift_type]] = True
+        if self.free_runs is not None:
+            self.build_free_runs(self.free_run_cap)
+
+    def build_static_availability(self):
+        """
+        Precompute (doctors x days x shifts) rejection codes for the availability rules that don't
+        change as shifts are assigned: days off, zero shift preferences, and rest / turnaround rules
+        carried over from the previous month. static_availability is the same as a mask (code 0).
+        Rebuild them after changing days_off, shift_prefs or previous_month_shifts.
+        """
+        num_days = len(self.calendar)
+        prefs = np.array([doc.shift_prefs[:len(SHIFT_TYPES)] for doc in self.doctors], dtype=int).reshape(-1, len(SHIFT_TYPES))
+        codes = np.repeat(np.where(prefs == 0, REJECT_ZERO_PREFERENCE, 0).astype(np.uint8)[:, None, :], num_days, axis=1)
+
+        for doctor_id, doc in enumerate(self.doctors):
+            for day_off in doc.days_off:
+                day_index = self.date_to_index.get(day_off)
+                if day_index is not None:
+                    codes[doctor_id, day_index, :] |= REJECT_DAY_OFF
+
+            if not num_days:
+                continue
+
+            # Previous month shifts may be stored as 4, "4" or "s4"
+            previous_shifts = {(shift_date, normalize_shift_index(shift_type)) for shift_date, shift_type in doc.previous_month_shifts}
+
+            # No 1-shift after a 2/3-shift, and no 2-shift after a 3-shift, on the previous month's last day
+            prev_day = self.calendar[0].date - timedelta(days=1)
+            if (prev_day, SHIFT_INDEX["s2"]) in previous_shifts or (prev_day, SHIFT_INDEX["s3"]) in previous_shifts:
+                codes[doctor_id, 0, SHIFT_INDEX["s1"]] |= REJECT_TURNAROUND
+            if (prev_day, SHIFT_INDEX["s3"]) in previous_shifts:
+                codes[doctor_id, 0, SHIFT_INDEX["s2"]] |= REJECT_TURNAROUND
+
+            # Two rest days after a previous-month 4-shift
+            for shift_date, shift_index in previous_shifts:
+                if shift_index != SHIFT_INDEX["s4"]:
+                    continue
+                for rest_days in (1, 2):
+                    day_index = self.date_to_index.get(shift_date + timedelta(days=rest_days))
+                    if day_index is not None:
+                        codes[doctor_id, day_index, :] |= REJECT_SHIFT4_REST
+
+        self.static_rejections = codes
+        self.static_availability = codes == 0
+
+    def sync_consecutive_counts(self):
+        """
+        Refresh the array of consecutive shift counts (and the set of doctors on a run) from Doctor.consecutive_shifts.
+        """
+        self.consecutive_counts = np.array([doc.consecutive_shifts for doc in self.doctors], dtype=int)
+        self.doctors_on_run = {doc for doc in self.doctors if doc.consecutive_shifts}
+
+    def get_cal_day(self, day):
+        """
+        Look up the CalDay for a given date.
+
+        Args:
+            day (datetime.date): The date to look up.
+
+        Returns:
+            CalDay or None: The matching calendar day, or None if the date is outside the calendar.
+        """
+        index = self.date_to_index.get(day)
+        return self.calendar[index] if index is not None else None
+
+    def set_initial_last_shift4(self, doctor_name=None):
+        """
+        Determine the last doctor (other than a night specialist) who worked a 4 shift in the previous month.
+        If no such doctor is found, use doctor_name, or prompt the user for input when running interactively.
+
+        Args:
+            doctor_name (str): Optional name of the doctor to fall back on.
         """
         all_last_month_4shifts = []
 
@@ -33,15 +238,25 @@ class Scheduler:
         # Sort all 4-shifts by date (latest first)
         all_last_month_4shifts.sort(key=lambda x: x[0], reverse=True)
 
-        # Find the most recent 4-shift worked by a doctor other than PAT
+        # Find the most recent 4-shift worked by a doctor other than a night specialist
         for shift_date, doctor in all_last_month_4shifts:
-            if doctor.name != "PAT":
+            if not doctor.is_night_specialist:
                 self.last_doctor_shift4 = doctor
                 #print(f"Automatically set last_doctor_shift4 to {doctor.name} (worked last 4 shift on {shift_date})")
-                return  # Exit early once the most recent non-PAT doctor is found
+                return  # Exit early once the most recent non-specialist doctor is found
 
-        while True: #prompt user for a doctor if PAT worked all 4 previous 4-shifts
-            user_input = input("Enter the name of the doctor (other than PAT) who most recently worked a 4 shift: ").strip()
+        if doctor_name:
+            matching_doctors = [doc for doc in self.doctors if doc.name.lower() == doctor_name.strip().lower()]
+            if not matching_doctors:
+                raise ValueError(f"Unknown doctor for the last 4 shift: {doctor_name}")
+            self.last_doctor_shift4 = matching_doctors[0]
+            return
+
+        if not self.interactive:
+            return  # Leave it unset; schedule_remaining_shift4 then skips the carry-over cluster
+
+        while True: #prompt user for a doctor if night specialists worked all the previous 4-shifts
+            user_input = input("Enter the name of the doctor (other than PAT and other night specialists) who most recently worked a 4 shift: ").strip()
             
             # Check if the input matches a doctor in the list
             matching_doctors = [doc for doc in self.doctors if doc.name.lower() == user_input.lower()]
@@ -53,11 +268,347 @@ class Scheduler:
                 for doc in self.doctors:
                     print(f" - {doc.name}")
     
-    def schedule_pat(self):
+    @timed_phase("schedule_pat")
+    def schedule_pat(self, planner="dp"):
+        """
+        Schedule the night specialists (PAT and any other nocturnists) for shift 4, each in clusters
+        of at least 3 nights with 3 nights off in between.
+
+        The "dp" planner places every specialist's clusters together with plan_night_specialists, so
+        the nights are split with the least total shortfall below min_shifts rather than the first
+        specialist taking the nights the others need. A specialist left below min_shifts (e.g. when
+        their minimums add up to more nights than there are) is reported with a warning and a
+        "night_specialist_shortfall" event.
+
+        Args:
+            planner (str): "dp" to plan all specialists at once, or "greedy" to place each one's
+                clusters left to right as large as they fit, in roster order.
+        """
+        self.build_free_runs()  # pick up days off changed since the scheduler was created
+
+        if planner == "greedy":
+            for pat in self.night_specialists:
+                self.schedule_pat_greedy(pat)
+        else:
+            for pat, nights in self.plan_night_specialists(self.night_specialists).items():
+                for day_index in nights:
+                    self.assign_shift(self.calendar[day_index], pat, "s4")
+
+        for pat in self.night_specialists:
+            if pat.total_shifts < pat.min_shifts:
+                print(f"WARNING: {pat.name} is scheduled for {pat.total_shifts} night shifts, below the minimum of {pat.min_shifts}.")
+                if self.instrumentation:
+                    self.instrumentation.record("night_specialist_shortfall", doctor=pat.name,
+                                                scheduled=pat.total_shifts, min_shifts=pat.min_shifts)
+
+    def plan_pat_clusters(self, pat, max_nights=None):
         """
-        Schedule PAT for shift 4, enforcing minimum cluster size of 3 days.
+        Find PAT's best nights for the month around the nights already filled.
+
+        Dynamic program over the days, whose state is PAT's current cluster length (or the open gap
+        left for other doctors and the nights off since PAT's last cluster) and the nights used so
+        far. Clusters keep to pat_max_cluster, PAT_MIN_CLUSTER_SIZE (a cluster carried over from the
+        previous month or running into the next one may be shorter) and PAT_REST_DAYS, and never
+        go past max_shifts. The plan minimizes PAT_SHORTFALL_COST below min_shifts, PAT_IDLE_NIGHT_COST
+        below max_shifts, and the cost of the gaps it leaves (shift4_gap_cost), so that other doctors
+        aren't left with single nights.
+
+        Args:
+            pat (Doctor): The doctor to plan clusters for.
+            max_nights (int): Plan no more shifts than this (defaults to max_shifts).
+
+        Returns:
+            list: Calendar indexes of the nights PAT should work, in date order.
+        """
+        num_days = len(self.calendar)
+        if not num_days:
+            return []
+        runs = self.get_free_runs(self.pat_max_cluster)
+        pat_id = self.assignments.doctor_ids[pat]
+        max_cluster = self.pat_max_cluster
+        cap = pat.max_shifts if max_nights is None else min(pat.max_shifts, max_nights)
+        remaining = max(0, cap - pat.total_shifts)
+        target = pat.min_shifts - pat.total_shifts
+
+        # Start from the end of the previous month: a cluster still running, or the nights off since the last one
+        first_day = self.calendar[0].date
+        previous_nights = {shift_date for shift_date, shift_type in pat.previous_month_shifts}
+        carried = 0
+        while first_day - timedelta(days=carried + 1) in previous_nights:
+            carried += 1
+        if carried:
+            start = (carried, True, 0, 0, 0)
+        else:
+            last_night = max(previous_nights, default=None)
+            rest = min(PAT_REST_DAYS, (first_day - last_night).days - 1) if last_night else PAT_REST_DAYS
+            # A run of nights another doctor ended the previous month with is the start of the first gap
+            previous_shift4 = {
+                shift_date: doc for doc in self.doctors for shift_date, shift_type in doc.previous_month_shifts
+                if normalize_shift_index(shift_type) == SHIFT_INDEX["s4"]
+            }
+            night_doctor = previous_shift4.get(first_day - timedelta(days=1))
+            gap = 0
+            while night_doctor and previous_shift4.get(first_day - timedelta(days=gap + 1)) is night_doctor:
+                gap += 1
+            start = (0, False, min(gap, SHIFT4_GAP_CLASSES), rest, 0)
+
+        pat_free = (runs[pat_id, :num_days] > 0).tolist()
+        open_nights = [cal_day.shifts["s4"] is None for cal_day in self.calendar]
+
+        # Where a night leads depends only on (cluster length, cluster carried over, open gap length class,
+        # nights off) and on whether PAT is free and the night open, so each combination's moves are worked
+        # out once and looked up by a small int code: [(next code, added cost, PAT works the night)]
+        rest_classes = PAT_REST_DAYS + 1
+        gap_classes = SHIFT4_GAP_CLASSES + 1
+
+        def encode(cluster, from_last_month, gap, rest):
+            return ((cluster * 2 + from_last_month) * gap_classes + gap) * rest_classes + rest
+
+        def night_moves(code, can_work, open_night):
+            rest = code % rest_classes
+            gap = code // rest_classes % gap_classes
+            cluster, from_last_month = divmod(code // (rest_classes * gap_classes), 2)
+            moves = []
+            if cluster:
+                if can_work and cluster < max_cluster:
+                    moves.append((encode(cluster + 1, from_last_month, 0, 0), 0, 1))
+                if cluster < PAT_MIN_CLUSTER_SIZE and not from_last_month:
+                    return moves
+                gap, rest = 0, 0
+            elif can_work and rest >= PAT_REST_DAYS:
+                moves.append((encode(1, False, 0, 0), SHIFT4_GAP_COSTS[gap], 1))
+
+            # PAT is off tonight: the gap grows, or ends at a night someone already has
+            rest = rest + 1 if rest < PAT_REST_DAYS else rest
+            if open_night:
+                moves.append((encode(0, False, gap + 1 if gap < SHIFT4_GAP_CLASSES else SHIFT4_GAP_CLASSES - 2, rest), 0, 0))
+            else:
+                moves.append((encode(0, False, 0, rest), SHIFT4_GAP_COSTS[gap], 0))
+            return moves
+
+        # States: (code, nights used), each mapped to (cost, previous state, PAT worked the night)
+        moves_by_night = {}
+        states = {(encode(*start[:4]), start[4]): (0, None, False)}
+        back = []
+        for day_index in range(num_days):
+            night = (pat_free[day_index], open_nights[day_index])
+            moves = moves_by_night.setdefault(night, {})
+            next_states = {}
+            for state, (cost, _, _) in states.items():
+                code, used = state
+                code_moves = moves.get(code)
+                if code_moves is None:
+                    code_moves = moves[code] = night_moves(code, *night)
+                for next_code, added_cost, worked in code_moves:
+                    if worked and used >= remaining:
+                        continue
+                    key = (next_code, used + worked)
+                    new_cost = cost + added_cost
+                    best = next_states.get(key)
+                    if best is None or new_cost < best[0]:
+                        next_states[key] = (new_cost, state, worked)
+
+            states = next_states
+            back.append(next_states)
+
+        def final_cost(item):
+            (code, used), (cost, _, _) = item
+            gap = code // rest_classes % gap_classes
+            return cost + SHIFT4_GAP_COSTS[gap] + PAT_SHORTFALL_COST * max(0, target - used) + PAT_IDLE_NIGHT_COST * (remaining - used)
+
+        state = min(states.items(), key=final_cost)[0]
+        nights = []
+        for day_index in range(num_days - 1, -1, -1):
+            cost, state, worked = back[day_index][state]
+            if worked:
+                nights.append(day_index)
+        nights.reverse()
+        return nights
+
+    def plan_night_specialists(self, specialists, max_nights=None):
+        """
+        Find the best nights for the month for all night specialists at once.
+
+        A single specialist is planned with plan_pat_clusters. Several are planned with
+        search_night_specialists, twice: a quick pass that keeps only the PAT_PLAN_BEAM_WIDTH most
+        promising states each day finds a good plan, then a full pass drops every state that can't
+        beat it. Only states that can't win are dropped, so the plan is optimal.
+
+        Args:
+            specialists (list): The doctors to plan clusters for.
+            max_nights (dict): Doctor -> plan no more shifts than this (defaults to max_shifts).
+
+        Returns:
+            dict: Doctor -> calendar indexes of the nights they should work, in date order.
+        """
+        if not self.calendar:
+            return {pat: [] for pat in specialists}
+        max_nights = max_nights or {}
+        if len(specialists) <= 1:
+            return {pat: self.plan_pat_clusters(pat, max_nights.get(pat)) for pat in specialists}
+
+        cost, nights = self.search_night_specialists(specialists, max_nights, beam_width=PAT_PLAN_BEAM_WIDTH)
+        better_cost, better_nights = self.search_night_specialists(specialists, max_nights, cost_to_beat=cost)
+        return better_nights if better_cost is not None and better_cost < cost else nights
+
+    def search_night_specialists(self, specialists, max_nights, beam_width=None, cost_to_beat=None):
+        """
+        Dynamic program over the days, whose state is, for every specialist, their current cluster
+        length (or the nights off since their last cluster) and the nights used so far, plus the open
+        gap left for other doctors. Each night goes to at most one specialist. Clusters keep to
+        pat_max_cluster, PAT_MIN_CLUSTER_SIZE (a cluster carried over from the previous month or
+        running into the next one may be shorter) and PAT_REST_DAYS, and never go past max_shifts.
+        The plan minimizes PAT_SHORTFALL_COST below each specialist's min_shifts, PAT_IDLE_NIGHT_COST
+        below max_shifts, and the cost of the gaps it leaves (shift4_gap_cost), so that no specialist
+        takes the nights another needs and other doctors aren't left with single nights.
+
+        Each state's lower bound assumes every specialist works as many of the remaining nights as they
+        could on their own (most_nights_ahead), but no more than one specialist per open night.
+
+        Args:
+            specialists (list): The doctors to plan clusters for.
+            max_nights (dict): Doctor -> plan no more shifts than this (defaults to max_shifts).
+            beam_width (int): Keep only this many states per day, those with the lowest lower bound.
+            cost_to_beat (int): Drop every state whose lower bound is no better than this.
+
+        Returns:
+            tuple: (cost, {doctor: calendar indexes of their nights}), or (None, None) if every state was dropped.
+        """
+        num_days = len(self.calendar)
+        runs = self.get_free_runs(self.pat_max_cluster)
+        max_cluster = self.pat_max_cluster
+        first_day = self.calendar[0].date
+
+        # Start from the end of the previous month: a cluster still running, or the nights off since the last one
+        starts, remaining, targets, pat_free = [], [], [], []
+        for pat in specialists:
+            cap = pat.max_shifts if max_nights.get(pat) is None else min(pat.max_shifts, max_nights[pat])
+            remaining.append(max(0, cap - pat.total_shifts))
+            targets.append(pat.min_shifts - pat.total_shifts)
+            pat_free.append((runs[self.assignments.doctor_ids[pat], :num_days] > 0).tolist())
+            previous_nights = {shift_date for shift_date, shift_type in pat.previous_month_shifts}
+            carried = 0
+            while first_day - timedelta(days=carried + 1) in previous_nights:
+                carried += 1
+            if carried:
+                starts.append((carried, True, 0, 0))
+            else:
+                last_night = max(previous_nights, default=None)
+                rest = min(PAT_REST_DAYS, (first_day - last_night).days - 1) if last_night else PAT_REST_DAYS
+                starts.append((0, False, rest, 0))
+
+        # A run of nights another doctor ended the previous month with is the start of the first gap
+        gap = 0
+        if not any(cluster for cluster, _, _, _ in starts):
+            previous_shift4 = {
+                shift_date: doc for doc in self.doctors for shift_date, shift_type in doc.previous_month_shifts
+                if normalize_shift_index(shift_type) == SHIFT_INDEX["s4"]
+            }
+            night_doctor = previous_shift4.get(first_day - timedelta(days=1))
+            while night_doctor and previous_shift4.get(first_day - timedelta(days=gap + 1)) is night_doctor:
+                gap += 1
+        open_nights = [cal_day.shifts["s4"] is None for cal_day in self.calendar]
+
+        longest_cluster = max([max_cluster] + [cluster for cluster, _, _, _ in starts])
+        ahead = [most_nights_ahead(free, max_cluster, longest_cluster) for free in pat_free]
+        shared_nights = [0] * (num_days + 1)  # open nights from each day on that any specialist is free for
+        for day_index in range(num_days - 1, -1, -1):
+            shared_nights[day_index] = shared_nights[day_index + 1] + (open_nights[day_index] and any(free[day_index] for free in pat_free))
+
+        def final_cost(item):
+            (gap, plans), (cost, _, _) = item
+            return cost + SHIFT4_GAP_COSTS[gap] + sum(
+                PAT_SHORTFALL_COST * max(0, target - used) + PAT_IDLE_NIGHT_COST * (nights - used)
+                for (_, _, _, used), target, nights in zip(plans, targets, remaining)
+            )
+
+        def lower_bound(day_index, state, cost):
+            # None if a specialist is stuck in a cluster they can't finish
+            shortfall = idle = shortfall_cover = idle_cover = 0
+            for (cluster, from_last_month, rest, used), days_ahead, target, nights in zip(state[1], ahead, targets, remaining):
+                more = days_ahead[day_index].get((cluster, from_last_month, rest))
+                if more is None:
+                    return None
+                shortfall += max(0, target - used)
+                idle += nights - used
+                shortfall_cover += min(max(0, target - used), more)
+                idle_cover += min(nights - used, more)
+            return (cost + PAT_SHORTFALL_COST * (shortfall - min(shortfall_cover, shared_nights[day_index]))
+                    + PAT_IDLE_NIGHT_COST * (idle - min(idle_cover, shared_nights[day_index])))
+
+        # States: (open gap length class, (cluster length, cluster carried over, nights off, nights used)
+        # per specialist), each mapped to (cost, previous state, index of the specialist who worked the night)
+        states = {(min(gap, SHIFT4_GAP_CLASSES), tuple(starts)): (0, None, None)}
+        back = []
+        for day_index in range(num_days):
+            next_states = {}
+
+            def relax(state, cost, previous, worked):
+                best = next_states.get(state)
+                if best is None or cost < best[0]:
+                    next_states[state] = (cost, previous, worked)
+
+            for state, (cost, _, _) in states.items():
+                gap, plans = state
+                # Everyone is off tonight unless they work it: a cluster ends, the nights off add up
+                off = tuple(
+                    (0, False, 1, used) if cluster else (0, False, rest + 1 if rest < PAT_REST_DAYS else rest, used)
+                    for cluster, _, rest, used in plans
+                )
+                # Whoever worked last night may stop only after a full cluster, or one carried from last month
+                can_stop = all(
+                    not cluster or cluster >= PAT_MIN_CLUSTER_SIZE or from_last_month
+                    for cluster, from_last_month, _, _ in plans
+                )
+                for i, (cluster, from_last_month, rest, used) in enumerate(plans):
+                    if not pat_free[i][day_index] or used >= remaining[i]:
+                        continue
+                    if cluster:
+                        if cluster < max_cluster:
+                            plan = (cluster + 1, from_last_month, 0, used + 1)
+                            relax((0, off[:i] + (plan,) + off[i + 1:]), cost, state, i)
+                    elif rest >= PAT_REST_DAYS and can_stop:
+                        plan = (1, False, 0, used + 1)
+                        relax((0, off[:i] + (plan,) + off[i + 1:]), cost + SHIFT4_GAP_COSTS[gap], state, i)
+                if not can_stop:
+                    continue
+
+                # Nobody works tonight: the gap grows, or ends at a night someone already has
+                if open_nights[day_index]:
+                    relax((gap + 1 if gap < SHIFT4_GAP_CLASSES else SHIFT4_GAP_CLASSES - 2, off), cost, state, None)
+                else:
+                    relax((0, off), cost + SHIFT4_GAP_COSTS[gap], state, None)
+
+            # Drop the states that can't finish or can't beat cost_to_beat; past beam_width keep the most promising
+            if beam_width is not None or cost_to_beat is not None:
+                bounds = {state: lower_bound(day_index + 1, state, cost) for state, (cost, _, _) in next_states.items()}
+                kept = [state for state, bound in bounds.items()
+                        if bound is not None and (cost_to_beat is None or bound < cost_to_beat)]
+                if beam_width is not None and len(kept) > beam_width:
+                    kept = heapq.nsmallest(beam_width, kept, key=bounds.get)
+                next_states = {state: next_states[state] for state in kept}
+            if self.instrumentation:
+                self.instrumentation.count("night_specialist_states", len(next_states))
+            states = next_states
+            back.append(next_states)
+
+        if not states:
+            return None, None
+        best = min(states.items(), key=final_cost)
+        state = best[0]
+        nights = {pat: [] for pat in specialists}
+        for day_index in range(num_days - 1, -1, -1):
+            cost, state, worked = back[day_index][state]
+            if worked is not None:
+                nights[specialists[worked]].append(day_index)
+        for planned in nights.values():
+            planned.reverse()
+        return final_cost(best), nights
+
+    def schedule_pat_greedy(self, pat):
+        """
+        Place PAT's clusters left to right, each as large as it fits, enforcing a minimum cluster size of 3 days.
         """
-        pat = next(doc for doc in self.doctors if doc.name == "PAT")
         days_scheduled = 0
         last_shift_date = None
         consecutive_days = 0
@@ -96,7 +647,7 @@ class Scheduler:
 
                     # Check if we can extend the cluster
                     if (cal_day.date - last_shift_date).days == 1 and cal_day.date not in pat.days_off and not cal_day.is_shift_filled("s4"):
-                        if consecutive_days >= 4:
+                        if consecutive_days >= self.pat_max_cluster:
                             #print("Cluster has reached the maximum size of 4 days. Stopping extension.\n")
                             break
 
@@ -112,7 +663,7 @@ class Scheduler:
                     index += 1
 
             # Reset cluster tracking after extending
-            if consecutive_days >= 4:
+            if consecutive_days >= self.pat_max_cluster:
                 consecutive_days = 0
 
             # Skip if PAT cannot work this day
@@ -132,9 +683,12 @@ class Scheduler:
             # Determine cluster size
             remaining_shifts = pat.max_shifts - pat.total_shifts
             cluster_size = self.get_optimal_cluster_size(pat, index, remaining_shifts)
+            if not cluster_size:  # PAT has no shifts left (or can't start a cluster here)
+                index += 1
+                continue
 
             # Enforce minimum cluster size of 3 days, except at the end of the month
-            if cluster_size and cluster_size < 3:
+            if cluster_size < 3:
                 if index + cluster_size >= len(self.calendar):
                     # Allow smaller cluster at the end of the month
                     #print(f"Allowing smaller cluster of {cluster_size} days at the end of the month.")
@@ -176,20 +730,17 @@ class Scheduler:
         Returns:
             bool: True if the cluster can start, False otherwise.
         """
-        for j in range(min_days):
-            if start_index + j >= len(self.calendar):  # Out of bounds
-                return False
-            cal_day = self.calendar[start_index + j]
-            if cal_day.date in pat.days_off or cal_day.is_shift_filled("s4"):
+        runs = self.get_free_runs(max(min_days, 3))
+        doctor_id = self.assignments.doctor_ids[pat]
+        while True:
+            if start_index >= len(self.calendar) or runs[doctor_id, start_index] < min_days:
                 return False
 
-        # Check for sufficient gap after the cluster
-        next_available_day = start_index + min_days + 3
-        if next_available_day < len(self.calendar):
-            if not self.can_start_cluster(pat, next_available_day, 3):
-                return False
-
-        return True
+            # Check for sufficient gap after the cluster: a cluster of 3 must fit after the next 3 days
+            start_index += min_days + 3
+            min_days = 3
+            if start_index >= len(self.calendar):
+                return True
 
     def get_optimal_cluster_size(self, pat, start_index, remaining_shifts=None):
         """
@@ -198,49 +749,88 @@ class Scheduler:
         if remaining_shifts is None:
             remaining_shifts = pat.max_shifts - pat.total_shifts
 
-        cluster_size = 0
+        runs = self.get_free_runs(self.pat_max_cluster)
+        cluster_size = min(int(runs[self.assignments.doctor_ids[pat], start_index]), remaining_shifts, self.pat_max_cluster)
 
-        for i in range(start_index, len(self.calendar)):
-            cal_day = self.calendar[i]
+        return cluster_size if cluster_size > 0 else None
 
-            if cal_day.date in pat.days_off:
-                break
-            if cal_day.is_shift_filled("s4"):
-                break
-            if cluster_size >= remaining_shifts:
-                break
+    def build_free_runs(self, cap=None):
+        """
+        Precompute a (doctors x days + 1) array of how many nights in a row each doctor could work
+        from each day: days that are not a day off and whose 4-shift is still open. Runs are capped
+        (at the longest cluster asked about), so assign_shift / unassign_shift only have to fix up
+        the few days before a night that changes. The extra last column is past the end of the month.
 
-            cluster_size += 1
+        Args:
+            cap (int): Longest run that has to be told apart (at least pat_max_cluster and 3).
+        """
+        self.free_run_cap = max(cap or 0, self.pat_max_cluster, 3)
+        num_days = len(self.calendar)
+        self.night_available = np.ones((len(self.doctors), num_days), dtype=bool)
+        for doctor_id, doc in enumerate(self.doctors):
+            for day_off in doc.days_off:
+                day_index = self.date_to_index.get(day_off)
+                if day_index is not None:
+                    self.night_available[doctor_id, day_index] = False
+
+        self.free_runs = np.zeros((len(self.doctors), num_days + 1), dtype=np.int16)
+        for day_index in range(num_days - 1, -1, -1):
+            self.refresh_free_run(day_index)
+
+    def get_free_runs(self, cap):
+        """
+        Returns:
+            numpy.ndarray: The free run array (see build_free_runs), rebuilt first if it is missing or capped below cap.
+        """
+        if self.free_runs is None or self.free_run_cap < cap:
+            self.build_free_runs(cap)
+        return self.free_runs
 
-            # Stop cluster if it exceeds 4 shifts
-            if cluster_size >= 4:
-                break
+    def refresh_free_run(self, day_index):
+        """
+        Recompute the free runs starting on one day from the runs starting the next day.
+        """
+        free = self.night_available[:, day_index]
+        if self.assignments.get(day_index, "s4") is not None:
+            free = np.zeros_like(free)
+        self.free_runs[:, day_index] = np.where(free, np.minimum(self.free_runs[:, day_index + 1] + 1, self.free_run_cap), 0)
 
-        return cluster_size if cluster_size > 0 else None
+    def update_free_runs(self, day_index):
+        """
+        Bring the free runs up to date after the 4-shift on a day was filled or emptied. Runs starting
+        free_run_cap or more days earlier are already capped before reaching it, so only O(cap) days change.
+        """
+        for i in range(day_index, max(day_index - self.free_run_cap, -1), -1):
+            self.refresh_free_run(i)
 
-    def schedule_remaining_shift4(self):
+    @timed_phase("schedule_remaining_shift4")
+    def schedule_remaining_shift4(self, planner="dp"):
         """
-        Schedule the remaining shift 4s for doctors after PAT has been scheduled.
-        If PAT is not scheduled early and a doctor other than PAT worked the last 4-shift of the previous month,
+        Schedule the remaining shift 4s for doctors after the night specialists (PAT) have been scheduled.
+        If no specialist is scheduled early and another doctor worked the last 4-shift of the previous month,
         that doctor will be prioritized for the first shift-4 cluster of the month.
+
+        Args:
+            planner (str): "dp" to plan each gap with plan_shift4_gap, or "greedy" for the
+                original cluster-size lookup table with retries.
         """
         pat_cluster_gaps = self.identify_pat_gaps()
 
-        # Ensure that PAT is not scheduled on the first day of the month
+        # Ensure that no night specialist is scheduled on the first day of the month
         first_day_of_month = self.calendar[0]
-        pat_scheduled_first_day = first_day_of_month.shifts["s4"] and first_day_of_month.shifts["s4"].name == "PAT"
+        pat_scheduled_first_day = first_day_of_month.shifts["s4"] and first_day_of_month.shifts["s4"].is_night_specialist
 
-        # Check if PAT worked the last shift-4 of the previous month
+        # Check if a night specialist worked the last shift-4 of the previous month
         last_day_prev_month = max((shift_date for doc in self.doctors for shift_date, shift_type in doc.previous_month_shifts if shift_type == 4), default=None)
 
         if last_day_prev_month:
             last_shift_doc = next((doc for doc in self.doctors if (last_day_prev_month, 4) in doc.previous_month_shifts), None)
-            pat_scheduled_last_day = last_shift_doc and last_shift_doc.name == "PAT"
+            pat_scheduled_last_day = last_shift_doc and last_shift_doc.is_night_specialist
         else:
             pat_scheduled_last_day = False  # No shift data available, assume PAT was not scheduled
 
-        # If PAT is NOT scheduled on the first day AND NOT scheduled on the last day of the previous month AND last doctor was not PAT, prioritize that doctor
-        if not pat_scheduled_first_day and not pat_scheduled_last_day and self.last_doctor_shift4 and self.last_doctor_shift4.name != "PAT":
+        # If no specialist is scheduled on the first day or worked the last day of the previous month, and the last doctor was not a specialist, prioritize that doctor
+        if not pat_scheduled_first_day and not pat_scheduled_last_day and self.last_doctor_shift4 and not self.last_doctor_shift4.is_night_specialist:
             first_gap = pat_cluster_gaps[0] if pat_cluster_gaps else None
 
             if first_gap:
@@ -254,9 +844,7 @@ class Scheduler:
 
                 # Try scheduling them if they are eligible
                 if max_additional_shifts > 0:
-                    gap_start_index = next(
-                        (i for i, cal_day in enumerate(self.calendar) if cal_day.date == gap_start), None
-                    )
+                    gap_start_index = self.date_to_index.get(gap_start)
 
                     if gap_start_index is not None:
                         cluster_days = self.calendar[gap_start_index:gap_start_index + max_additional_shifts]
@@ -270,56 +858,228 @@ class Scheduler:
                             pat_cluster_gaps[0] = (cluster_days[-1].date + timedelta(days=1), gap_size - max_additional_shifts)
 
         # Proceed with normal scheduling for the remaining gaps
-        for gap in pat_cluster_gaps:
-            gap_start, gap_size = gap
-            failed_attempts = 0
+        for gap_start, gap_size in pat_cluster_gaps:
+            if planner == "greedy":
+                self.schedule_shift4_gap_greedy(gap_start, gap_size)
+            else:
+                self.schedule_shift4_gap(gap_start, gap_size)
 
-            while gap_size > 0:
-                cluster_sizes = self.determine_cluster_plan(gap_size)
-                scheduled = False  # Flag to track if we scheduled a cluster
-
-                for cluster_size in cluster_sizes:
-                    gap_start_index = next(
-                        (i for i, cal_day in enumerate(self.calendar) if cal_day.date == gap_start),
-                        None
-                    )
-                    if gap_start_index is not None:
-                        cluster_days = self.calendar[gap_start_index:gap_start_index + cluster_size]
+    def schedule_shift4_gap_greedy(self, gap_start, gap_size):
+        """
+        Fill one gap between PAT clusters using the determine_cluster_plan lookup table,
+        shifting the gap start by a day (up to 5 times) whenever no doctor fits a cluster.
+
+        Args:
+            gap_start (datetime.date): First day of the gap.
+            gap_size (int): Number of days in the gap.
+        """
+        failed_attempts = 0
+
+        while gap_size > 0:
+            cluster_sizes = self.determine_cluster_plan(gap_size)
+            scheduled = False  # Flag to track if we scheduled a cluster
+
+            for cluster_size in cluster_sizes:
+                gap_start_index = self.date_to_index.get(gap_start)
+                if gap_start_index is not None:
+                    cluster_days = self.calendar[gap_start_index:gap_start_index + cluster_size]
+                else:
+                    print(f"Error: gap_start {gap_start} not found in the calendar.")
+                    break
+
+                # Try to find a doctor for the cluster
+                selected_doc = self.select_best_doctor_for_4cluster(cluster_days, cluster_size)
+
+                if selected_doc is None:
+                    print(f"WARNING: No available doctor for a cluster of size {cluster_size} starting on {gap_start}.")
+                    self.rejections.record(gap_start, "s4", self.shift4_rejection_codes(cluster_days, cluster_size))
+                    failed_attempts += 1  # Increment failure count
+                    if self.instrumentation:
+                        self.instrumentation.count("shift4_retries")
+                        self.instrumentation.record("unfilled_shift", date=gap_start, shift="s4", cluster_size=cluster_size)
+                    if failed_attempts > 5:  # Prevent infinite loops
+                        print(f"ERROR: Unable to schedule shift-4 for gap {gap_start} - skipping.")
+                        gap_size = 0  # Break out of loop
                     else:
-                        print(f"Error: gap_start {gap_start} not found in the calendar.")
+                        gap_start += timedelta(days=1)  # Move forward and retry
+                        gap_size -= 1  # Reduce the remaining gap
+                    continue  # Try the next cluster size
+
+                # Assign the doctor to all days in the cluster
+                for cal_day in cluster_days:
+                    if cal_day.is_shift_filled("s4"):
                         break
 
-                    # Try to find a doctor for the cluster
-                    selected_doc = self.select_best_doctor_for_4cluster(cluster_days, cluster_size)
-
-                    if selected_doc is None:
-                        print(f"WARNING: No available doctor for a cluster of size {cluster_size} starting on {gap_start}.")
-                        failed_attempts += 1  # Increment failure count
-                        if failed_attempts > 5:  # Prevent infinite loops
-                            print(f"ERROR: Unable to schedule shift-4 for gap {gap_start} - skipping.")
-                            gap_size = 0  # Break out of loop
-                        else:
-                            gap_start += timedelta(days=1)  # Move forward and retry
-                            gap_size -= 1  # Reduce the remaining gap
-                        continue  # Try the next cluster size
-
-                    # Assign the doctor to all days in the cluster
-                    for cal_day in cluster_days:
-                        if cal_day.is_shift_filled("s4"):
-                            break
+                    self.assign_shift(cal_day, selected_doc, "s4")
+                    self.set_last_doctor_shift4(selected_doc)
+
+                # Update the gap information
+                gap_start = cluster_days[-1].date + timedelta(days=1)
+                gap_size -= cluster_size
+                scheduled = True
+                break  # Exit the loop once a cluster is scheduled
+
+    def schedule_shift4_gap(self, gap_start, gap_size):
+        """
+        Fill one gap between PAT clusters from an optimal plan_shift4_gap plan.
+
+        Only the first cluster of each plan is committed; the rest of the gap is then re-planned so
+        the fairness costs see the night shifts just assigned.
+
+        Args:
+            gap_start (datetime.date): First day of the gap.
+            gap_size (int): Number of days in the gap.
+        """
+        start = self.date_to_index.get(gap_start)
+        if start is None:
+            print(f"Error: gap_start {gap_start} not found in the calendar.")
+            return
+        end = min(start + gap_size, len(self.calendar))
+
+        while start < end:
+            plan = self.plan_shift4_gap(start, end)
+            if not plan:
+                break
+            cluster_start, cluster_size, doctor = plan[0]
+            if self.instrumentation:
+                self.instrumentation.count("shift4_replans")
+
+            if doctor is None:
+                if not self.calendar[cluster_start].is_shift_filled("s4"):
+                    print(f"WARNING: No available doctor for shift 4 on {self.calendar[cluster_start].date}.")
+                    self.rejections.record(self.calendar[cluster_start].date, "s4",
+                                           self.shift4_rejection_codes(self.calendar[cluster_start:cluster_start + 1], 1))
+                    if self.instrumentation:
+                        eligible = self.get_available_doctors_for_shift4_cluster(self.calendar[cluster_start:cluster_start + 1], 1)
+                        self.instrumentation.record("unfilled_shift", date=self.calendar[cluster_start].date, shift="s4",
+                                                    eligible_doctors=[doc.name for doc in eligible])
+            else:
+                for cal_day in self.calendar[cluster_start:cluster_start + cluster_size]:
+                    self.assign_shift(cal_day, doctor, "s4")
+                self.set_last_doctor_shift4(doctor)
+
+            start = cluster_start + cluster_size
+
+    def plan_shift4_gap(self, start, end):
+        """
+        Find the cheapest way to cover calendar[start:end] with shift 4 clusters.
+
+        Dynamic program over (day, doctor working the night before): each step either places a
+        cluster of 1-4 nights with an eligible doctor (a different doctor than the previous
+        cluster, so runs never merge past the cluster size), steps over a night that is already
+        filled, or leaves a night unfilled. Cluster costs combine CLUSTER_SIZE_COST, shift 4
+        preference and night-shift fairness. Runs in O(days x cluster sizes x doctors).
 
-                        self.assign_shift(cal_day, selected_doc, "s4")
-                        self.last_doctor_shift4 = selected_doc
+        Args:
+            start (int): Calendar index of the first night to plan.
+            end (int): Calendar index one past the last night to plan.
 
-                    # Update the gap information
-                    gap_start = cluster_days[-1].date + timedelta(days=1)
-                    gap_size -= cluster_size
-                    scheduled = True
-                    break  # Exit the loop once a cluster is scheduled
+        Returns:
+            list of tuples: (calendar index, cluster size, Doctor or None) in date order.
+                Doctor is None for nights left unfilled or already filled.
+        """
+        num_days = end - start
+        if num_days <= 0:
+            return []
+
+        # Candidate doctors for every cluster that fits in the gap
+        candidates = {}
+        for offset in range(num_days):
+            for cluster_size in range(1, 5):
+                cluster_days = self.calendar[start + offset:start + offset + cluster_size]
+                if offset + cluster_size > num_days or any(day.is_shift_filled("s4") for day in cluster_days):
+                    break
+                candidates[offset, cluster_size] = self.get_available_doctors_for_shift4_cluster(cluster_days, cluster_size)
+
+        # Fairness counts night shifts over the least loaded candidate, so it doesn't outgrow UNFILLED_SHIFT4_COST
+        baseline = min((self.night_shift_load(doctor) for doctors in candidates.values() for doctor in doctors), default=0)
+        options = {
+            key: [(doctor, self.shift4_cluster_cost(doctor, key[1], baseline)) for doctor in doctors]
+            for key, doctors in candidates.items()
+        }
+
+        # best[offset] maps the doctor working the night before offset to (cost, back pointer)
+        best = [{} for _ in range(num_days + 1)]
+        if start > 0:
+            night_before = self.calendar[start - 1].shifts["s4"]
+        else:
+            # Nor may a run carried over from the previous month be extended
+            last_night = self.calendar[0].date - timedelta(days=1)
+            night_before = next((
+                doc for doc in self.doctors for shift_date, shift_type in doc.previous_month_shifts
+                if shift_date == last_night and normalize_shift_index(shift_type) == SHIFT_INDEX["s4"]
+            ), None)
+        best[0][night_before] = (0, None)
+
+        def relax(offset, doctor, cost, back):
+            if doctor not in best[offset] or cost < best[offset][doctor][0]:
+                best[offset][doctor] = (cost, back)
+
+        for offset in range(num_days):
+            if not best[offset]:
+                continue
+
+            # The two cheapest states are enough to find the best predecessor that isn't a given doctor
+            cheapest = heapq.nsmallest(2, best[offset].items(), key=lambda item: item[1][0])
+            prev_doctor, (prev_cost, _) = cheapest[0]
+
+            cal_day = self.calendar[start + offset]
+            if cal_day.is_shift_filled("s4"):
+                relax(offset + 1, cal_day.shifts["s4"], prev_cost, (offset, prev_doctor, 1, None))
+                continue
+
+            relax(offset + 1, None, prev_cost + UNFILLED_SHIFT4_COST, (offset, prev_doctor, 1, None))
+
+            for cluster_size in range(1, 5):
+                for doctor, cost in options.get((offset, cluster_size), ()):
+                    if doctor is prev_doctor:
+                        if len(cheapest) < 2:
+                            continue
+                        other_doctor, (other_cost, _) = cheapest[1]
+                        relax(offset + cluster_size, doctor, other_cost + cost, (offset, other_doctor, cluster_size, doctor))
+                    else:
+                        relax(offset + cluster_size, doctor, prev_cost + cost, (offset, prev_doctor, cluster_size, doctor))
+
+        # Walk the back pointers from the cheapest final state
+        plan = []
+        offset, (doctor, (cost, back)) = num_days, min(best[num_days].items(), key=lambda item: item[1][0])
+        while back is not None:
+            prev_offset, prev_doctor, cluster_size, cluster_doctor = back
+            plan.append((start + prev_offset, cluster_size, cluster_doctor))
+            offset = prev_offset
+            cost, back = best[offset][prev_doctor]
+
+        plan.reverse()
+        return plan
+
+    def night_shift_load(self, doctor):
+        """
+        Returns:
+            int: Night shifts the doctor has this month plus those from earlier months (prior_night_shifts).
+        """
+        return doctor.night_shifts + self.prior_night_shifts.get(doctor, 0)
+
+    def shift4_cluster_cost(self, doctor, cluster_size, baseline=0):
+        """
+        Cost of giving a shift 4 cluster of the given size to a doctor (used by plan_shift4_gap).
+
+        Args:
+            doctor (Doctor): The doctor to give the cluster to.
+            cluster_size (int): Number of nights in the cluster (1-4).
+            baseline (int): Night shift load of the least loaded candidate; only the load above it
+                (up to SHIFT4_FAIRNESS_MAX_LEAD) adds cost.
+        """
+        cost = CLUSTER_SIZE_COST[cluster_size]
+        cost += SHIFT4_PREFERENCE_COST * max(0, 5 - doctor.shift_prefs[3]) * cluster_size
+        lead = min(max(0, self.night_shift_load(doctor) - baseline), SHIFT4_FAIRNESS_MAX_LEAD)
+        cost += SHIFT4_FAIRNESS_COST * lead * cluster_size
+        if doctor == self.last_doctor_shift4:
+            cost += REPEAT_SHIFT4_DOCTOR_COST
+        return cost
 
     def identify_pat_gaps(self):
         """
-        Identify gaps between PAT's scheduled shifts in the calendar.
+        Identify the gaps between the night specialists' scheduled shifts (all of them together) in the calendar.
 
         Returns:
             list of tuples: Each tuple contains the start date of a gap and its size in days.
@@ -327,25 +1087,26 @@ class Scheduler:
         gaps = []
         last_pat_date = None
 
-        # Find the first PAT shift
+        # Find the nights any specialist works
         pat_shift_dates = [
             cal_day.date
             for cal_day in self.calendar
-            if cal_day.is_shift_filled("s4") and cal_day.shifts["s4"].name == "PAT"
+            if cal_day.is_shift_filled("s4") and cal_day.shifts["s4"].is_night_specialist
         ]
+        if not pat_shift_dates:
+            return [(self.calendar[0].date, len(self.calendar))] if self.calendar else []
 
-        # Add a gap from the start of the calendar to the first PAT shift, if applicable
-        if pat_shift_dates and pat_shift_dates[0] > self.calendar[0].date:
+        # Add a gap from the start of the calendar to the first specialist shift, if applicable
+        if pat_shift_dates[0] > self.calendar[0].date:
             gaps.append((self.calendar[0].date, (pat_shift_dates[0] - self.calendar[0].date).days))
 
-        for cal_day in self.calendar:
-            if cal_day.is_shift_filled("s4") and cal_day.shifts["s4"].name == "PAT":
-                if last_pat_date and (cal_day.date - last_pat_date).days > 1:
-                    gaps.append((last_pat_date + timedelta(days=1), (cal_day.date - last_pat_date).days - 1))
-                last_pat_date = cal_day.date
+        for shift_date in pat_shift_dates:
+            if last_pat_date and (shift_date - last_pat_date).days > 1:
+                gaps.append((last_pat_date + timedelta(days=1), (shift_date - last_pat_date).days - 1))
+            last_pat_date = shift_date
 
-        # If PAT's last shift doesn't reach the end of the calendar, capture the final gap
-        if last_pat_date and last_pat_date < self.calendar[-1].date:
+        # If the last specialist shift doesn't reach the end of the calendar, capture the final gap
+        if last_pat_date < self.calendar[-1].date:
             gaps.append((last_pat_date + timedelta(days=1), (self.calendar[-1].date - last_pat_date).days))
 
         #print("Gaps: ", gaps)
@@ -362,20 +1123,39 @@ class Scheduler:
         if not available_doctors:
             return best_doctor
         
-        best_doctor = sorted(
-            available_doctors,
-            key=lambda doc: (
-                -doc.shift_prefs[3],  # Higher shift preference for s4 is better
-                doc == self.last_doctor_shift4,  # De-prioritize the last doctor to work s4 (True sorts after False)
-                doc.last_shift_date.date if isinstance(doc.last_shift_date, CalDay) 
-                else (doc.last_shift_date if isinstance(doc.last_shift_date, date) else date.min),  # Extract actual date
-                doc.night_shifts, # Fewest night shifts scheduled
-                doc.total_shifts  # Fewest shifts scheduled
-            ),
-        )[0]
+        # min() keeps the first of equally ranked doctors, the same tie-break as a stable sort
+        best_doctor = min(available_doctors, key=self.shift4_cluster_priority)
         
         return best_doctor
 
+    def rank_doctors_for_4cluster(self, cluster_days, cluster_size, k=5):
+        """
+        List the top candidates for a shift 4 cluster, best first, without sorting the whole roster.
+
+        Args:
+            cluster_days (list of CalDay): Days in the cluster being scheduled.
+            cluster_size (int): Number of days in the cluster.
+            k (int): Maximum number of candidates to return.
+
+        Returns:
+            list of Doctor: Up to k doctors in the order select_best_doctor_for_4cluster would pick them.
+        """
+        available_doctors = self.get_available_doctors_for_shift4_cluster(cluster_days, cluster_size)
+        return heapq.nsmallest(k, available_doctors, key=self.shift4_cluster_priority)
+
+    def shift4_cluster_priority(self, doc):
+        """
+        Sort key for shift 4 cluster candidates (lower is better).
+        """
+        return (
+            -doc.shift_prefs[3],  # Higher shift preference for s4 is better
+            doc == self.last_doctor_shift4,  # De-prioritize the last doctor to work s4 (True sorts after False)
+            doc.last_shift_date.date if isinstance(doc.last_shift_date, CalDay) 
+            else (doc.last_shift_date if isinstance(doc.last_shift_date, date) else date.min),  # Extract actual date
+            doc.night_shifts, # Fewest night shifts scheduled
+            doc.total_shifts  # Fewest shifts scheduled
+        )
+
     def determine_cluster_plan(self, gap_size):
         """
         Determine the ideal cluster plan based on the gap size (X).
@@ -423,8 +1203,8 @@ class Scheduler:
         if doctor.shift_prefs[3] == 0:
             return False
 
-        # Don't schedule PAT
-        if doctor.name == "PAT":
+        # Night specialists have their own clusters
+        if doctor.is_night_specialist:
             return False
         
         # Check if the doctor has the day off for any day in the cluster
@@ -461,17 +1241,12 @@ class Scheduler:
             # Count how many consecutive s4 shifts the doctor already has
             consecutive_s4_count = 0
             
-            current_date = cluster_days[0].date - timedelta(days=1)  # Start from the previous day
+            index = self.date_to_index.get(cluster_days[0].date, 0) - 1  # Start from the previous day
 
             # Iterate backwards through the calendar
-            while current_date >= self.calendar[0].date:
-                cal_day = next((day for day in self.calendar if day.date == current_date), None)
-
-                if not cal_day or cal_day.shifts.get("s4") != doctor:
-                    break  # Stop if no s4 shift or a different doctor was scheduled
-
+            while index >= 0 and self.calendar[index].shifts.get("s4") == doctor:
                 consecutive_s4_count += 1
-                current_date -= timedelta(days=1)
+                index -= 1
 
             # If adding this cluster would push them over 5 consecutive shifts, exclude them
             if consecutive_s4_count + cluster_size <= 5:
@@ -483,6 +1258,35 @@ class Scheduler:
         
         return filtered_doctors  # Updated return statement to use filtered list
     
+    def shift4_rejection_codes(self, cluster_days, cluster_size):
+        """
+        Rejection codes (see rejections.py) of every doctor for a shift 4 cluster, following
+        is_doctor_eligible_for_cluster and the consecutive limit of get_available_doctors_for_shift4_cluster.
+
+        Returns:
+            numpy.ndarray: One uint8 code per doctor, 0 for doctors who can work the cluster.
+        """
+        codes = np.zeros(len(self.doctors), dtype=np.uint8)
+        start_index = self.date_to_index.get(cluster_days[0].date, 0)
+        for doctor_id, doctor in enumerate(self.doctors):
+            code = 0
+            if doctor.shift_prefs[3] == 0:
+                code |= REJECT_ZERO_PREFERENCE
+            if doctor.is_night_specialist:
+                code |= REJECT_NIGHT_SPECIALIST
+            if any(day.date in doctor.days_off or (day.date + timedelta(days=1)) in doctor.days_off for day in cluster_days):
+                code |= REJECT_DAY_OFF
+            if (doctor.total_shifts + cluster_size) >= doctor.max_shifts:
+                code |= REJECT_MAX_SHIFTS
+
+            run = 0
+            while start_index - run - 1 >= 0 and self.calendar[start_index - run - 1].shifts.get("s4") == doctor:
+                run += 1
+            if run + cluster_size > 5:
+                code |= REJECT_CONSECUTIVE_CAP
+            codes[doctor_id] = code
+        return codes
+
     def assign_shift(self, cal_day, doctor, shift_type):
         """
         Assigns a doctor to a shift, ensuring both calendar and doctor records are updated.
@@ -495,12 +1299,164 @@ class Scheduler:
         Returns:
             bool: True if the assignment was successful, False otherwise.
         """
+        previous_last_shift_date = doctor.last_shift_date
         if cal_day.assign_shift(shift_type, doctor):  # Assign to the calendar first
             doctor.assign_shift(cal_day, shift_type)  # Assign to the doctor's record
+            self.ledgers.setdefault(doctor, ShiftLedger()).record(cal_day.date, shift_type)
+            self.set_assigned(doctor, cal_day, shift_type, True)
+            if self.undo_log is not None:
+                self.undo_log.append(("assign", cal_day, shift_type, doctor, previous_last_shift_date))
             #print(f"DEBUG: Successfully assigned {doctor.name} to {shift_type} on {cal_day.date.strftime('%b %d')}")
             return True
         return False
 
+    def unassign_shift(self, cal_day, shift_type):
+        """
+        Empty a shift, undoing everything assign_shift recorded for it.
+
+        If the day was the doctor's last_shift_date, it moves back to the latest day they still work.
+
+        Args:
+            cal_day (CalDay): The calendar day of the shift.
+            shift_type (str): The shift type ('s1', 's2', 's3', 's4').
+
+        Returns:
+            Doctor or None: The doctor who was removed, or None if the shift was empty.
+        """
+        doctor = cal_day.shifts[shift_type]
+        if doctor is None:
+            return None
+
+        previous_last_shift_date = doctor.last_shift_date
+        cal_day.shifts[shift_type] = None
+        doctor.unassign_shift(cal_day, shift_type)
+        ledger = self.ledgers.setdefault(doctor, ShiftLedger())
+        ledger.remove(cal_day.date, shift_type)
+        self.set_assigned(doctor, cal_day, shift_type, False)
+        if doctor.last_shift_date is cal_day:
+            last_day = ledger.last_day()
+            doctor.last_shift_date = self.get_cal_day(last_day) if last_day else datetime.min.date()
+
+        if self.undo_log is not None:
+            self.undo_log.append(("unassign", cal_day, shift_type, doctor, previous_last_shift_date))
+        return doctor
+
+    def set_assigned(self, doctor, cal_day, shift_type, value):
+        """
+        Mirror one assignment change into assigned_mask (and the free night runs, for 4-shifts).
+        """
+        doctor_id = self.assignments.doctor_ids[doctor]
+        day_index = self.date_to_index[cal_day.date]
+        if doctor_id < len(self.doctors):
+            self.assigned_mask[doctor_id, day_index, SHIFT_INDEX[shift_type]] = value
+        if shift_type == "s4" and self.free_runs is not None:
+            self.update_free_runs(day_index)
+
+    def set_last_doctor_shift4(self, doctor):
+        """
+        Record the doctor who most recently worked a 4 shift (logged for rollback like an assignment).
+        """
+        if self.undo_log is not None:
+            self.undo_log.append(("last_shift4", self.last_doctor_shift4))
+        self.last_doctor_shift4 = doctor
+
+    def savepoint(self):
+        """
+        Start logging changes so they can be rolled back (savepoints nest).
+
+        While a savepoint is open, assign_shift, unassign_shift, update_consecutive_shifts and
+        set_last_doctor_shift4 append the state they overwrite to an undo log, so each change costs
+        O(1) to log and to undo.
+
+        Returns:
+            int: Token to pass to rollback.
+        """
+        if self.undo_log is None:
+            self.undo_log = []
+        return len(self.undo_log)
+
+    def rollback(self, savepoint=0):
+        """
+        Undo every change made since the savepoint, newest first. Later savepoints are discarded,
+        the given one stays open.
+
+        Args:
+            savepoint (int): Token returned by savepoint (0 undoes everything since logging began).
+        """
+        log = self.undo_log or []
+        while len(log) > savepoint:
+            entry = log.pop()
+            if entry[0] == "consecutive":
+                _, doctor, count = entry
+                doctor.consecutive_shifts = count
+                self.set_consecutive_count(doctor)
+                continue
+            if entry[0] == "run_set":
+                self.doctors_on_run = entry[1]
+                continue
+            if entry[0] == "last_shift4":
+                self.last_doctor_shift4 = entry[1]
+                continue
+
+            action, cal_day, shift_type, doctor, last_shift_date = entry
+            if action == "assign":
+                cal_day.shifts[shift_type] = None
+                doctor.unassign_shift(cal_day, shift_type)
+                self.ledgers[doctor].remove(cal_day.date, shift_type)
+                self.set_assigned(doctor, cal_day, shift_type, False)
+            else:
+                cal_day.shifts[shift_type] = doctor
+                doctor.assign_shift(cal_day, shift_type)
+                self.ledgers.setdefault(doctor, ShiftLedger()).record(cal_day.date, shift_type)
+                self.set_assigned(doctor, cal_day, shift_type, True)
+            doctor.last_shift_date = last_shift_date
+
+    def commit(self, savepoint=0):
+        """
+        Keep the changes made since the savepoint. Committing an inner savepoint leaves its changes in
+        the undo log, so rolling back an outer savepoint still undoes them; logging stops only once the
+        outermost savepoint is committed.
+
+        Args:
+            savepoint (int): Token returned by savepoint (0 commits everything and stops logging).
+        """
+        if savepoint == 0:
+            self.undo_log = None
+
+    def snapshot(self):
+        """
+        Take a frozen copy of the current schedule that later branches can restore.
+
+        Returns:
+            ScheduleSnapshot: The assignments and every doctor's counters.
+        """
+        counters = tuple(
+            (doc.total_shifts, doc.night_shifts, doc.weekend_shifts, doc.consecutive_shifts, doc.last_shift_date)
+            for doc in self.doctors
+        )
+        dates = tuple(cal_day.date for cal_day in self.calendar)
+        return ScheduleSnapshot(dates, self.assignments.copy(), counters, self.last_doctor_shift4)
+
+    def restore(self, snapshot):
+        """
+        Put the calendar and the doctors back into the state of a snapshot taken from this scheduler,
+        e.g. to try several ways of finishing a month from the same start. Open savepoints are dropped.
+
+        Args:
+            snapshot (ScheduleSnapshot): The state to return to.
+        """
+        if snapshot.dates != tuple(cal_day.date for cal_day in self.calendar):
+            raise ValueError("The snapshot was taken from a different calendar")
+
+        self.assignments.cells[:] = snapshot.matrix.cells  # in place, so every CalDay keeps its view
+        for doc, counters in zip(self.doctors, snapshot.counters):
+            doc.total_shifts, doc.night_shifts, doc.weekend_shifts, doc.consecutive_shifts, doc.last_shift_date = counters
+        self.last_doctor_shift4 = snapshot.last_shift4_doctor
+        self.undo_log = None
+        self.sync_with_calendar()
+        self.sync_consecutive_counts()
+
+    @timed_phase("schedule_remaining_shifts")
     def schedule_remaining_shifts(self, num_shifts):
         """
         Schedule remaining shifts for the month based on the number of shifts per day.
@@ -508,14 +1464,12 @@ class Scheduler:
         Args:
             num_shifts (int): Number of shifts to schedule (3 or 4).
         """
-        # Define which shifts to schedule (excluding s4)
-        shifts_to_schedule = ["s1", "s3"]
-        if num_shifts == 4:
-            shifts_to_schedule = ["s1", "s2", "s3"]
-        if num_shifts == 3:
-            for doc in self.doctors:
-                doc.shift_prefs[2] = min(doc.shift_prefs[1], 3) # cap at 3 to avoid overscheduling docs like HRA
-        
+        shifts_to_schedule = self.configure_day_shifts(num_shifts)
+
+        # Pick up preference and consecutive count changes made since the scheduler was created
+        self.build_static_availability()
+        self.sync_consecutive_counts()
+
         for cal_day in self.calendar:
             # Schedule all shifts for this day
             for shift in shifts_to_schedule:
@@ -526,6 +1480,108 @@ class Scheduler:
 
             self.update_consecutive_shifts(cal_day.date)  # Update consecutive_shifts
 
+    def configure_day_shifts(self, num_shifts):
+        """
+        Work out which day shifts to schedule for the number of shifts per day. In 3-shift mode the
+        3-shift preference follows the 2-shift preference.
+
+        Args:
+            num_shifts (int): Number of shifts per day (3 or 4).
+
+        Returns:
+            list: Day shift types to schedule (excluding s4).
+        """
+        # Define which shifts to schedule (excluding s4)
+        shifts_to_schedule = ["s1", "s3"]
+        if num_shifts == 4:
+            shifts_to_schedule = ["s1", "s2", "s3"]
+        if num_shifts == 3:
+            for doc in self.doctors:
+                doc.shift_prefs[2] = min(doc.shift_prefs[1], 3) # cap at 3 to avoid overscheduling docs like HRA
+        return shifts_to_schedule
+
+    def solve(self, num_shifts=4, mode="greedy", time_limit=10.0, improve_time=0):
+        """
+        Build the whole month's schedule.
+
+        Args:
+            num_shifts (int): Number of shifts per day (3 or 4).
+            mode (str): "greedy" runs schedule_pat, schedule_remaining_shift4 and schedule_remaining_shifts
+                in turn. "cp" schedules PAT, then fills every other open shift with the CPSolver search.
+            time_limit (float): Seconds the "cp" search may spend improving its first solution.
+            improve_time (float): If positive, seconds of improve_schedule to run on the day shifts afterwards.
+
+        Returns:
+            list: The calendar with the schedule filled in.
+        """
+        self.initialize_consecutive_shifts_from_previous_month()
+        self.schedule_pat()
+
+        if mode == "cp":
+            self.solve_open_shifts(["s4"] + self.configure_day_shifts(num_shifts), time_limit)
+        elif mode == "greedy":
+            self.schedule_remaining_shift4()
+            self.schedule_remaining_shifts(num_shifts)
+        else:
+            raise ValueError(f"Unknown scheduling mode: {mode}")
+
+        if improve_time > 0:
+            self.improve_schedule(shift_types=self.configure_day_shifts(num_shifts), time_limit=improve_time)
+
+        return self.calendar
+
+    @timed_phase("solve_open_shifts")
+    def solve_open_shifts(self, shift_types, time_limit=10.0):
+        """
+        Fill every open shift of the given types with the CPSolver search, keeping assigned shifts as they are.
+
+        Args:
+            shift_types (list): Shift types to fill, e.g. ["s4", "s1", "s2", "s3"].
+            time_limit (float): Seconds the search may spend improving its first solution.
+        """
+        for day_index, shift_type, doctor in CPSolver(self, shift_types, time_limit).solve():
+            self.assign_shift(self.calendar[day_index], doctor, shift_type)
+            if shift_type == "s4":
+                self.set_last_doctor_shift4(doctor)
+
+        # Bring consecutive_shifts up to the end of the month, as schedule_remaining_shifts does
+        self.sync_consecutive_counts()
+        for cal_day in self.calendar:
+            self.update_consecutive_shifts(cal_day.date)
+
+    @timed_phase("improve_schedule")
+    def improve_schedule(self, shift_types=("s1", "s2", "s3"), time_limit=5.0, seed=None):
+        """
+        Run a LocalSearch (simulated annealing over move and swap neighbourhoods) on the finished
+        schedule and apply the best schedule it finds.
+
+        Args:
+            shift_types (iterable): Shift types that may be reassigned.
+            time_limit (float): Wall-clock budget in seconds.
+            seed (int): Seed for the random move generator.
+
+        Returns:
+            int: Number of shifts that changed hands.
+        """
+        changes = LocalSearch(self, shift_types, time_limit, seed).run()
+
+        for day_index, shift_type, old_doctor, new_doctor in changes:
+            cal_day = self.calendar[day_index]
+            self.unassign_shift(cal_day, shift_type)
+            self.assign_shift(cal_day, new_doctor, shift_type)
+
+        if changes:
+            # Consecutive counts describe the run ending on the last day of the month
+            # (a run covering the whole month also carries days from the previous month, so keep it)
+            last_day = self.calendar[-1].date
+            for doctor in self.doctors:
+                run = self.ledgers[doctor].run_ending_at(last_day)
+                if run < len(self.calendar):
+                    doctor.consecutive_shifts = run
+            self.sync_consecutive_counts()
+
+        return len(changes)
+
     def select_best_doctor_for_shift(self, cal_day, shift):
         """
         Select the best available doctor for a given shift on a given day.
@@ -549,44 +1605,51 @@ class Scheduler:
         #         f"Shift Pref: {doc.shift_prefs[int(shift[1]) - 1]}, "
         #         f"Flip Shifts: {doc.flip_shifts}, "
         #         f"Shift Ratio: {doc.total_shifts / doc.max_shifts:.2f}")
-            
-        doctor_names = sorted(
-            available_doctors,
-            key=lambda doc: (
-                doc.consecutive_shifts >= 4, # De-prioritize docs with consecutive shifts >= 4
-                doc.total_shifts >= doc.max_shifts, # De-prioritize docs that have been scheduled for their max shifts
-                -doc.shift_prefs[int(shift[1]) - 1],  # Higher preference for this shift is better
-                doc.flip_shifts != "Yes", # Higher preference for doctors with Flip Shifts Requested (i.e., part-time docs)
-                doc.total_shifts / doc.max_shifts,  # Prefer doctors who are farther from their max shift allocation
-            )
-        )
-
-        doctor_names = [doc.name for doc in doctor_names]
-                              
-        # print(f"DEBUG: Date: {cal_day.date.strftime('%b %d')}, Shift: {shift}, Available Doctors: {', '.join(doctor_names) if doctor_names else 'None'}")
-        # print()
 
         if not available_doctors:
             print(f"WARNING: No available doctors for {shift} on {cal_day.date.strftime('%b %d')}")
+            if self.instrumentation:
+                self.instrumentation.record("unfilled_shift", date=cal_day.date, shift=shift,
+                                            rejections=dict(self.instrumentation.last_rejections))
             return None
 
-        # Step 2: Sort doctors based on priority
-        best_doctor = sorted(
-            available_doctors,
-            key=lambda doc: (
-                doc.consecutive_shifts >= 4, # De-prioritize docs with consecutive shifts >= 4
-                doc.total_shifts >= doc.max_shifts, # De-prioritize docs that have been scheduled for their max shifts
-                -doc.shift_prefs[int(shift[1]) - 1],  # Higher preference for this shift is better
-                doc.flip_shifts != "Yes", # Higher preference for doctors with Flip Shifts Requested (i.e., part-time docs)
-                doc.total_shifts / doc.max_shifts,  # Prefer doctors who are farther from their max shift allocation
-            )
-        )[0]
+        # Step 2: Pick the highest priority doctor in a single pass
+        # (min() keeps the first of equally ranked doctors, the same tie-break as a stable sort)
+        best_doctor = min(available_doctors, key=lambda doc: self.shift_priority(doc, shift))
 
         return best_doctor
+
+    def rank_doctors_for_shift(self, cal_day, shift, k=5):
+        """
+        List the top candidates for a shift, best first, without sorting every available doctor.
+
+        Args:
+            cal_day (CalDay): The calendar day for which we are assigning a shift.
+            shift (str): The shift type ("s1", "s2", or "s3").
+            k (int): Maximum number of candidates to return.
+
+        Returns:
+            list of Doctor: Up to k doctors in the order select_best_doctor_for_shift would pick them.
+        """
+        available_doctors = self.get_available_doctors(cal_day, shift)
+        return heapq.nsmallest(k, available_doctors, key=lambda doc: self.shift_priority(doc, shift))
+
+    def shift_priority(self, doc, shift):
+        """
+        Sort key for day shift candidates (lower is better).
+        """
+        return (
+            doc.consecutive_shifts >= 4, # De-prioritize docs with consecutive shifts >= 4
+            doc.total_shifts >= doc.max_shifts, # De-prioritize docs that have been scheduled for their max shifts
+            -doc.shift_prefs[int(shift[1]) - 1],  # Higher preference for this shift is better
+            doc.flip_shifts != "Yes", # Higher preference for doctors with Flip Shifts Requested (i.e., part-time docs)
+            doc.total_shifts / doc.max_shifts,  # Prefer doctors who are farther from their max shift allocation
+        )
     
     def get_available_doctors(self, cal_day, shift):
         """
-        Get the list of doctors available for a given shift on a given day.
+        Get the list of doctors available for a given shift on a given day, and record why
+        the others aren't in self.rejections.
 
         Args:
             cal_day (CalDay): The calendar day for which we are determining availability.
@@ -595,94 +1658,68 @@ class Scheduler:
         Returns:
             List[Doctor]: A list of available doctors.
         """
-        available_doctors = []
-
-        for doc in self.doctors:
-            # Skip if the doctor has the day off
-            if cal_day.date in doc.days_off:
-                continue
-
-            # Skip if the doctor has no preference for this shift
-            shift_index = int(shift[1]) - 1  # Convert "s1" -> index 0, "s2" -> index 1, etc.
-            if doc.shift_prefs[shift_index] == 0:
-                continue
-
-            # Skip if doctor has already worked 5 consecutive shifts
-            if doc.consecutive_shifts >= 5:
-                continue
-
-            # Check if doctor is already scheduled for another shift that day
-            if any(scheduled_doc == doc for scheduled_doc in cal_day.shifts.values()):
-                continue
-
-            # Determine the date(s) we need to check for past shifts
-            prev_day = cal_day.date - timedelta(days=1)
-            two_days_ago = cal_day.date - timedelta(days=2)
+        day_index = self.date_to_index[cal_day.date]
+        codes = self.rejection_codes(day_index, shift)
+
+        # Remove doctors whose run would go past 5 days once it reaches the days already booked ahead
+        doctor_ids = np.flatnonzero(codes == 0)
+        if day_index + 1 < len(self.calendar):
+            future_day = cal_day.date + timedelta(days=1)
+            for i in doctor_ids:
+                if self.consecutive_counts[i] + 1 + self.ledgers[self.doctors[i]].run_starting_at(future_day) > 5:
+                    codes[i] |= REJECT_CONSECUTIVE_CAP
+            doctor_ids = np.flatnonzero(codes == 0)
+
+        self.rejections.record(cal_day.date, shift, codes)
+
+        stats = self.instrumentation
+        if stats:
+            # Count the doctors each rule removes, applying the rules in bit order
+            stats.start_filter(len(self.doctors))
+            applied = 0
+            for bit, reason in REJECTION_REASONS.items():
+                applied |= bit
+                stats.filter_step(reason, int(np.count_nonzero((codes & applied) == 0)))
+
+        available_doctors = [self.doctors[i] for i in doctor_ids]
 
-            # Look up the previous day's shift from the calendar if within the same month
-            prev_day_obj = next((d for d in self.calendar if d.date == prev_day), None)
-
-            # If the day is outside the calendar (first day of the month), check previous month shifts
-            prev_day_s2_or_s3 = False
-            if prev_day_obj:
-                prev_day_s2_or_s3 = prev_day_obj.shifts.get("s2") == doc or prev_day_obj.shifts.get("s3") == doc
-            else:
-                # If no prev_day_obj exists, check previous month's shift history
-                if (prev_day, "s2") in doc.previous_month_shifts or (prev_day, "s3") in doc.previous_month_shifts:
-                    prev_day_s2_or_s3 = True
-
-            # Skip doctor if they worked a later shift the previous day
-            if shift == "s1" and prev_day_s2_or_s3:
-                continue
-            if shift == "s2" and prev_day_obj and prev_day_obj.shifts.get("s3") == doc:
-                continue
-            if shift == "s2" and not prev_day_obj and (prev_day, "s3") in doc.previous_month_shifts:
-                continue
-
-            # Look up 4-shifts from the last 2 days (across both calendar and previous month)
-            last_2_days_s4 = False
-            for check_date in [prev_day, two_days_ago]:
-                past_day_obj = next((d for d in self.calendar if d.date == check_date), None)
-                if past_day_obj and past_day_obj.shifts.get("s4") == doc:
-                    last_2_days_s4 = True
-                    break
-                if (check_date, "s4") in doc.previous_month_shifts:
-                    last_2_days_s4 = True
-                    break
+        return available_doctors
 
-            # Skip doctor if they worked a 4-shift in either of the last 2 days
-            if last_2_days_s4:
-                continue
+    def rejection_codes(self, day_index, shift):
+        """
+        Rejection codes (see rejections.py) of every doctor for a day shift, from the static rules and
+        the shifts assigned so far. Runs that only go too long because of days booked ahead aren't
+        included; get_available_doctors adds those for the doctors that pass everything else.
 
-            # If none of the conditions exclude the doctor, add them to the list
-            available_doctors.append(doc)
+        Args:
+            day_index (int): Calendar index of the day.
+            shift (str): The shift type ("s1", "s2", or "s3").
 
-        # Step 1: Identify doctors scheduled the following day
-        future_day = cal_day.date + timedelta(days=1)
-        future_day_cal = next((d for d in self.calendar if d.date == future_day), None)
-        
-        # Step 2: Track consecutive days in the future
-        future_consecutive_days = {}
+        Returns:
+            numpy.ndarray: One uint8 code per doctor, 0 for doctors who can work the shift.
+        """
+        assigned = self.assigned_mask
+        codes = self.static_rejections[:, day_index, SHIFT_INDEX[shift]].copy()
 
-        if future_day_cal:
-            for doctor in available_doctors:
-                count = 0
-                next_day = future_day_cal
+        # Doctors already scheduled for another shift that day
+        codes[assigned[:, day_index, :].any(axis=1)] |= REJECT_ALREADY_SCHEDULED
 
-                while next_day and any(shift_doc == doctor for shift_doc in next_day.shifts.values()):
-                    count += 1
-                    next_day = next((d for d in self.calendar if d.date == next_day.date + timedelta(days=1)), None)
+        # Doctors who worked a later shift the previous day
+        if day_index >= 1:
+            if shift == "s1":
+                codes[assigned[:, day_index - 1, SHIFT_INDEX["s2"]] | assigned[:, day_index - 1, SHIFT_INDEX["s3"]]] |= REJECT_TURNAROUND
+            elif shift == "s2":
+                codes[assigned[:, day_index - 1, SHIFT_INDEX["s3"]]] |= REJECT_TURNAROUND
 
-                future_consecutive_days[doctor] = count
+        # Doctors who worked a 4-shift in either of the last 2 days
+        for days_back in (1, 2):
+            if day_index >= days_back:
+                codes[assigned[:, day_index - days_back, SHIFT_INDEX["s4"]]] |= REJECT_SHIFT4_REST
 
-        # Step 3: Remove doctors who would exceed 5 consecutive shifts
-        available_doctors = [
-            doctor for doctor in available_doctors
-            if doctor.consecutive_shifts + 1 + future_consecutive_days.get(doctor, 0) <= 5
-        ]
+        # Doctors who would exceed 5 consecutive shifts
+        codes[self.consecutive_counts + 1 > 5] |= REJECT_CONSECUTIVE_CAP
+        return codes
 
-        return available_doctors
-    
     def initialize_consecutive_shifts_from_previous_month(self):
         """
         Initializes consecutive shift counts for each doctor based on their shifts at the end of the previous month.
@@ -690,6 +1727,10 @@ class Scheduler:
         This function analyzes a doctor's previous month's shifts and determines how many consecutive days 
         they worked leading into the first day of the new month.
         """
+        log = self.undo_log
+        if log is not None:
+            log.append(("run_set", set(self.doctors_on_run)))
+
         for doctor in self.doctors:
             consecutive_days = 0
 
@@ -711,7 +1752,14 @@ class Scheduler:
                     break  # Stop if there's a gap
 
             # Set the initial consecutive shift count for the doctor
+            if log is not None:
+                log.append(("consecutive", doctor, doctor.consecutive_shifts))
             doctor.consecutive_shifts = consecutive_days
+            self.set_consecutive_count(doctor)
+            if consecutive_days:
+                self.doctors_on_run.add(doctor)
+            else:
+                self.doctors_on_run.discard(doctor)
 
         # for doctor in self.doctors:
         #     print(f"Doctor: {doctor.name}, Consecutive Shifts: {doctor.consecutive_shifts}")
@@ -720,23 +1768,44 @@ class Scheduler:
         """
         Updates consecutive shift counts for all doctors based on whether they worked on the given date.
 
+        Only the doctors working today and those on a run yesterday can change, so this touches
+        at most a few doctors per day instead of the whole roster.
+
         Args:
             current_date (datetime.date): The date for which scheduling has been completed.
         """
         doctors_who_worked_today = set()
 
         # Identify doctors scheduled on the given date
-        for cal_day in self.calendar:
-            if cal_day.date == current_date:
-                for shift in cal_day.shifts.values():
-                    if shift:  # If a doctor was assigned to any shift
-                        doctors_who_worked_today.add(shift)  # Add doctor object
+        day_index = self.date_to_index.get(current_date)
+        if day_index is not None:
+            for shift_type, doctor in self.assignments.day_assignments(day_index):
+                doctors_who_worked_today.add(doctor)
+
+        log = self.undo_log
+        if log is not None:
+            log.append(("run_set", self.doctors_on_run))
 
         # Increment consecutive shifts for doctors who worked today
         for doctor in doctors_who_worked_today:
+            if log is not None:
+                log.append(("consecutive", doctor, doctor.consecutive_shifts))
             doctor.consecutive_shifts += 1
+            self.set_consecutive_count(doctor)
 
-        # Reset consecutive shifts for doctors who did NOT work today
-        for doctor in self.doctors:
-            if doctor not in doctors_who_worked_today:
-                doctor.consecutive_shifts = 0
\ No newline at end of file
+        # Reset consecutive shifts for doctors whose run ended today
+        for doctor in self.doctors_on_run - doctors_who_worked_today:
+            if log is not None:
+                log.append(("consecutive", doctor, doctor.consecutive_shifts))
+            doctor.consecutive_shifts = 0
+            self.set_consecutive_count(doctor)
+
+        self.doctors_on_run = doctors_who_worked_today
+
+    def set_consecutive_count(self, doctor):
+        """
+        Mirror a doctor's consecutive_shifts into the consecutive_counts array.
+        """
+        doctor_id = self.assignments.doctor_ids[doctor]
+        if doctor_id < len(self.consecutive_counts):
+            self.consecutive_counts[doctor_id] = doctor.consecutive_shifts
@@ -0,0 +1,151 @@
+from models import *
+from solver import (
+    UNFILLED_SHIFT_COST, MIN_SHIFTS_SHORTFALL_COST, SHIFT4_SINGLETON_COST, PREFERENCE_COST, normalize_shift_index,
+)
+import numpy as np
+
+def calendar_array(calendar, doctors):
+    """
+    Array form of a schedule.
+
+    Args:
+        calendar (list): List of CalDay objects.
+        doctors (list): List of Doctor objects; their list position is their id in the array.
+
+    Returns:
+        numpy.ndarray: (days x shifts) doctor ids, -1 for empty shifts (and doctors not in the list).
+    """
+    doctor_ids = {doctor: i for i, doctor in enumerate(doctors)}
+    return np.array(
+        [[doctor_ids.get(cal_day.shifts[shift_type], -1) for shift_type in SHIFT_TYPES] for cal_day in calendar],
+        dtype=np.int16,
+    ).reshape(-1, len(SHIFT_TYPES))
+
+class ScheduleScore:
+    def __init__(self, calendar, doctors, shift_types=SHIFT_TYPES):
+        """
+        Quality metrics of a finished schedule, worked out for every doctor at once from the array form
+        of the calendar. Per-doctor metrics are arrays in the order of doctors.
+
+        Args:
+            calendar (list): List of CalDay objects.
+            doctors (list): List of Doctor objects.
+            shift_types (iterable): Shift types that should be filled (e.g. s1, s3 and s4 with 3 shifts per day).
+        """
+        self.doctors = doctors
+        self.shift_types = list(shift_types)
+        cells = calendar_array(calendar, doctors)
+        num_doctors, num_days = len(doctors), len(calendar)
+
+        # worked[d, t, k]: doctor d works shift k on day t
+        days, shifts = np.nonzero(cells >= 0)
+        worked = np.zeros((num_doctors, num_days, len(SHIFT_TYPES)), dtype=bool)
+        worked[cells[days, shifts], days, shifts] = True
+        on_day = worked.any(axis=2)
+        nights = worked[:, :, SHIFT_INDEX["s4"]]
+        weekend = np.array([cal_day.weekend for cal_day in calendar], dtype=bool)
+
+        min_shifts = np.array([doc.min_shifts for doc in doctors], dtype=int)
+        max_shifts = np.array([doc.max_shifts for doc in doctors], dtype=int)
+        prefs = np.array([doc.shift_prefs[:len(SHIFT_TYPES)] for doc in doctors], dtype=int).reshape(-1, len(SHIFT_TYPES))
+        shifts_by_type = worked.sum(axis=1)
+
+        self.total_shifts = shifts_by_type.sum(axis=1)
+        self.night_shifts = nights.sum(axis=1)
+        self.weekend_shifts = (on_day & weekend).sum(axis=1)
+        self.min_shortfall = np.maximum(0, min_shifts - self.total_shifts)
+        self.max_excess = np.maximum(0, self.total_shifts - max_shifts)
+
+        # Preference points (1-5) earned across the doctor's shifts, and their average as a share of the top score
+        self.preference_points = (shifts_by_type * prefs).sum(axis=1)
+        self.preference_satisfaction = self.preference_points / np.maximum(1, 5 * self.total_shifts)
+        self.preference_shortfall = (shifts_by_type * np.maximum(0, 5 - prefs)).sum(axis=1)
+
+        # Runs of consecutive worked days: starts and ends come out of the padded row differences in
+        # the same (doctor, day) order, so they pair up
+        edges = np.diff(np.pad(on_day.astype(np.int8), ((0, 0), (1, 1))), axis=1)
+        run_doctors, run_starts = np.nonzero(edges == 1)
+        run_ends = np.nonzero(edges == -1)[1]
+        self.run_histogram = np.zeros((num_doctors, num_days + 1), dtype=int)  # [d, n]: runs of n days
+        np.add.at(self.run_histogram, (run_doctors, run_ends - run_starts), 1)
+        self.longest_run = np.zeros(num_doctors, dtype=int)
+        np.maximum.at(self.longest_run, run_doctors, run_ends - run_starts)
+
+        # Single-night 4-shift runs (a night on the previous month's last day counts as a neighbour)
+        night_before = np.array([
+            any(normalize_shift_index(shift_type) == SHIFT_INDEX["s4"] and (calendar[0].date - shift_date).days == 1
+                for shift_date, shift_type in doc.previous_month_shifts) if calendar else False
+            for doc in doctors
+        ], dtype=bool).reshape(-1, 1)
+        before = np.concatenate([night_before, nights[:, :-1]], axis=1)
+        after = np.pad(nights[:, 1:], ((0, 0), (0, 1)))
+        self.shift4_singletons = (nights & ~before & ~after).sum(axis=1)
+
+        # Schedule-wide metrics
+        self.unfilled = {shift_type: int((cells[:, SHIFT_INDEX[shift_type]] < 0).sum()) for shift_type in self.shift_types}
+        can_work_nights = prefs[:, SHIFT_INDEX["s4"]] > 0
+        self.night_balance = float(self.night_shifts[can_work_nights].std()) if can_work_nights.any() else 0.0
+        self.weekend_balance = float(self.weekend_shifts.std()) if num_doctors else 0.0
+
+    @property
+    def total_unfilled(self):
+        return sum(self.unfilled.values())
+
+    @property
+    def total_cost(self):
+        """
+        The search engines' objective (see ScheduleModel.total_cost), lower is better.
+        """
+        return int(
+            UNFILLED_SHIFT_COST * self.total_unfilled
+            + MIN_SHIFTS_SHORTFALL_COST * self.min_shortfall.sum()
+            + SHIFT4_SINGLETON_COST * self.shift4_singletons.sum()
+            + PREFERENCE_COST * self.preference_shortfall.sum()
+        )
+
+    def doctor_report(self):
+        """
+        Returns:
+            list: One dict of metrics per doctor.
+        """
+        return [
+            {
+                "name": doctor.name,
+                "total_shifts": int(self.total_shifts[d]),
+                "night_shifts": int(self.night_shifts[d]),
+                "weekend_shifts": int(self.weekend_shifts[d]),
+                "min_shortfall": int(self.min_shortfall[d]),
+                "max_excess": int(self.max_excess[d]),
+                "preference_satisfaction": round(float(self.preference_satisfaction[d]), 3),
+                "longest_run": int(self.longest_run[d]),
+                "runs": {int(n): int(count) for n, count in enumerate(self.run_histogram[d]) if count},
+                "shift4_singletons": int(self.shift4_singletons[d]),
+            }
+            for d, doctor in enumerate(self.doctors)
+        ]
+
+    def summary(self):
+        """
+        Returns:
+            dict: Schedule-wide metrics.
+        """
+        return {
+            "total_cost": self.total_cost,
+            "unfilled": dict(self.unfilled),
+            "min_shortfall": int(self.min_shortfall.sum()),
+            "max_excess": int(self.max_excess.sum()),
+            "preference_satisfaction": round(float(self.preference_points.sum() / max(1, 5 * self.total_shifts.sum())), 3),
+            "night_balance": round(self.night_balance, 3),
+            "weekend_balance": round(self.weekend_balance, 3),
+            "shift4_singletons": int(self.shift4_singletons.sum()),
+            "run_histogram": {int(n): int(count) for n, count in enumerate(self.run_histogram.sum(axis=0)) if count},
+        }
+
+def score_schedule(calendar, doctors, shift_types=SHIFT_TYPES):
+    """
+    Score a schedule (see ScheduleScore).
+
+    Returns:
+        ScheduleScore: The schedule's metrics.
+    """
+    return ScheduleScore(calendar, doctors, shift_types)
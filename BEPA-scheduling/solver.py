@@ -0,0 +1,470 @@
+from models import *
+import math
+import random
+import time
+
+# Objective weights shared by the search engines (lower is better)
+UNFILLED_SHIFT_COST = 1000      # per shift left without a doctor
+MIN_SHIFTS_SHORTFALL_COST = 50  # per shift a doctor ends below min_shifts
+SHIFT4_SINGLETON_COST = 20      # per shift 4 run of a single night
+PREFERENCE_COST = 2             # per assigned shift, per point below the top preference (5)
+
+MAX_CONSECUTIVE_SHIFTS = 5
+SHIFT4 = SHIFT_INDEX["s4"]
+DAY_SHIFTS = (SHIFT_INDEX["s1"], SHIFT_INDEX["s2"], SHIFT_INDEX["s3"])
+
+
+def normalize_shift_index(shift_type):
+    """
+    Convert a shift type from previous_month_shifts (4, "4" or "s4") to a shift index (0-3).
+
+    Returns:
+        int or None: The shift index, or None if the value isn't a shift.
+    """
+    if isinstance(shift_type, str):
+        shift_type = shift_type.strip().lower().lstrip("s")
+    try:
+        shift_number = int(shift_type)
+    except (TypeError, ValueError):
+        return None
+    return shift_number - 1 if 1 <= shift_number <= len(SHIFT_TYPES) else None
+
+
+class ScheduleModel:
+    def __init__(self, scheduler):
+        """
+        Integer model of a Scheduler's calendar shared by the search engines below.
+
+        Hard rules mirror get_available_doctors and is_doctor_eligible_for_cluster: days off, zero
+        preferences, one shift per day, max_shifts, at most 5 consecutive days, no 1-shift after a
+        2/3-shift and no 2-shift after a 3-shift, two days off day shifts after a 4-shift, and no
+        4-shift for a night specialist or right before a day off. Unfilled shifts, min_shifts shortfall, single-night
+        4-shift runs and low preferences are the costs to minimize.
+
+        Args:
+            scheduler (Scheduler): Scheduler whose calendar and doctors are modelled.
+        """
+        self.scheduler = scheduler
+        self.doctors = scheduler.doctors
+        self.calendar = scheduler.calendar
+        num_days = len(self.calendar)
+
+        # works[d][t] is the shift index doctor d works on day t, or -1
+        self.works = [[-1] * num_days for _ in self.doctors]
+        self.totals = [doc.total_shifts for doc in self.doctors]
+        for t, cal_day in enumerate(self.calendar):
+            for shift_type, doctor in cal_day.shifts.items():
+                d = self.doctor_index(doctor)
+                if d is not None:
+                    self.works[d][t] = SHIFT_INDEX[shift_type]
+
+        # Shifts worked on the two days before the calendar, and the run of days worked leading into it
+        self.previous = [[-1, -1] for _ in self.doctors]
+        self.carry_run = [0] * len(self.doctors)
+        first_day = self.calendar[0].date if self.calendar else None
+        for d, doc in enumerate(self.doctors):
+            worked_days = set()
+            for shift_date, shift_type in doc.previous_month_shifts:
+                shift_index = normalize_shift_index(shift_type)
+                if shift_index is None or first_day is None:
+                    continue
+                worked_days.add(shift_date)
+                days_before = (first_day - shift_date).days
+                if days_before in (1, 2):
+                    self.previous[d][days_before - 1] = shift_index
+            while first_day and first_day - timedelta(days=self.carry_run[d] + 1) in worked_days:
+                self.carry_run[d] += 1
+
+        # Static domains: days off, zero preference, and the 4-shift eligibility rules
+        self.allowed = []
+        for doc in self.doctors:
+            rows = []
+            for t, cal_day in enumerate(self.calendar):
+                off = cal_day.date in doc.days_off
+                row = [not off and doc.shift_prefs[k] != 0 for k in range(len(SHIFT_TYPES))]
+                if doc.is_night_specialist or (cal_day.date + timedelta(days=1)) in doc.days_off:
+                    row[SHIFT4] = False
+                rows.append(row)
+            self.allowed.append(rows)
+
+    def doctor_index(self, doctor):
+        """
+        Position of a doctor in the scheduler's doctor list, or None for empty shifts and unknown doctors.
+        """
+        if doctor is None:
+            return None
+        d = self.scheduler.assignments.doctor_ids.get(doctor)
+        return d if d is not None and d < len(self.doctors) else None
+
+    def shift_on(self, d, t):
+        """
+        Shift index doctor d works on day t (negative days look at the previous month), or -1.
+        """
+        if t < 0:
+            return self.previous[d][-t - 1] if -t <= 2 else -1
+        if t >= len(self.calendar):
+            return -1
+        return self.works[d][t]
+
+    def run_length(self, d, t, step):
+        """
+        Number of consecutive days doctor d works starting next to day t and moving by step (-1 or +1).
+        """
+        count = 0
+        t += step
+        while 0 <= t < len(self.calendar) and self.works[d][t] >= 0 and count <= MAX_CONSECUTIVE_SHIFTS:
+            count += 1
+            t += step
+        if t < 0 and step < 0:
+            count += self.carry_run[d]
+        return count
+
+    def can_assign(self, d, t, k):
+        """
+        Check every hard rule for giving shift k on day t to doctor d.
+        """
+        if self.works[d][t] >= 0 or not self.allowed[d][t][k]:
+            return False
+        if self.totals[d] >= self.doctors[d].max_shifts:
+            return False
+
+        yesterday, tomorrow = self.shift_on(d, t - 1), self.shift_on(d, t + 1)
+        if k == SHIFT_INDEX["s1"] and yesterday in (SHIFT_INDEX["s2"], SHIFT_INDEX["s3"]):
+            return False
+        if k == SHIFT_INDEX["s2"] and yesterday == SHIFT_INDEX["s3"]:
+            return False
+        if k in (SHIFT_INDEX["s2"], SHIFT_INDEX["s3"]) and tomorrow == SHIFT_INDEX["s1"]:
+            return False
+        if k == SHIFT_INDEX["s3"] and tomorrow == SHIFT_INDEX["s2"]:
+            return False
+
+        # Two days without day shifts after a 4-shift
+        if k in DAY_SHIFTS and SHIFT4 in (yesterday, self.shift_on(d, t - 2)):
+            return False
+        if k == SHIFT4 and (tomorrow in DAY_SHIFTS or self.shift_on(d, t + 2) in DAY_SHIFTS):
+            return False
+
+        return self.run_length(d, t, -1) + 1 + self.run_length(d, t, 1) <= MAX_CONSECUTIVE_SHIFTS
+
+    def assign(self, d, t, k):
+        self.works[d][t] = k
+        self.totals[d] += 1
+
+    def unassign(self, d, t):
+        self.works[d][t] = -1
+        self.totals[d] -= 1
+
+    def preference_cost(self, d, k):
+        """
+        Cost of doctor d working shift k because of a less-than-top preference.
+        """
+        return PREFERENCE_COST * max(0, 5 - self.doctors[d].shift_prefs[k])
+
+    def shortfall_cost(self, d):
+        """
+        Cost of doctor d currently being short of min_shifts.
+        """
+        return MIN_SHIFTS_SHORTFALL_COST * max(0, self.doctors[d].min_shifts - self.totals[d])
+
+    def is_shift4_singleton(self, d, t):
+        return self.works[d][t] == SHIFT4 and self.shift_on(d, t - 1) != SHIFT4 and self.shift_on(d, t + 1) != SHIFT4
+
+    def singleton_cost(self, days_by_doctor):
+        """
+        Cost of the single-night 4-shift runs on the given days.
+
+        Args:
+            days_by_doctor (dict): Doctor index -> set of day indices to look at.
+        """
+        return SHIFT4_SINGLETON_COST * sum(
+            self.is_shift4_singleton(d, t)
+            for d, days in days_by_doctor.items()
+            for t in days
+            if 0 <= t < len(self.calendar)
+        )
+
+    def final_cost(self):
+        """
+        Costs that can only be judged on a complete schedule: min_shifts shortfall and single-night 4-shift runs.
+        """
+        all_days = set(range(len(self.calendar)))
+        return sum(self.shortfall_cost(d) for d in range(len(self.doctors))) + self.singleton_cost(
+            {d: all_days for d in range(len(self.doctors))}
+        )
+
+    def total_cost(self, shift_types=SHIFT_TYPES):
+        """
+        The whole objective of the current schedule: unfilled shifts and preferences over the given
+        shift types, plus final_cost.
+        """
+        cost = self.final_cost()
+        for cal_day in self.calendar:
+            for shift_type in shift_types:
+                d = self.doctor_index(cal_day.shifts[shift_type])
+                cost += UNFILLED_SHIFT_COST if d is None else self.preference_cost(d, SHIFT_INDEX[shift_type])
+        return cost
+
+
+class CPSolver(ScheduleModel):
+    def __init__(self, scheduler, shift_types, time_limit=10.0):
+        """
+        Constraint-programming search over the open shifts on a Scheduler's calendar.
+
+        Every empty (day, shift) cell is a variable whose domain is the doctors who may work it, or
+        "unfilled". Shifts already on the calendar (PAT, manual assignments) are kept as fixed.
+
+        Args:
+            scheduler (Scheduler): Scheduler whose calendar and doctors are modelled.
+            shift_types (list): Shift types to fill, e.g. ["s4", "s1", "s2", "s3"].
+            time_limit (float): Wall-clock budget in seconds for improving on the first solution.
+        """
+        super().__init__(scheduler)
+        self.time_limit = time_limit
+        self.cells = [
+            (t, SHIFT_INDEX[shift_type])
+            for t, cal_day in enumerate(self.calendar)
+            for shift_type in shift_types
+            if not cal_day.is_shift_filled(shift_type)
+        ]
+        self.choice = [None] * len(self.cells)
+        self.best_cost = float("inf")
+        self.best_choice = None
+        self.deadline = None
+        self.nodes = 0
+
+    def candidates(self, t, k):
+        """
+        Doctors who can take shift k on day t, most promising first.
+        """
+        doctors = [d for d in range(len(self.doctors)) if self.can_assign(d, t, k)]
+        if k == SHIFT4:
+            # Prefer extending yesterday's 4-shift run into a cluster of 3
+            def priority(d):
+                doc = self.doctors[d]
+                extends = self.shift_on(d, t - 1) == SHIFT4 and self.run_length(d, t, -1) < 3
+                return (not extends, -doc.shift_prefs[k], doc.night_shifts, self.totals[d] / doc.max_shifts)
+        else:
+            def priority(d):
+                doc = self.doctors[d]
+                return (self.totals[d] >= doc.min_shifts, -doc.shift_prefs[k], doc.flip_shifts != "Yes", self.totals[d] / doc.max_shifts)
+        doctors.sort(key=priority)
+        return doctors
+
+    def solve(self):
+        """
+        Search for the cheapest schedule with limited discrepancy search and branch and bound.
+
+        The first pass follows the candidate ordering exactly (a greedy schedule) and always runs to
+        completion; later passes allow more and more deviations from it until the time limit.
+
+        Returns:
+            list of tuples: (day index, shift type, Doctor) for every open shift that was filled.
+        """
+        self.deadline = time.monotonic() + self.time_limit
+        discrepancies = 0
+        while True:
+            try:
+                self.search(0, discrepancies, 0, enforce_deadline=discrepancies > 0)
+            except TimeoutError:
+                break
+            discrepancies += 1
+            if discrepancies > len(self.cells) or time.monotonic() >= self.deadline:
+                break
+
+        return [
+            (t, SHIFT_TYPES[k], self.doctors[d])
+            for (t, k), d in zip(self.cells, self.best_choice or [])
+            if d is not None
+        ]
+
+    def search(self, index, discrepancies, cost, enforce_deadline):
+        """
+        Depth-first search over the open cells, taking the r-th best candidate at a cost of r discrepancies.
+        """
+        self.nodes += 1
+        if enforce_deadline and self.nodes % 256 == 0 and time.monotonic() >= self.deadline:
+            raise TimeoutError
+        if cost >= self.best_cost:
+            return
+        if index == len(self.cells):
+            total = cost + self.final_cost()
+            if total < self.best_cost:
+                self.best_cost = total
+                self.best_choice = list(self.choice)
+            return
+
+        t, k = self.cells[index]
+        options = self.candidates(t, k) + [None]
+        for rank, d in enumerate(options[:discrepancies + 1]):
+            if d is None:
+                self.choice[index] = None
+                self.search(index + 1, discrepancies - rank, cost + UNFILLED_SHIFT_COST, enforce_deadline)
+                continue
+            self.assign(d, t, k)
+            self.choice[index] = d
+            try:
+                self.search(index + 1, discrepancies - rank, cost + self.preference_cost(d, k), enforce_deadline)
+            finally:
+                self.unassign(d, t)
+        self.choice[index] = None
+
+
+class LocalSearch(ScheduleModel):
+    def __init__(self, scheduler, shift_types=("s1", "s2", "s3"), time_limit=5.0, seed=None,
+                 start_temperature=20.0, end_temperature=0.5):
+        """
+        Simulated-annealing improvement of a finished schedule.
+
+        Neighbourhoods are "move" (hand one shift to another doctor, favouring doctors under
+        min_shifts, or fill an empty shift) and "swap" (two doctors exchange shifts). Every move is
+        checked against the ScheduleModel hard rules and scored with an incremental delta cost.
+
+        Args:
+            scheduler (Scheduler): Scheduler whose calendar has already been filled.
+            shift_types (iterable): Shift types the search may reassign. PAT's clusters and
+                reviewed night shifts stay put unless "s4" is listed.
+            time_limit (float): Wall-clock budget in seconds.
+            seed (int): Seed for the random move generator.
+            start_temperature (float): Annealing temperature at the start of the run.
+            end_temperature (float): Annealing temperature when the time limit is reached.
+        """
+        super().__init__(scheduler)
+        self.time_limit = time_limit
+        self.random = random.Random(seed)
+        self.start_temperature = start_temperature
+        self.end_temperature = end_temperature
+        self.cells = [(t, SHIFT_INDEX[shift_type]) for t in range(len(self.calendar)) for shift_type in shift_types]
+        self.holders = [self.doctor_index(self.calendar[t].shifts[SHIFT_TYPES[k]]) for t, k in self.cells]
+        self.iterations = 0
+
+    def day_window(self, *pairs):
+        """
+        Days whose single-night 4-shift status can change when the given (doctor, day) pairs change.
+        """
+        days_by_doctor = {}
+        for d, t in pairs:
+            if d is not None:
+                days_by_doctor.setdefault(d, set()).update((t - 1, t, t + 1))
+        return days_by_doctor
+
+    def try_move(self, i, b):
+        """
+        Hand cell i to doctor b. Returns the cost delta, or None (state unchanged) if a rule forbids it.
+        """
+        t, k = self.cells[i]
+        a = self.holders[i]
+        window = self.day_window((a, t), (b, t)) if k == SHIFT4 else {}
+        before = self.singleton_cost(window)
+        before += self.shortfall_cost(b) + (self.shortfall_cost(a) if a is not None else 0)
+
+        if a is not None:
+            self.unassign(a, t)
+        if not self.can_assign(b, t, k):
+            if a is not None:
+                self.assign(a, t, k)
+            return None
+        self.assign(b, t, k)
+        self.holders[i] = b
+
+        after = self.singleton_cost(window)
+        after += self.shortfall_cost(b) + (self.shortfall_cost(a) if a is not None else 0)
+        delta = after - before + self.preference_cost(b, k)
+        delta -= self.preference_cost(a, k) if a is not None else UNFILLED_SHIFT_COST
+        return delta
+
+    def undo_move(self, i, a):
+        t, k = self.cells[i]
+        self.unassign(self.holders[i], t)
+        if a is not None:
+            self.assign(a, t, k)
+        self.holders[i] = a
+
+    def try_swap(self, i, j):
+        """
+        Exchange the doctors on cells i and j. Returns the cost delta, or None (state unchanged) if a rule forbids it.
+        """
+        (t1, k1), (t2, k2) = self.cells[i], self.cells[j]
+        a, b = self.holders[i], self.holders[j]
+        window = self.day_window((a, t1), (a, t2), (b, t1), (b, t2)) if SHIFT4 in (k1, k2) else {}
+        before = self.singleton_cost(window)
+
+        self.unassign(a, t1)
+        self.unassign(b, t2)
+        if self.can_assign(a, t2, k2):
+            self.assign(a, t2, k2)
+            if self.can_assign(b, t1, k1):
+                self.assign(b, t1, k1)
+                self.holders[i], self.holders[j] = b, a
+                after = self.singleton_cost(window)
+                return (after - before + self.preference_cost(a, k2) + self.preference_cost(b, k1)
+                        - self.preference_cost(a, k1) - self.preference_cost(b, k2))
+            self.unassign(a, t2)
+        self.assign(a, t1, k1)
+        self.assign(b, t2, k2)
+        return None
+
+    def undo_swap(self, i, j):
+        (t1, k1), (t2, k2) = self.cells[i], self.cells[j]
+        b, a = self.holders[i], self.holders[j]
+        self.unassign(a, t2)
+        self.unassign(b, t1)
+        self.assign(a, t1, k1)
+        self.assign(b, t2, k2)
+        self.holders[i], self.holders[j] = a, b
+
+    def run(self):
+        """
+        Anneal until the time limit and return the changes that lead to the best schedule seen.
+
+        Returns:
+            list of tuples: (day index, shift type, old Doctor or None, new Doctor) per changed shift.
+        """
+        if not self.cells or not self.doctors:
+            return []
+
+        original = list(self.holders)
+        best = list(self.holders)
+        current_cost = best_cost = 0  # costs are tracked relative to the starting schedule
+        under_minimum = [d for d, doc in enumerate(self.doctors) if self.totals[d] < doc.min_shifts]
+        start = time.monotonic()
+
+        while True:
+            elapsed = time.monotonic() - start
+            if elapsed >= self.time_limit:
+                break
+            self.iterations += 1
+            temperature = self.start_temperature * (self.end_temperature / self.start_temperature) ** (elapsed / self.time_limit)
+
+            i = self.random.randrange(len(self.cells))
+            if self.random.random() < 0.5 or self.holders[i] is None:
+                a = self.holders[i]
+                pool = under_minimum if under_minimum and self.random.random() < 0.5 else None
+                b = self.random.choice(pool) if pool else self.random.randrange(len(self.doctors))
+                if b == a:
+                    continue
+                delta = self.try_move(i, b)
+                undo = lambda: self.undo_move(i, a)
+            else:
+                j = self.random.randrange(len(self.cells))
+                if self.holders[j] is None or self.holders[j] == self.holders[i]:
+                    continue
+                delta = self.try_swap(i, j)
+                undo = lambda: self.undo_swap(i, j)
+
+            if delta is None:
+                continue
+            if delta <= 0 or self.random.random() < math.exp(-delta / temperature):
+                current_cost += delta
+                if current_cost < best_cost:
+                    best_cost = current_cost
+                    best = list(self.holders)
+                    under_minimum = [d for d, doc in enumerate(self.doctors) if self.totals[d] < doc.min_shifts]
+            else:
+                undo()
+
+        return [
+            (self.cells[i][0], SHIFT_TYPES[self.cells[i][1]],
+             self.doctors[old] if old is not None else None, self.doctors[new])
+            for i, (old, new) in enumerate(zip(original, best))
+            if old != new and new is not None
+        ]
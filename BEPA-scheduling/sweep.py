@@ -0,0 +1,155 @@
+from models import *
+from scheduler import Scheduler, PAT_MAX_CLUSTER_SIZE, PAT_MIN_CLUSTER_SIZE
+from scoring import score_schedule
+from utils import load_month_and_year, load_doctor_inputs, load_shifts_requested_off, load_previous_month_shifts
+from calendar import monthrange
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+import contextlib
+import copy
+import io
+import itertools
+import random
+
+class SweepResult:
+    def __init__(self, variant, cost, schedule, total_shifts, summary=None):
+        """
+        One scenario's finished schedule.
+
+        Args:
+            variant (dict): The scenario settings (see scenario_grid).
+            cost (int): Total cost of the schedule (ScheduleScore.total_cost, lower is better).
+            schedule (list): One {shift type: doctor name or None} dict per day of the month.
+            total_shifts (dict): Doctor name -> shifts scheduled.
+            summary (dict): Schedule-wide metrics (ScheduleScore.summary).
+        """
+        self.variant = variant
+        self.cost = cost
+        self.schedule = schedule
+        self.total_shifts = total_shifts
+        self.summary = summary or {}
+
+    def __repr__(self):
+        return f"<SweepResult cost={self.cost} variant={self.variant}>"
+
+def scenario_grid(num_shifts=(4,), pat_cluster_sizes=(PAT_MAX_CLUSTER_SIZE,), seeds=(None,), preference_noise=(0,), mode="greedy"):
+    """
+    Build every combination of the given scenario settings.
+
+    Args:
+        num_shifts (iterable): Shifts per day to try (3 and/or 4).
+        pat_cluster_sizes (iterable): Longest PAT night clusters to try, each from PAT_MIN_CLUSTER_SIZE
+            to PAT_MAX_CLUSTER_SIZE.
+        seeds (iterable): Random seeds; a seed shuffles the doctor order, which changes how ties are broken.
+            None keeps the roster order (preference noise then uses seed 0).
+        preference_noise (iterable): How far each non-zero shift preference may be randomly moved (0 for none).
+        mode (str): Scheduling mode passed to Scheduler.solve ("greedy" or "cp").
+
+    Returns:
+        list: One variant dict per combination.
+
+    Raises:
+        ValueError: If a PAT cluster size is outside PAT_MIN_CLUSTER_SIZE-PAT_MAX_CLUSTER_SIZE.
+    """
+    pat_cluster_sizes = list(pat_cluster_sizes)
+    for cluster in pat_cluster_sizes:
+        check_pat_cluster_size(cluster)
+    return [
+        {"num_shifts": shifts, "pat_max_cluster": cluster, "seed": seed, "preference_noise": noise, "mode": mode}
+        for shifts, cluster, seed, noise in itertools.product(num_shifts, pat_cluster_sizes, seeds, preference_noise)
+    ]
+
+def check_pat_cluster_size(cluster):
+    """
+    Raise ValueError unless cluster is a longest PAT cluster the planner supports.
+    """
+    if not PAT_MIN_CLUSTER_SIZE <= cluster <= PAT_MAX_CLUSTER_SIZE:
+        raise ValueError(f"PAT cluster size must be {PAT_MIN_CLUSTER_SIZE}-{PAT_MAX_CLUSTER_SIZE}, not {cluster}")
+
+def perturb_preferences(doctors, noise, rng):
+    """
+    Move every non-zero shift preference by up to noise points, staying within 1-5 (zero stays "never").
+    """
+    for doctor in doctors:
+        doctor.shift_prefs = [
+            min(5, max(1, pref + rng.randint(-noise, noise))) if pref else 0 for pref in doctor.shift_prefs
+        ]
+
+def run_scenario(doctors, year, month, variant, last_shift4_doctor=None, time_limit=10.0):
+    """
+    Schedule one month for one scenario on a private copy of the doctors.
+
+    The schedule is scored with the doctors' real preferences, so perturbed scenarios are judged
+    the same way as the others.
+
+    Returns:
+        SweepResult: The scored schedule.
+    """
+    check_pat_cluster_size(variant["pat_max_cluster"])
+    doctors = copy.deepcopy(doctors)
+    real_prefs = [list(doctor.shift_prefs) for doctor in doctors]
+
+    rng = random.Random(variant["seed"] if variant["seed"] is not None else 0)  # reproducible even without a seed
+    if variant["seed"] is not None:
+        order = list(range(len(doctors)))
+        rng.shuffle(order)
+        doctors = [doctors[i] for i in order]
+        real_prefs = [real_prefs[i] for i in order]
+    if variant["preference_noise"]:
+        perturb_preferences(doctors, variant["preference_noise"], rng)
+
+    calendar = [CalDay(date(year, month, day)) for day in range(1, monthrange(year, month)[1] + 1)]
+    with contextlib.redirect_stdout(io.StringIO()):  # one warning per unfilled shift is just noise here
+        scheduler = Scheduler(doctors, calendar, last_shift4_doctor, interactive=False)
+        scheduler.pat_max_cluster = variant["pat_max_cluster"]
+        scheduler.solve(variant["num_shifts"], variant["mode"], time_limit)
+
+    for doctor, prefs in zip(doctors, real_prefs):
+        doctor.shift_prefs = prefs
+    shift_types = ["s4"] + scheduler.configure_day_shifts(variant["num_shifts"])
+    score = score_schedule(calendar, doctors, shift_types)
+
+    schedule = [{shift_type: (doc.name if doc else None) for shift_type, doc in cal_day.shifts.items()} for cal_day in calendar]
+    total_shifts = {doctor.name: doctor.total_shifts for doctor in doctors}
+    return SweepResult(variant, score.total_cost, schedule, total_shifts, score.summary())
+
+def sweep(doctors, year, month, variants, k=5, max_workers=None, last_shift4_doctor=None, time_limit=10.0):
+    """
+    Schedule the month once per scenario in a pool of worker processes and keep the best schedules.
+
+    Args:
+        doctors (list): List of Doctor objects with days off and previous month shifts loaded. They are not modified.
+        year (int): Year of the month to schedule.
+        month (int): Month to schedule (1-12).
+        variants (list): Scenario settings, e.g. from scenario_grid.
+        k (int): Number of schedules to return.
+        max_workers (int): Worker processes (defaults to the number of CPUs). 1 runs everything in this process.
+        last_shift4_doctor (str): Doctor (other than a night specialist) who most recently worked a 4 shift, if the
+            previous month's shifts don't say.
+        time_limit (float): Seconds the "cp" search may spend on each scenario.
+
+    Returns:
+        list of SweepResult: Up to k results, lowest cost first.
+    """
+    run = partial(run_scenario, doctors, year, month, last_shift4_doctor=last_shift4_doctor, time_limit=time_limit)
+    if max_workers == 1:
+        results = list(map(run, variants))
+    else:
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            results = list(executor.map(run, variants))
+
+    # sorted() is stable, so equally good scenarios stay in grid order
+    return sorted(results, key=lambda result: result.cost)[:k]
+
+def sweep_workbook(inputs, variants, **kwargs):
+    """
+    Run sweep on the month described by a loaded workbook (see utils.load_workbook_inputs).
+
+    Returns:
+        list of SweepResult: The best schedules, lowest cost first.
+    """
+    month, year = load_month_and_year(inputs)
+    doctors = load_doctor_inputs(inputs)
+    load_shifts_requested_off(inputs, doctors, month, year)
+    load_previous_month_shifts(inputs, doctors, month, year)
+    return sweep(doctors, year, month, variants, **kwargs)
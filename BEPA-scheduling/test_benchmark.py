@@ -0,0 +1,25 @@
+from benchmark import generate_roster, run_benchmark, scaling_exponents, PHASES
+
+
+def test_generate_roster_is_seeded():
+    first = generate_roster(30, 2024, 11, num_months=3, seed=7)
+    second = generate_roster(30, 2024, 11, num_months=3, seed=7)
+
+    assert [(doc.name, doc.shift_prefs, doc.days_off, doc.min_shifts, doc.max_shifts) for doc in first] == \
+        [(doc.name, doc.shift_prefs, doc.days_off, doc.min_shifts, doc.max_shifts) for doc in second]
+    assert first[0].name == "PAT"
+    assert {day.year for doc in first for day in doc.days_off} == {2024, 2025}
+    assert all(doc.min_shifts < doc.max_shifts for doc in first)
+
+
+def test_run_benchmark_times_every_phase():
+    result = run_benchmark(20, 2, seed=1)
+
+    assert (result["doctors"], result["months"]) == (20, 2)
+    assert all(result[phase] >= 0 for phase in PHASES)
+    assert result["shifts_filled"] > 0
+
+
+def test_scaling_exponents():
+    results = [{"doctors": n, "months": 1, "total": 0.001 * n} for n in (10, 100, 1000)]
+    assert scaling_exponents(results) == {1: 1.0}
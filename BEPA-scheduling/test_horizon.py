@@ -0,0 +1,60 @@
+from horizon import RollingHorizonPlanner
+from benchmark import generate_roster
+from scheduler import UNFILLED_SHIFT4_COST
+from test_solver import setup_test_environment, assert_hard_rules
+from datetime import date, timedelta
+
+
+def test_rolling_horizon_keeps_rules_across_months():
+    doctors, _ = setup_test_environment()
+    planner = RollingHorizonPlanner(doctors, 2023, 12, 3, mode="cp", time_limit=0.2, lookahead_days=5)
+    calendars = planner.run()
+
+    assert [(cal[0].date, len(cal)) for cal in calendars] == [
+        (date(2023, 12, 1), 31), (date(2024, 1, 1), 31), (date(2024, 2, 1), 29)
+    ]
+    for calendar in calendars:
+        assert_hard_rules(doctors, calendar)
+
+    # Rest after nights and run lengths hold over the month boundaries too
+    for doctor in doctors:
+        ledger = planner.ledgers[doctor]
+        for day in ledger.shifts:
+            assert ledger.run_ending_at(day) <= 5
+            if ledger.worked_shift(day, "s4"):
+                for rest_days in (1, 2):
+                    later = ledger.shift_types_on(day + timedelta(days=rest_days))
+                    assert not later & {"s1", "s2", "s3"}
+
+    # The last month starts from the end of the month before it
+    last_january_day = date(2024, 1, 31)
+    for doctor in doctors:
+        if planner.ledgers[doctor].worked_on(last_january_day):
+            assert last_january_day in {day for day, shift in doctor.previous_month_shifts}
+
+
+class FillCheckingPlanner(RollingHorizonPlanner):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.fillable_nights = []
+
+    def solve(self, scheduler):
+        # Record every night left open that a doctor could still have taken without joining their own nights
+        super().solve(scheduler)
+        calendar = scheduler.calendar
+        for i, cal_day in enumerate(calendar):
+            if cal_day.shifts["s4"] is None:
+                neighbours = {calendar[j].shifts["s4"] for j in (i - 1, i + 1) if 0 <= j < len(calendar)}
+                if set(scheduler.get_available_doctors_for_shift4_cluster([cal_day], 1)) - neighbours:
+                    self.fillable_nights.append(cal_day.date)
+
+
+def test_night_fairness_never_leaves_fillable_nights_open():
+    # Two years of six doctors: night shifts from earlier months pile up well past the cost of an open night
+    doctors = generate_roster(6, 2024, 1, num_months=24, seed=2)
+    planner = FillCheckingPlanner(doctors, 2024, 1, 24)
+    planner.run()
+
+    night_loads = [sum("s4" in shift_types for shift_types in planner.ledgers[doctor].shifts.values()) for doctor in doctors]
+    assert max(night_loads) > UNFILLED_SHIFT4_COST
+    assert planner.fillable_nights == []
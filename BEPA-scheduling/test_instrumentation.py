@@ -0,0 +1,29 @@
+import json
+from instrumentation import Instrumentation
+from scheduler import Scheduler
+from test_solver import setup_test_environment
+
+
+def test_instrumentation_collects_phases_and_unfilled_shifts():
+    doctors, calendar = setup_test_environment()
+    for doctor in doctors[4:]:
+        doctor.max_shifts = 2  # leave some day shifts unfilled
+    instrumentation = Instrumentation(profile=True)
+    scheduler = Scheduler(doctors, calendar, instrumentation=instrumentation)
+    scheduler.solve(num_shifts=4)
+
+    stats = json.loads(instrumentation.to_json())
+    assert set(stats["timers"]) == {"schedule_pat", "schedule_remaining_shift4", "schedule_remaining_shifts"}
+    assert stats["counters"]["candidates_examined"] >= sum(stats["rejections"].values())
+    unfilled = {(event["date"], event["shift"]) for event in stats["events"] if event["event"] == "unfilled_shift"}
+    assert unfilled == {
+        (str(cal_day.date), shift) for cal_day in calendar for shift, doc in cal_day.shifts.items() if doc is None
+    }
+    assert stats["profile"]
+
+
+def test_scheduler_without_instrumentation():
+    doctors, calendar = setup_test_environment()
+    scheduler = Scheduler(doctors, calendar)
+    scheduler.solve(num_shifts=4)
+    assert scheduler.instrumentation is None
@@ -0,0 +1,58 @@
+from rejections import *
+from scheduler import Scheduler
+from test_solver import setup_test_environment
+from datetime import date
+
+
+def test_unfilled_shifts_explain_who_was_closest():
+    doctors, calendar = setup_test_environment()
+    jan_14 = calendar[13].date
+    for doctor in doctors[1:]:
+        doctor.days_off.add(jan_14)
+    scheduler = Scheduler(doctors, calendar, interactive=False)
+    scheduler.solve(num_shifts=4)
+
+    assert calendar[13].shifts["s2"] is None
+    reasons = scheduler.rejections.reasons(jan_14, "s2")
+    assert set(reasons) == set(doctors)
+    assert all("day_off" in rules for rules in reasons.values())
+    assert reasons[doctors[0]] == ["day_off", "zero_preference"]  # PAT: off that week and never works s2
+
+    closest = scheduler.rejections.closest_to_eligible(jan_14, "s2", k=3)
+    assert [rules for doctor, rules in closest] == [["day_off"]] * 3
+    assert doctors[0] not in [doctor for doctor, rules in closest]
+
+    # Unfilled nights are recorded too
+    night_codes = scheduler.rejections.codes_for(jan_14, "s4")
+    assert night_codes is not None and night_codes.all()
+    assert night_codes[0] & REJECT_NIGHT_SPECIALIST
+
+
+def test_recorded_codes_match_available_doctors():
+    doctors, calendar = setup_test_environment()
+    scheduler = Scheduler(doctors, calendar, interactive=False)
+    scheduler.schedule_pat()
+    scheduler.schedule_remaining_shift4()
+
+    cal_day = calendar[5]
+    available = scheduler.get_available_doctors(cal_day, "s1")
+    codes = scheduler.rejections.codes_for(cal_day.date, "s1")
+    assert [doctor for doctor, code in zip(doctors, codes) if code == 0] == available
+    night_worker = calendar[4].shifts["s4"]
+    assert codes[doctors.index(night_worker)] & REJECT_SHIFT4_REST
+    assert describe_rejection(REJECT_DAY_OFF | REJECT_MAX_SHIFTS) == ["day_off", "max_shifts"]
+
+
+def test_previous_month_rest_rules_accept_loaded_shift_numbers():
+    # load_previous_month_shifts stores shift numbers (3, 4), not "s3"/"s4"
+    doctors, calendar = setup_test_environment()
+    turnaround, night = doctors[2], doctors[3]
+    turnaround.previous_month_shifts = [(date(2023, 12, 31), 3)]
+    night.previous_month_shifts = [(date(2023, 12, 31), 4)]
+    scheduler = Scheduler(doctors, calendar, interactive=False)
+
+    codes = scheduler.static_rejections
+    turnaround_id, night_id = doctors.index(turnaround), doctors.index(night)
+    assert codes[turnaround_id, 0, 0] & REJECT_TURNAROUND and codes[turnaround_id, 0, 1] & REJECT_TURNAROUND
+    assert all(codes[night_id, day, 0] & REJECT_SHIFT4_REST for day in (0, 1))
+    assert not codes[night_id, 2, 0] & REJECT_SHIFT4_REST
@@ -14,6 +14,8 @@ def setup_test_environment():
             shift_prefs=[2, 3, 4, 3],  # Strong preference for 4 shifts
             min_shifts=10,
             max_shifts=15,
+            flip_shifts=False,
+            doc_type="Full Time",
         ),
         Doctor(
             name="Doctor B",
@@ -21,6 +23,8 @@ def setup_test_environment():
             shift_prefs=[3, 2, 1, 3],  # Prefers 4 shifts the same as than Doctor A
             min_shifts=10,
             max_shifts=16,
+            flip_shifts=False,
+            doc_type="Full Time",
         ),
         Doctor(
             name="Doctor C",
@@ -28,6 +32,8 @@ def setup_test_environment():
             shift_prefs=[1, 2, 3, 1],  # Lowest preference for 4 shifts
             min_shifts=12,
             max_shifts=20,
+            flip_shifts=False,
+            doc_type="Full Time",
         ),
     ]
 
@@ -38,13 +44,15 @@ def setup_test_environment():
         shift_prefs=[1, 1, 1, 5],
         min_shifts=14,
         max_shifts=17,
-        previous_month_shifts=[(date(2023, 12, 29), 4), (date(2023, 12, 30), 4)],
+        flip_shifts=False,
+        doc_type="Nocturnist",
     )
+    pat.previous_month_shifts = [(date(2023, 12, 29), 4), (date(2023, 12, 30), 4)]
 
     calendar = [CalDay(date(2024, 1, day)) for day in range(1, 32)]
 
     # Schedule PAT shifts to create gaps
-    scheduler = Scheduler([pat] + doctors, calendar)
+    scheduler = Scheduler([pat] + doctors, calendar, interactive=False)
     scheduler.schedule_pat()
     
     return doctors, calendar, scheduler
@@ -64,5 +72,65 @@ def test_schedule_remaining_shift4():
         else:
             print(f"Day {cal_day.date}: Shift 4 is unfilled.")
 
+def setup_gap_environment():
+    doctors = [
+        Doctor("Doctor A", {date(2024, 1, day) for day in (4, 8, 13, 17, 19)}, [2, 3, 4, 5], 10, 15, False, "Full Time"),
+        Doctor("Doctor B", {date(2024, 1, day) for day in (4, 6, 8, 12, 15, 16, 19)}, [3, 2, 1, 4], 10, 16, False, "Full Time"),
+        Doctor("Doctor C", {date(2024, 1, day) for day in (3, 8, 9, 11, 15)}, [1, 2, 3, 2], 12, 20, False, "Full Time"),
+        Doctor("Doctor D", set(), [4, 4, 4, 0], 10, 20, False, "Full Time"),  # never works nights
+    ]
+    # Doctor A ends December on a run of 3 nights
+    doctors[0].previous_month_shifts = [(date(2023, 12, day), 4) for day in (29, 30, 31)]
+
+    # No night specialist, so the whole calendar is one gap
+    calendar = [CalDay(date(2024, 1, day)) for day in range(1, 22)]
+    scheduler = Scheduler(doctors, calendar, interactive=False)
+    return doctors, calendar, scheduler
+
+def night_runs(calendar, doctors):
+    # (doctor, nights) for every run of nights by the same doctor, December's included
+    nights = [(shift_date, doc) for doc in doctors for shift_date, shift_type in doc.previous_month_shifts if shift_type == 4]
+    nights += [(cal_day.date, cal_day.shifts["s4"]) for cal_day in calendar]
+    runs = []
+    for shift_date, doctor in sorted(nights, key=lambda night: night[0]):
+        if runs and runs[-1][0] is doctor:
+            runs[-1][1] += 1
+        else:
+            runs.append([doctor, 1])
+    return [(doctor, length) for doctor, length in runs if doctor]
+
+def test_plan_shift4_gap_never_merges_clusters():
+    doctors, calendar, scheduler = setup_gap_environment()
+    plan = scheduler.plan_shift4_gap(0, len(calendar))
+
+    # The plan covers every night, and no cluster goes to the doctor who worked the night before it
+    assert [start for start, size, doctor in plan] == [0] + [start + size for start, size, doctor in plan[:-1]]
+    assert plan[-1][0] + plan[-1][1] == len(calendar)
+    night_before = doctors[0]
+    for start, size, doctor in plan:
+        assert 1 <= size <= 4
+        assert doctor is None or doctor is not night_before
+        night_before = doctor
+
+def test_schedule_shift4_gap_beats_greedy():
+    singletons = {}
+    for planner in ("greedy", "dp"):
+        doctors, calendar, scheduler = setup_gap_environment()
+        if planner == "dp":
+            scheduler.schedule_shift4_gap(calendar[0].date, len(calendar))
+        else:
+            scheduler.schedule_shift4_gap_greedy(calendar[0].date, len(calendar))
+        runs = night_runs(calendar, doctors)
+        singletons[planner] = sum(1 for doctor, length in runs if length == 1)
+
+    # Only doctors who can work nights get them, never on a day off, and never more than 5 in a row
+    for cal_day in calendar:
+        doctor = cal_day.shifts["s4"]
+        assert doctor is None or (doctor.shift_prefs[3] > 0 and cal_day.date not in doctor.days_off)
+    assert all(length <= 5 for doctor, length in runs)
+    assert runs[0] == (doctors[0], 3)  # December's run isn't extended
+    assert singletons["dp"] < singletons["greedy"]
+
+
 if __name__ == "__main__":
     test_schedule_remaining_shift4()
@@ -1,6 +1,9 @@
-from scheduler import Scheduler
+from scheduler import Scheduler, PAT_PLAN_BEAM_WIDTH
+from instrumentation import Instrumentation
 from models import Doctor, CalDay
+from benchmark import generate_roster
 from datetime import date
+import numpy as np
 
 
 def setup_test_environment():
@@ -10,8 +13,10 @@ def setup_test_environment():
         shift_prefs=[1, 1, 1, 5],
         min_shifts=14,
         max_shifts=17,
-        previous_month_shifts=[(date(2023, 12, 28), 4),(date(2023, 12, 29), 4),(date(2023, 12, 30), 4),(date(2023, 12, 31), 4)]
+        flip_shifts=False,
+        doc_type="Nocturnist",
     )
+    pat.previous_month_shifts = [(date(2023, 12, 28), 4),(date(2023, 12, 29), 4),(date(2023, 12, 30), 4),(date(2023, 12, 31), 4)]
     calendar = [CalDay(date(2024, 1, day)) for day in range(1, 32)]
     return [pat], calendar
 
@@ -24,11 +29,135 @@ def run_test():
         #print(f"Initialized CalDay: {cal_day.date}")
 
     # Initialize scheduler
-    scheduler = Scheduler(doctors, calendar)
+    scheduler = Scheduler(doctors, calendar, interactive=False)
 
     # Run PAT scheduling
     scheduler.schedule_pat()
 
+def test_free_runs_track_assignments():
+    doctors, calendar = setup_test_environment()
+    pat = doctors[0]
+    scheduler = Scheduler(doctors, calendar, interactive=False)
+    assert scheduler.get_optimal_cluster_size(pat, 6) == 3  # Jan 7-9, then the days off
+    assert not scheduler.can_start_cluster(pat, 9, 3)
+    assert scheduler.can_start_cluster(pat, 15, 3)
+
+    savepoint = scheduler.savepoint()
+    scheduler.schedule_pat()
+    nights = [i for i, cal_day in enumerate(calendar) if cal_day.shifts["s4"] is pat]
+    assert nights and not scheduler.free_runs[0, nights].any()
+    runs = scheduler.free_runs.copy()
+    scheduler.build_free_runs()
+    assert np.array_equal(runs, scheduler.free_runs)
+
+    scheduler.rollback(savepoint)
+    assert scheduler.get_optimal_cluster_size(pat, 0) == 4
+
+def pat_clusters(calendar, pat):
+    clusters, run = [], []
+    for i, cal_day in enumerate(calendar):
+        if cal_day.shifts["s4"] is pat:
+            run.append(i)
+        elif run:
+            clusters.append(run)
+            run = []
+    return clusters + ([run] if run else [])
+
+
+def test_planned_clusters_follow_the_rules():
+    for planner in ("greedy", "dp"):
+        doctors, calendar = setup_test_environment()
+        pat = doctors[0]
+        scheduler = Scheduler(doctors, calendar, interactive=False)
+        scheduler.schedule_pat(planner)
+
+        clusters = pat_clusters(calendar, pat)
+        nights = sum(len(cluster) for cluster in clusters)
+        assert nights <= pat.max_shifts
+        assert not {calendar[i].date for cluster in clusters for i in cluster} & pat.days_off
+        for previous, cluster in zip(clusters, clusters[1:]):
+            assert cluster[0] - previous[-1] > 3
+        for cluster in clusters:
+            assert len(cluster) <= 4
+            assert len(cluster) >= 3 or cluster[-1] == len(calendar) - 1
+        if planner == "greedy":
+            greedy_nights = nights
+        else:
+            assert nights >= min(pat.min_shifts, greedy_nights)
+
+
+def test_plan_continues_another_doctors_run():
+    doctors, calendar = setup_test_environment()
+    pat = doctors[0]
+    pat.previous_month_shifts = []
+    other = Doctor("Night Owl", set(), [0, 0, 0, 5], 0, 20, False, "Full Time")
+    other.previous_month_shifts = [(date(2023, 12, 31), 4)]
+    scheduler = Scheduler(doctors + [other], calendar, interactive=False)
+
+    # One night from December plus the first two of January make a cluster of 3 for the other doctor
+    assert scheduler.plan_pat_clusters(pat)[0] == 2
+    assert scheduler.plan_pat_clusters(pat, max_nights=0) == []
+
+def test_night_specialists_share_the_nights():
+    doctors = generate_roster(20, 2024, 3, seed=4, night_specialists=2)
+    calendar = [CalDay(date(2024, 3, day)) for day in range(1, 32)]
+    scheduler = Scheduler(doctors, calendar, interactive=False)
+    assert scheduler.night_specialists == doctors[:2]
+    assert Doctor("PAT", set(), [0, 0, 0, 5], 0, 10, False, None).is_night_specialist
+    assert not Doctor("PAT", set(), [3, 3, 3, 3], 0, 10, False, "Full Time").is_night_specialist
+
+    scheduler.schedule_pat()
+    for specialist in doctors[:2]:
+        clusters = pat_clusters(calendar, specialist)
+        assert sum(len(cluster) for cluster in clusters) >= specialist.min_shifts
+        for previous, cluster in zip(clusters, clusters[1:]):
+            assert cluster[0] - previous[-1] > 3
+
+    # Gaps are the nights neither specialist works, and nobody else is offered specialist clusters
+    gaps = scheduler.identify_pat_gaps()
+    open_nights = [i for i, cal_day in enumerate(calendar) if cal_day.shifts["s4"] is None]
+    assert [scheduler.date_to_index[day] + offset for day, size in gaps for offset in range(size)] == open_nights
+    assert not set(scheduler.rank_doctors_for_4cluster(calendar[:3], 3, k=20)) & set(doctors[:2])
+
+def test_night_specialists_all_reach_min_shifts():
+    for seed in range(12):
+        doctors = generate_roster(20, 2024, 3, seed=seed, night_specialists=2)
+        calendar = [CalDay(date(2024, 3, day)) for day in range(1, 32)]
+        scheduler = Scheduler(doctors, calendar, interactive=False)
+        scheduler.schedule_pat()
+        for specialist in doctors[:2]:
+            assert specialist.min_shifts <= specialist.total_shifts <= specialist.max_shifts, seed
+            assert len(pat_clusters(calendar, specialist)) * 4 >= specialist.total_shifts
+
+
+def test_night_specialist_plan_is_as_cheap_as_the_full_search():
+    for seed in range(4):
+        doctors = generate_roster(20, 2024, 3, seed=seed, night_specialists=2)
+        calendar = [CalDay(date(2024, 3, day)) for day in range(1, 32)]
+        scheduler = Scheduler(doctors, calendar, interactive=False)
+        scheduler.build_free_runs()
+        specialists = scheduler.night_specialists
+
+        full_cost, _ = scheduler.search_night_specialists(specialists, {})
+        beam_cost, _ = scheduler.search_night_specialists(specialists, {}, beam_width=PAT_PLAN_BEAM_WIDTH)
+        bounded_cost, _ = scheduler.search_night_specialists(specialists, {}, cost_to_beat=beam_cost)
+        assert min(beam_cost, bounded_cost if bounded_cost is not None else beam_cost) == full_cost, seed
+
+def test_night_specialist_shortfall_is_reported(capsys):
+    # Three specialists who each need 12 of March's 31 nights can't all get them
+    doctors = generate_roster(20, 2024, 3, seed=0, night_specialists=3)
+    calendar = [CalDay(date(2024, 3, day)) for day in range(1, 32)]
+    instrumentation = Instrumentation()
+    scheduler = Scheduler(doctors, calendar, interactive=False, instrumentation=instrumentation)
+    scheduler.schedule_pat()
+
+    short = [doc for doc in doctors[:3] if doc.total_shifts < doc.min_shifts]
+    assert short
+    output = capsys.readouterr().out
+    events = [event for event in instrumentation.events if event["event"] == "night_specialist_shortfall"]
+    assert [event["doctor"] for event in events] == [doc.name for doc in short]
+    assert all(f"WARNING: {doc.name} is scheduled for {doc.total_shifts} night shifts" in output for doc in short)
+
 
 if __name__ == "__main__":
     run_test()
@@ -0,0 +1,42 @@
+from models import Doctor, CalDay
+from scheduler import Scheduler
+from solver import ScheduleModel
+from scoring import score_schedule
+from test_solver import setup_test_environment
+from datetime import date
+
+
+def test_score_metrics_on_a_small_schedule():
+    first = Doctor("First", set(), [5, 3, 1, 4], 4, 5, False, "Full Time")
+    second = Doctor("Second", set(), [1, 1, 1, 5], 1, 2, False, "Full Time")
+    second.previous_month_shifts = [(date(2024, 1, 31), 4)]
+    calendar = [CalDay(date(2024, 2, day)) for day in range(1, 8)]  # Thu Feb 1 - Wed Feb 7
+    for day in (0, 1, 2, 5):
+        calendar[day].assign_shift("s1", first)
+    calendar[3].assign_shift("s2", first)  # Sunday, making a run of four days
+    calendar[0].assign_shift("s4", second)  # joins the previous month's night, so not a singleton
+    calendar[4].assign_shift("s4", second)  # a singleton
+    calendar[6].assign_shift("s4", second)  # a singleton, and one shift over max
+
+    score = score_schedule(calendar, [first, second], ["s1", "s4"])
+
+    assert score.total_shifts.tolist() == [5, 3]
+    assert score.night_shifts.tolist() == [0, 3]
+    assert score.weekend_shifts.tolist() == [2, 0]
+    assert score.min_shortfall.tolist() == [0, 0]
+    assert score.max_excess.tolist() == [0, 1]
+    assert score.longest_run.tolist() == [4, 1]
+    assert score.doctor_report()[0]["runs"] == {4: 1, 1: 1}
+    assert score.shift4_singletons.tolist() == [0, 2]
+    assert score.unfilled == {"s1": 3, "s4": 4}
+    assert score.preference_points.tolist() == [23, 15]
+
+
+def test_total_cost_matches_the_search_objective():
+    doctors, calendar = setup_test_environment()
+    scheduler = Scheduler(doctors, calendar)
+    scheduler.solve(num_shifts=4, mode="cp", time_limit=0.2)
+
+    score = score_schedule(calendar, doctors)
+    assert score.total_cost == ScheduleModel(scheduler).total_cost()
+    assert score.total_shifts.tolist() == [doc.total_shifts for doc in doctors]
@@ -0,0 +1,51 @@
+import pytest
+from models import CalDay
+from scheduler import Scheduler
+from test_solver import setup_test_environment
+from test_transactions import snapshot as state, assert_same_state
+
+
+def names(calendar):
+    return [{shift: doc and doc.name for shift, doc in cal_day.shifts.items()} for cal_day in calendar]
+
+
+def test_branches_from_a_common_prefix():
+    doctors, calendar = setup_test_environment()
+    scheduler = Scheduler(doctors, calendar, interactive=False)
+    scheduler.initialize_consecutive_shifts_from_previous_month()
+    scheduler.schedule_pat()
+    scheduler.schedule_remaining_shift4()
+    nights = scheduler.snapshot()
+    before = state(scheduler)
+
+    scheduler.schedule_remaining_shifts(4)
+    four_shifts = scheduler.snapshot()
+    scheduler.restore(nights)
+    assert_same_state(before, state(scheduler))
+
+    scheduler.schedule_remaining_shifts(3)
+    three_shifts = scheduler.snapshot()
+    changed = {(day, shift) for day, shift, mine, theirs in four_shifts.diff(three_shifts)}
+    assert {shift for day, shift in changed} >= {"s2"}
+    assert all(shift != "s4" for day, shift in changed)
+
+    # The four-shift branch matches a run that never branched
+    scheduler.restore(four_shifts)
+    doctors, fresh = setup_test_environment()
+    Scheduler(doctors, fresh, interactive=False).solve(num_shifts=4)
+    assert names(calendar) == names(fresh)
+    assert [doc.total_shifts for doc in scheduler.doctors] == [doc.total_shifts for doc in doctors]
+
+    # Snapshots stay frozen when their calendars are edited
+    copy = three_shifts.calendar()
+    copy[0].shifts["s1"] = None
+    assert three_shifts.doctor_on(0, "s1") is not None
+    assert names(three_shifts.calendar()) != names(copy)
+
+
+def test_restore_rejects_another_calendar():
+    doctors, calendar = setup_test_environment()
+    scheduler = Scheduler(doctors, calendar, interactive=False)
+    other = Scheduler(doctors, [CalDay(cal_day.date) for cal_day in calendar[:10]], interactive=False)
+    with pytest.raises(ValueError):
+        scheduler.restore(other.snapshot())
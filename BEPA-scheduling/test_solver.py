@@ -0,0 +1,80 @@
+from models import Doctor, CalDay
+from scheduler import Scheduler
+from datetime import date, timedelta
+
+
+def setup_test_environment():
+    pat = Doctor(
+        name="PAT",
+        days_off={date(2024, 1, day) for day in range(10, 16)},
+        shift_prefs=[0, 0, 0, 5],
+        min_shifts=10,
+        max_shifts=14,
+        flip_shifts=False,
+        doc_type="Nocturnist",
+    )
+    pat.previous_month_shifts = [(date(2023, 12, 30), 4), (date(2023, 12, 31), 4)]
+
+    doctors = [pat]
+    for i in range(12):
+        doctor = Doctor(
+            name=f"Doctor {i}",
+            days_off={date(2024, 1, (i * 3) % 28 + 1), date(2024, 1, (i * 5) % 28 + 2)},
+            shift_prefs=[1 + i % 5, 1 + (i + 1) % 5, 1 + (i + 2) % 5, i % 4],
+            min_shifts=6,
+            max_shifts=12,
+            flip_shifts=False,
+            doc_type="Full Time",
+        )
+        doctors.append(doctor)
+    doctors[1].previous_month_shifts = [(date(2023, 12, 29), 4)]
+
+    calendar = [CalDay(date(2024, 1, day)) for day in range(1, 32)]
+    return doctors, calendar
+
+
+def assert_hard_rules(doctors, calendar):
+    for doctor in doctors:
+        worked = {cal_day.date: shift for cal_day in calendar for shift, doc in cal_day.shifts.items() if doc is doctor}
+        assert len(worked) == sum(1 for cal_day in calendar for doc in cal_day.shifts.values() if doc is doctor)
+        assert len(worked) <= doctor.max_shifts
+        assert not set(worked) & doctor.days_off
+
+        run = 0
+        for cal_day in calendar:
+            shift = worked.get(cal_day.date)
+            run = run + 1 if shift else 0
+            assert run <= 5
+            yesterday = worked.get(cal_day.date - timedelta(days=1))
+            two_days_ago = worked.get(cal_day.date - timedelta(days=2))
+            if shift == "s1":
+                assert yesterday not in ("s2", "s3")
+            if shift == "s2":
+                assert yesterday != "s3"
+            if shift in ("s1", "s2", "s3"):
+                assert "s4" not in (yesterday, two_days_ago)
+
+
+def test_cp_mode_respects_hard_rules():
+    doctors, calendar = setup_test_environment()
+    scheduler = Scheduler(doctors, calendar)
+    scheduler.solve(num_shifts=4, mode="cp", time_limit=0.5)
+
+    assert_hard_rules(doctors, calendar)
+    unfilled = sum(1 for cal_day in calendar for doc in cal_day.shifts.values() if doc is None)
+    assert unfilled == 0
+
+
+def test_improve_schedule_keeps_counters_and_rules():
+    doctors, calendar = setup_test_environment()
+    scheduler = Scheduler(doctors, calendar)
+    scheduler.solve(num_shifts=4, mode="cp", time_limit=0.2)
+    shortfall_before = sum(max(0, doc.min_shifts - doc.total_shifts) for doc in doctors)
+
+    scheduler.improve_schedule(time_limit=0.5, seed=1)
+
+    assert_hard_rules(doctors, calendar)
+    for doctor in doctors:
+        worked = sum(1 for cal_day in calendar for doc in cal_day.shifts.values() if doc is doctor)
+        assert doctor.total_shifts == worked
+    assert sum(max(0, doc.min_shifts - doc.total_shifts) for doc in doctors) <= shortfall_before
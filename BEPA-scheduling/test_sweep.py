@@ -0,0 +1,30 @@
+import pytest
+from sweep import sweep, scenario_grid, run_scenario
+from test_solver import setup_test_environment
+
+
+def test_sweep_returns_best_schedules_without_touching_inputs():
+    doctors, _ = setup_test_environment()
+    prefs = [list(doc.shift_prefs) for doc in doctors]
+    grid = scenario_grid(num_shifts=(3, 4), pat_cluster_sizes=(3, 4), seeds=(None, 1), preference_noise=(0, 1))
+
+    best = sweep(doctors, 2024, 1, grid, k=3, max_workers=2)
+
+    assert len(grid) == 16
+    assert len(best) == 3
+    assert [result.cost for result in best] == sorted(result.cost for result in best)
+    assert all(len(result.schedule) == 31 for result in best)
+    assert [result.cost for result in sweep(doctors, 2024, 1, grid, k=3, max_workers=1)] == [result.cost for result in best]
+    assert [doc.shift_prefs for doc in doctors] == prefs
+    assert all(doc.total_shifts == 0 for doc in doctors)
+
+
+def test_pat_cluster_sizes_outside_the_planner_range_are_rejected():
+    doctors, _ = setup_test_environment()
+    for size in (2, 5):
+        with pytest.raises(ValueError):
+            scenario_grid(pat_cluster_sizes=(3, size))
+    variant = scenario_grid()[0]
+    variant["pat_max_cluster"] = 6
+    with pytest.raises(ValueError):
+        run_scenario(doctors, 2024, 1, variant)
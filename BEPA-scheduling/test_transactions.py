@@ -0,0 +1,121 @@
+import numpy as np
+from scheduler import Scheduler
+from test_solver import setup_test_environment
+
+
+def snapshot(scheduler):
+    return (
+        [dict(cal_day.shifts) for cal_day in scheduler.calendar],
+        [(doc.total_shifts, doc.night_shifts, doc.weekend_shifts, doc.consecutive_shifts, doc.last_shift_date)
+         for doc in scheduler.doctors],
+        {doc: (dict(ledger.shifts), {day: tuple(run) for day, run in ledger.runs.items()})
+         for doc, ledger in scheduler.ledgers.items() if ledger.shifts},
+        scheduler.assigned_mask.copy(),
+        scheduler.consecutive_counts.copy(),
+        set(scheduler.doctors_on_run),
+        scheduler.last_doctor_shift4,
+    )
+
+
+def assert_same_state(before, after):
+    assert before[:3] == after[:3]
+    assert np.array_equal(before[3], after[3]) and np.array_equal(before[4], after[4])
+    assert before[5:] == after[5:]
+
+
+def test_rollback_restores_everything():
+    doctors, calendar = setup_test_environment()
+    scheduler = Scheduler(doctors, calendar, interactive=False)
+    scheduler.initialize_consecutive_shifts_from_previous_month()
+    scheduler.schedule_pat()
+    scheduler.schedule_remaining_shift4()
+    before = snapshot(scheduler)
+
+    savepoint = scheduler.savepoint()
+    scheduler.schedule_remaining_shifts(4)
+    inner = scheduler.savepoint()
+    removed = scheduler.unassign_shift(calendar[10], "s2")
+    assert removed is not None and calendar[10].shifts["s2"] is None
+    assert not scheduler.ledgers[removed].worked_shift(calendar[10].date, "s2")
+
+    scheduler.rollback(inner)
+    assert calendar[10].shifts["s2"] is removed
+    scheduler.rollback(savepoint)
+    assert_same_state(before, snapshot(scheduler))
+
+    # Re-running after the rollback gives the same schedule as a fresh run
+    scheduler.commit()
+    scheduler.schedule_remaining_shifts(4)
+    doctors, fresh = setup_test_environment()
+    fresh_scheduler = Scheduler(doctors, fresh, interactive=False)
+    fresh_scheduler.solve(num_shifts=4)
+    assert [{s: d and d.name for s, d in day.shifts.items()} for day in calendar] == \
+        [{s: d and d.name for s, d in day.shifts.items()} for day in fresh]
+
+
+def test_unassign_matches_a_schedule_without_the_shift():
+    doctors, calendar = setup_test_environment()
+    scheduler = Scheduler(doctors, calendar, interactive=False)
+    scheduler.solve(num_shifts=4)
+    cal_day = calendar[15]
+    doctor = scheduler.unassign_shift(cal_day, "s1")
+
+    counts = (doctor.total_shifts, doctor.night_shifts, doctor.weekend_shifts)
+    ledger_runs = dict(scheduler.ledgers[doctor].runs)
+    scheduler.sync_with_calendar()
+    assert counts[0] == sum(1 for day in calendar for doc in day.shifts.values() if doc is doctor)
+    assert ledger_runs == scheduler.ledgers[doctor].runs
+    assert scheduler.unassign_shift(cal_day, "s1") is None
+
+
+def test_rollback_restores_consecutive_counts_from_the_previous_month():
+    doctors, calendar = setup_test_environment()
+    scheduler = Scheduler(doctors, calendar, interactive=False)
+    before = snapshot(scheduler)
+
+    savepoint = scheduler.savepoint()
+    scheduler.initialize_consecutive_shifts_from_previous_month()
+    assert scheduler.doctors_on_run and scheduler.consecutive_counts.any()
+    scheduler.rollback(savepoint)
+    assert_same_state(before, snapshot(scheduler))
+
+    # Rolling back a re-initialization mid-schedule puts back the counts the schedule had reached
+    scheduler.initialize_consecutive_shifts_from_previous_month()
+    scheduler.schedule_remaining_shifts(4)
+    before = snapshot(scheduler)
+    savepoint = scheduler.savepoint()
+    scheduler.initialize_consecutive_shifts_from_previous_month()
+    scheduler.rollback(savepoint)
+    assert_same_state(before, snapshot(scheduler))
+
+
+def test_rollback_restores_the_last_shift4_doctor():
+    doctors, calendar = setup_test_environment()
+    scheduler = Scheduler(doctors, calendar, interactive=False)
+    scheduler.schedule_pat()
+    before = snapshot(scheduler)
+
+    savepoint = scheduler.savepoint()
+    scheduler.schedule_remaining_shift4()
+    assert scheduler.last_doctor_shift4 is not before[6]
+    scheduler.rollback(savepoint)
+    assert_same_state(before, snapshot(scheduler))
+
+
+def test_committing_an_inner_savepoint_keeps_the_outer_one_open():
+    doctors, calendar = setup_test_environment()
+    scheduler = Scheduler(doctors, calendar, interactive=False)
+    scheduler.schedule_pat()
+    before = snapshot(scheduler)
+
+    outer = scheduler.savepoint()
+    scheduler.schedule_remaining_shift4()
+    inner = scheduler.savepoint()
+    scheduler.schedule_remaining_shifts(4)
+    scheduler.commit(inner)
+    assert scheduler.undo_log is not None
+
+    scheduler.rollback(outer)
+    assert_same_state(before, snapshot(scheduler))
+    scheduler.commit(outer)
+    assert scheduler.undo_log is None
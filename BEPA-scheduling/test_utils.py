@@ -0,0 +1,143 @@
+import openpyxl
+import pytest
+from datetime import date
+import main
+from main import run_schedule
+from models import Doctor, CalDay
+from utils import (
+    load_workbook_inputs, load_month_and_year, load_doctor_inputs, load_shifts_requested_off,
+    load_previous_month_shifts, clear_scheduled_shifts, write_scheduled_shifts,
+)
+
+
+def setup_test_workbook(path):
+    workbook = openpyxl.Workbook()
+    color = workbook.active
+    color.title = "Color"
+    color["L2"] = 2
+    color["L3"] = 2024
+    color["C5"] = "ABC"  # s1 on the first Monday row
+    color["C8"] = "PAT"  # s4 on the same day
+
+    inputs = workbook.create_sheet("Doctor Inputs")
+    inputs.append(["Name", None, "Doc Type", None, None, "Min,Max", "Prefs", "Flip"])
+    inputs.append(["ABC", None, "Full Time", None, None, "4,10", "3,2,1,0", None])
+    inputs.append(["PAT", None, "Nocturnist", None, None, "10,14", "0,0,0,5", None])
+    inputs.append(["XYZ", None, "Part Time", None, None, "2,5", "1,1,1,1", "Yes"])
+
+    worksheet = workbook.create_sheet("Scheduling Worksheet")
+    worksheet.append(["Name", "Jan 28", "Jan 29", "Jan 30", "Jan 31"] + list(range(1, 30)))
+    abc_days = [None] * 29
+    abc_days[2] = 1  # requested Feb 3 off
+    worksheet.append(["ABC", None, 2, 3.0, None] + abc_days)
+    worksheet.append(["PAT", None, None, 4, 4] + [0] * 29)
+    xyz_days = [None] * 29
+    xyz_days[9] = 1  # only available on Feb 10 (flipped)
+    worksheet.append(["XYZ", "x", None, None, 1] + xyz_days)
+
+    workbook.save(path)
+
+
+def test_openpyxl_engine_loads_inputs(tmp_path):
+    path = str(tmp_path / "schedule.xlsx")
+    setup_test_workbook(path)
+
+    inputs = load_workbook_inputs(path, engine="openpyxl")
+    month, year = load_month_and_year(inputs)
+    doctors = load_doctor_inputs(inputs)
+    days_off = load_shifts_requested_off(inputs, doctors, month, year)
+    load_previous_month_shifts(inputs, doctors, month, year)
+    abc, pat, xyz = doctors
+
+    assert (month, year) == (2, 2024)
+    assert [doc.name for doc in doctors] == ["ABC", "PAT", "XYZ"]
+    assert abc.days_off == {date(2024, 2, 3)}
+    assert pat.days_off == set()
+    assert xyz.days_off == {date(2024, 2, day) for day in range(1, 30)} - {date(2024, 2, 10)}
+    assert days_off.shape == (3, 29)
+    assert days_off.sum(axis=1).tolist() == [1, 0, 28]
+    assert abc.previous_month_shifts == [(date(2024, 1, 29), 2), (date(2024, 1, 30), 3)]
+    assert pat.previous_month_shifts == [(date(2024, 1, 30), 4), (date(2024, 1, 31), 4)]
+    assert xyz.previous_month_shifts == [(date(2024, 1, 31), 1)]
+
+
+def test_openpyxl_engine_rejects_formulas_without_saved_results(tmp_path):
+    path = str(tmp_path / "schedule.xlsx")
+    setup_test_workbook(path)
+    workbook = openpyxl.load_workbook(path)
+    workbook["Scheduling Worksheet"]["F2"] = "=1"  # saved by openpyxl, so no result Excel could read back
+    workbook.save(path)
+
+    with pytest.raises(ValueError, match="F2"):
+        load_workbook_inputs(path, engine="openpyxl")
+
+
+def test_openpyxl_engine_ignores_formulas_it_never_reads(tmp_path):
+    path = str(tmp_path / "schedule.xlsx")
+    setup_test_workbook(path)
+    workbook = openpyxl.load_workbook(path)
+    workbook["Color"]["N20"] = "=1+1"
+    workbook["Doctor Inputs"]["D2"] = "=1+1"
+    workbook.save(path)
+
+    inputs = load_workbook_inputs(path, engine="openpyxl")
+    assert load_month_and_year(inputs) == (2, 2024)
+    sheet = openpyxl.load_workbook(path, read_only=True, data_only=True)["Doctor Inputs"]
+    assert inputs.doctor_input_rows == list(sheet.iter_rows(min_row=2, values_only=True))
+
+
+def test_openpyxl_engine_never_saves_over_the_input(tmp_path):
+    path = str(tmp_path / "schedule.xlsx")
+    output_path = str(tmp_path / "output.xlsx")
+    setup_test_workbook(path)
+
+    with pytest.raises(ValueError, match="output_path"):
+        run_schedule(path, new_schedule=True, num_shifts=3, interactive=False, engine="openpyxl")
+    assert openpyxl.load_workbook(path)["Color"]["C5"].value == "ABC"
+
+    calendar = run_schedule(path, new_schedule=True, num_shifts=3, interactive=False, engine="openpyxl",
+                            output_path=output_path)
+    assert len(calendar) == 29
+    assert openpyxl.load_workbook(path)["Color"]["C5"].value == "ABC"
+    assert load_workbook_inputs(path, engine="openpyxl").scheduling_rows
+
+
+def test_batch_run_writes_the_schedule_once(tmp_path, monkeypatch):
+    path = str(tmp_path / "schedule.xlsx")
+    output_path = str(tmp_path / "output.xlsx")
+    setup_test_workbook(path)
+    writes = []
+    monkeypatch.setattr(main, "write_scheduled_shifts", lambda *args, **kwargs: writes.append((args, kwargs)))
+
+    run_schedule(path, new_schedule=True, num_shifts=3, interactive=False, engine="openpyxl", output_path=output_path)
+    assert len(writes) == 1
+
+
+def test_openpyxl_engine_clears_day_shifts_only(tmp_path):
+    path = str(tmp_path / "schedule.xlsx")
+    setup_test_workbook(path)
+
+    clear_scheduled_shifts(path, engine="openpyxl")
+
+    color = openpyxl.load_workbook(path)["Color"]
+    assert color["C5"].value is None
+    assert color["C8"].value == "PAT"
+    assert color["L2"].value == 2
+
+
+def test_write_scheduled_shifts_only_writes_changes(tmp_path):
+    path = str(tmp_path / "schedule.xlsx")
+    output_path = str(tmp_path / "output.xlsx")
+    setup_test_workbook(path)
+    doctors = [Doctor(name, set(), [1, 1, 1, 1], 0, 10, False, "Full Time") for name in ("ABC", "PAT")]
+    calendar = [CalDay(date(2024, 2, day)) for day in range(1, 30)]
+    calendar[4].assign_shift("s1", doctors[0])  # Monday Feb 5 -> C12
+    calendar[4].assign_shift("s4", doctors[1])  # C15
+    calendar[28].assign_shift("s2", doctors[0])  # Thursday Feb 29 -> F34
+
+    assert write_scheduled_shifts(path, calendar, 2, 2024, output_path=output_path) == 3
+    assert openpyxl.load_workbook(path)["Color"]["C12"].value is None
+
+    color = openpyxl.load_workbook(output_path)["Color"]
+    assert (color["C12"].value, color["C15"].value, color["F34"].value) == ("ABC", "PAT", "ABC")
+    assert write_scheduled_shifts(output_path, calendar, 2, 2024) == 0
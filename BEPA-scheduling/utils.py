@@ -1,13 +1,24 @@
 from models import *
 import pandas as pd
+import numpy as np
 import openpyxl
+from openpyxl.utils import get_column_letter
+from openpyxl.worksheet._reader import WorkSheetParser, FORMULA_TAG
 from columnar import columnar
 import calendar
 from calendar import monthrange
 import subprocess
 import platform
 import os
-import xlwings as xw
+try:
+    import xlwings as xw  # drives a live Excel instance (Windows / macOS only)
+except ImportError:
+    xw = None
+
+# Read and clear the workbook through Excel where it is available, otherwise straight from the file
+DEFAULT_EXCEL_ENGINE = "xlwings" if xw is not None and platform.system() in ("Windows", "Darwin") else "openpyxl"
+
+DOCTOR_INPUT_COLUMNS = (1, 3, 6, 7, 8)  # "Doctor Inputs" columns load_doctor_inputs reads: name, type, min/max, prefs, flip
 
 def print_calendar(calendar):
     """
@@ -68,42 +79,192 @@ def print_calendar(calendar):
         # Add a blank line between weeks
         print("\n")
 
-def load_month_and_year(filepath):
+class WorkbookInputs:
+    def __init__(self, filepath):
+        """
+        In-memory copy of everything the scheduler reads from the Excel workbook.
+
+        Built once by load_workbook_inputs and handed to every loader, so a run parses the
+        workbook a single time instead of once per loader.
+
+        Args:
+            filepath (str): Path to the Excel file the inputs were read from.
+        """
+        self.filepath = filepath
+        self.color_rows = []           # values of the "Color" sheet, one tuple per row
+        self.doctor_input_rows = []    # values of the "Doctor Inputs" sheet below the header row
+        self.scheduling_rows = []      # live values of the "Scheduling Worksheet" used range
+
+    def color_cell(self, row, column):
+        """
+        Returns:
+            The value of a "Color" sheet cell (1-based row and column, as in Excel), or None if it is empty.
+        """
+        if row > len(self.color_rows) or column > len(self.color_rows[row - 1]):
+            return None
+        return self.color_rows[row - 1][column - 1]
+
+def load_workbook_inputs(filepath, engine=None):
     """
-    Load the month and year for scheduling from the "Color" sheet in the Excel file.
+    Read every sheet the scheduler needs from the Excel file in a single pass.
+
+    The "Scheduling Worksheet" is full of formulas. The "xlwings" engine asks a running Excel for their live
+    values; the "openpyxl" engine reads the values Excel cached in the file the last time it was saved, so it
+    needs no Excel at all but only sees formula results if the workbook was last saved by Excel.
 
     Args:
         filepath (str): Path to the Excel file.
+        engine (str): "xlwings" or "openpyxl" (defaults to DEFAULT_EXCEL_ENGINE).
+
+    Returns:
+        WorkbookInputs: The workbook contents, ready for the load_* functions.
+
+    Raises:
+        ValueError: With the "openpyxl" engine, if a formula in a cell the loaders read has no saved result.
+    """
+    engine = engine or DEFAULT_EXCEL_ENGINE
+    if engine not in ("xlwings", "openpyxl"):
+        raise ValueError(f"Unknown Excel engine {engine!r}, expected 'xlwings' or 'openpyxl'")
+
+    inputs = WorkbookInputs(filepath)
+
+    if engine == "xlwings":
+        # Everything comes through the one workbook Excel has open, with live calculation
+        sheets = xw.Book(filepath).sheets
+        inputs.color_rows = sheet_values_from_a1(sheets["Color"])
+        inputs.doctor_input_rows = sheet_values_from_a1(sheets["Doctor Inputs"])[1:]
+        inputs.scheduling_rows = sheets["Scheduling Worksheet"].used_range.value
+        return inputs
+
+    workbook = openpyxl.load_workbook(filepath, read_only=True, data_only=True)
+    inputs.color_rows, color_missing = read_sheet(workbook, "Color")
+    doctor_rows, doctor_missing = read_sheet(workbook, "Doctor Inputs")
+    inputs.doctor_input_rows = doctor_rows[1:]
+    scheduling_rows, scheduling_missing = read_sheet(workbook, "Scheduling Worksheet")
+    inputs.scheduling_rows = used_range_values(scheduling_rows)
+    workbook.close()
+
+    # Formulas openpyxl saved can't be read back, so refuse them in the cells the loaders use
+    needed = [
+        ("Color", color_missing & {(2, 12), (3, 12)}),  # month and year
+        ("Doctor Inputs", {(row, column) for row, column in doctor_missing if row > 1 and column in DOCTOR_INPUT_COLUMNS}),
+        ("Scheduling Worksheet", scheduling_missing),
+    ]
+    for sheet_name, cells in needed:
+        if cells:
+            row, column = min(cells)
+            raise ValueError(
+                f"{filepath}: the formula in '{sheet_name}'!{get_column_letter(column)}{row} has no saved result. "
+                "openpyxl can't calculate formulas; open the workbook in Excel and save it first"
+            )
+    return inputs
+
+def sheet_values_from_a1(sheet):
+    """
+    Returns:
+        list: The values of an xlwings sheet from cell A1 to the end of its used range, one list per row.
+    """
+    return sheet.range("A1", sheet.used_range.last_cell).options(ndim=2).value
+
+class SavedResultParser(WorkSheetParser):
+    def __init__(self, *args, **kwargs):
+        """
+        openpyxl worksheet parser that reads the values Excel saved (as data_only=True does) and also notes
+        every formula that has no saved result, so a single pass over the sheet gives both.
+        """
+        super().__init__(*args, data_only=True, **kwargs)
+        self.missing_results = set()  # (row, column) of formulas saved without a result
+
+    def parse_cell(self, element):
+        cell = super().parse_cell(element)
+        # Excel saves an empty text result as a string, so only formulas with no result at all are noted
+        if cell["value"] is None and cell["data_type"] == "n" and element.find(FORMULA_TAG) is not None:
+            self.missing_results.add((cell["row"], cell["column"]))
+        return cell
+
+def read_sheet(workbook, sheet_name):
+    """
+    Read the saved values of a sheet of a read-only workbook in one pass.
+
+    Args:
+        workbook: Workbook opened with openpyxl.load_workbook(read_only=True).
+        sheet_name (str): Name of the sheet to read.
+
+    Returns:
+        tuple: (rows, missing_results) - the values as one tuple per row starting from cell A1, as
+            iter_rows(values_only=True) gives them, and the (row, column) of every formula with no saved result.
+    """
+    sheet = workbook[sheet_name]
+    with sheet._get_source() as source:
+        parser = SavedResultParser(source, sheet._shared_strings, epoch=workbook.epoch,
+                                   date_formats=workbook._date_formats, timedelta_formats=workbook._timedelta_formats)
+        cells = {(cell["row"], cell["column"]): cell["value"] for _, row in parser.parse() for cell in row}
+
+    num_rows = max((row for row, column in cells), default=0)
+    num_columns = max([column for row, column in cells] + [sheet.max_column or 0])
+    rows = [tuple(cells.get((row, column)) for column in range(1, num_columns + 1)) for row in range(1, num_rows + 1)]
+    return rows, parser.missing_results
+
+def used_range_values(rows):
+    """
+    Trim the empty rows and columns around a sheet's values, matching what Excel reports as the used range.
+
+    Args:
+        rows (iterable): Row tuples of cell values, starting from cell A1.
+
+    Returns:
+        list: Equal-length lists of cell values, one per row of the used range.
+    """
+    rows = [list(row) for row in rows]
+    filled_rows = [i for i, row in enumerate(rows) if any(value is not None for value in row)]
+    if not filled_rows:
+        return []
+    rows = rows[filled_rows[0]:filled_rows[-1] + 1]
+
+    width = max(len(row) for row in rows)
+    rows = [row + [None] * (width - len(row)) for row in rows]
+    filled_columns = [j for j in range(width) if any(row[j] is not None for row in rows)]
+    return [row[filled_columns[0]:filled_columns[-1] + 1] for row in rows]
+
+def as_workbook_inputs(source):
+    """
+    Returns:
+        WorkbookInputs: source itself if it is already loaded, otherwise the inputs read from the path it names.
+    """
+    return source if isinstance(source, WorkbookInputs) else load_workbook_inputs(source)
+
+def load_month_and_year(inputs):
+    """
+    Load the month and year for scheduling from the "Color" sheet in the Excel file.
+
+    Args:
+        inputs (WorkbookInputs or str): Loaded workbook inputs, or the path to the Excel file.
 
     Returns:
         tuple: (month, year) as integers.
     """
-    # Load the "Color" sheet
-    color_sheet = pd.read_excel(filepath, sheet_name="Color", header=None)
-    
-    # Month is in cell L2 (row 1, column 11 in zero-based indexing)
-    month = int(color_sheet.iloc[1, 11])
-    
-    # Year is in cell L3 (row 2, column 11 in zero-based indexing)
-    year = int(color_sheet.iloc[2, 11])
-    
+    inputs = as_workbook_inputs(inputs)
+
+    # Month is in cell L2, year is in cell L3
+    month = int(inputs.color_cell(2, 12))
+    year = int(inputs.color_cell(3, 12))
+
     return month, year
 
-def load_doctor_inputs(filepath):
+def load_doctor_inputs(inputs):
     """
     Load doctor inputs from the Excel file and initialize Doctor objects.
 
     Args:
-        filepath (str): Path to the Excel file.
+        inputs (WorkbookInputs or str): Loaded workbook inputs, or the path to the Excel file.
 
     Returns:
         list: List of Doctor objects.
     """
-    workbook = openpyxl.load_workbook(filepath)
-    worksheet = workbook["Doctor Inputs"]
+    inputs = as_workbook_inputs(inputs)
 
     doctors = []
-    for row in worksheet.iter_rows(min_row=2, values_only=True):
+    for row in inputs.doctor_input_rows:
         if not row[0]:  # Skip rows without a name
             continue
 
@@ -127,54 +288,70 @@ def load_doctor_inputs(filepath):
 
     return doctors
 
-def load_shifts_requested_off(filepath, doctors, schedule_month, schedule_year):
+def index_doctor_rows(names):
+    """
+    Map each name in the worksheet's name column to the first row it appears on.
+
+    Args:
+        names (iterable): The name column of the Scheduling Worksheet.
+
+    Returns:
+        dict: Name -> row index.
+    """
+    row_index = {}
+    for row, name in enumerate(names):
+        row_index.setdefault(name, row)
+    return row_index
+
+def load_shifts_requested_off(inputs, doctors, schedule_month, schedule_year):
     """
     Load shifts requested off and update the days_off attribute for each Doctor.
 
+    The whole day grid of the Scheduling Worksheet is parsed at once into a (doctors x days) bitmap.
+    Doctors with flip_shifts list the days they can work instead of the days they can't, so their
+    rows are inverted.
+
     Args:
-        filepath (str): Path to the Excel file.
+        inputs (WorkbookInputs or str): Loaded workbook inputs, or the path to the Excel file.
         doctors (list): List of Doctor objects.
         schedule_month (int): The month of the schedule (1-12).
         schedule_year (int): The year of the schedule.
+
+    Returns:
+        numpy.ndarray: Boolean (doctors x days) bitmap of the days off, in the order of doctors.
     """
-    wb = xw.Book(filepath)
-    sheet = wb.sheets["Scheduling Worksheet"]
-    df = sheet.used_range.value  # Read with live calculation
-    worksheet = pd.DataFrame(df)
+    worksheet = pd.DataFrame(as_workbook_inputs(inputs).scheduling_rows)
 
     # Calculate the number of days in the given month
     num_days = calendar.monthrange(schedule_year, schedule_month)[1]
+    month_days = [date(schedule_year, schedule_month, day) for day in range(1, num_days + 1)]
 
-    for doctor in doctors:
-        doctor_row = worksheet[worksheet[0] == doctor.name]
-        if doctor_row.empty:
-            continue
-
-        flip_shifts = doctor.flip_shifts
-        days_off = []
+    # Columns start at 5 for the 1st day; blanks and zeros mean no request
+    values = worksheet.iloc[:, 5:5 + num_days].to_numpy(dtype=object)
+    requested = ~(pd.isna(values) | (values == 0))
 
-        # Loop through only the actual days in the month
-        for col_idx in range(5, 5 + num_days):  # Columns start at 5 for the 1st day
-            day = col_idx - 4  # Calculate the day (1-indexed)
-            value = doctor_row.iloc[0, col_idx]
+    row_index = index_doctor_rows(worksheet[0]) if len(worksheet.columns) else {}
+    rows = np.array([row_index.get(doctor.name, -1) for doctor in doctors], dtype=int)
+    flips = np.array([bool(doctor.flip_shifts) for doctor in doctors], dtype=bool)
 
-            # Treat NaN as False
-            is_day_off = pd.isna(value) or value == 0
+    days_off = np.zeros((len(doctors), num_days), dtype=bool)
+    found = rows >= 0
+    days_off[found, :requested.shape[1]] = requested[rows[found]] ^ flips[found, None]
+    days_off[found, requested.shape[1]:] = flips[found, None]
 
-            # Adjust logic for flip_shifts and non-flip_shifts
-            if (flip_shifts and is_day_off) or (not flip_shifts and not is_day_off):
-                days_off.append(date(schedule_year, schedule_month, day))
+    for doctor_id, doctor in enumerate(doctors):
+        if found[doctor_id]:
+            doctor.days_off = {month_days[day] for day in np.flatnonzero(days_off[doctor_id])}
+        else:
+            # Doctors missing from the worksheet keep the days off they already had
+            days_off[doctor_id] = [day in doctor.days_off for day in month_days]
 
-        # Assign processed days_off to the doctor
-        doctor.days_off = set(days_off)
+    return days_off
 
-def load_previous_month_shifts(filepath, doctors, schedule_month, schedule_year):
+def load_previous_month_shifts(inputs, doctors, schedule_month, schedule_year):
     last_4_days = get_last_days_of_previous_month(schedule_month, schedule_year)
 
-    wb = xw.Book(filepath)
-    sheet = wb.sheets["Scheduling Worksheet"]
-    df = sheet.used_range.value  # Read with live calculation
-    worksheet = pd.DataFrame(df)
+    worksheet = pd.DataFrame(as_workbook_inputs(inputs).scheduling_rows)
 
     # Extract values and filter out invalid rows
     rows = list(worksheet.values)
@@ -237,20 +414,18 @@ def print_doctor_info(doctors):
 import openpyxl
 from datetime import datetime
 
-def write_scheduled_shifts(filepath, calendar, schedule_month, schedule_year):
+def shift_cell_updates(calendar, schedule_month, schedule_year):
     """
-    Write scheduled shifts back into the "Color" tab of the Excel file.
+    Work out which "Color" tab cell each scheduled shift goes into.
 
     Args:
-        filepath (str): Path to the Excel file.
         calendar (list): List of CalDay objects containing shift assignments.
         schedule_month (int): The month of the schedule (1-12).
         schedule_year (int): The year of the schedule.
-    """
-    # Load the workbook and "Color" sheet
-    workbook = openpyxl.load_workbook(filepath)
-    color_sheet = workbook["Color"]
 
+    Returns:
+        dict: (row, column) -> doctor name, for every filled shift.
+    """
     # Define rows corresponding to each week's dates
     date_rows = [4, 11, 18, 25, 32, 39]
 
@@ -268,7 +443,7 @@ def write_scheduled_shifts(filepath, calendar, schedule_month, schedule_year):
     }
     start_column = weekday_to_column[first_day_of_month.weekday()]
 
-    # Loop through each CalDay object in the calendar
+    updates = {}
     for cal_day in calendar:
         day_offset = (cal_day.date - first_day_of_month).days
 
@@ -282,36 +457,72 @@ def write_scheduled_shifts(filepath, calendar, schedule_month, schedule_year):
         else:
             raise ValueError(f"Invalid date {cal_day.date} for scheduling")
 
-        # Write scheduled shifts for the day
         for shift_type, doctor in cal_day.shifts.items():
             if doctor:
                 # Convert shift type (e.g., "s1", "s2") to row offset
                 shift_number = int(shift_type[1])
-                shift_row = week_base_row + shift_number
+                updates[(week_base_row + shift_number, column)] = doctor.name
+
+    return updates
 
-                # Write the doctor's name into the cell
-                cell = color_sheet.cell(row=shift_row, column=column)
-                cell.value = doctor.name
+def write_scheduled_shifts(filepath, calendar, schedule_month, schedule_year, open_file=False, output_path=None):
+    """
+    Write scheduled shifts back into the "Color" tab of the Excel file.
+
+    Only cells whose value differs from what the workbook already holds are written, and the workbook
+    is not saved at all when nothing changed. Saving drops the formula results Excel cached in the file,
+    so the openpyxl engine can't read the saved workbook until Excel has saved it again.
+
+    Args:
+        filepath (str): Path to the Excel file.
+        calendar (list): List of CalDay objects containing shift assignments.
+        schedule_month (int): The month of the schedule (1-12).
+        schedule_year (int): The year of the schedule.
+        open_file (bool): Open the written workbook in Excel afterwards.
+        output_path (str): Save to this file instead, leaving filepath untouched.
+
+    Returns:
+        int: Number of cells written.
+    """
+    updates = shift_cell_updates(calendar, schedule_month, schedule_year)
+
+    # Load the workbook and "Color" sheet
+    workbook = openpyxl.load_workbook(filepath)
+    color_sheet = workbook["Color"]
+
+    changed = {(row, column): name for (row, column), name in updates.items()
+               if color_sheet.cell(row=row, column=column).value != name}
+    for (row, column), name in changed.items():
+        color_sheet.cell(row=row, column=column).value = name
 
     # Save the workbook
-    workbook.save(filepath)
-    open_excel_file(filepath)
+    target = output_path or filepath
+    if changed or target != filepath:
+        workbook.save(target)
+    if open_file:
+        open_excel_file(target)
+    return len(changed)
 
 def read_manual_shift4_assignments(filepath, calendar, doctors, schedule_month, schedule_year, scheduler):
     """
     Read manually assigned shift 4 schedules from Excel and update the calendar.
 
     Args:
-        filepath (str): Path to the Excel file.
+        filepath (WorkbookInputs or str): Loaded workbook inputs, or the path to the Excel file to re-read
+            (e.g. after the night shifts were edited by hand).
         calendar (list): List of CalDay objects representing the schedule.
         doctors (list): List of Doctor objects.
         schedule_month (int): The month of the schedule (1-12).
         schedule_year (int): The year of the schedule.
         scheduler (Scheduler): The scheduler instance to assign shifts.
     """
-    # Load the workbook and select the "Color" sheet
-    workbook = openpyxl.load_workbook(filepath, data_only=True)
-    color_sheet = workbook["Color"]
+    # Use the already loaded "Color" sheet, or load it from the workbook
+    if isinstance(filepath, WorkbookInputs):
+        color_cell = filepath.color_cell
+    else:
+        workbook = openpyxl.load_workbook(filepath, data_only=True)
+        color_sheet = workbook["Color"]
+        color_cell = lambda row, column: color_sheet.cell(row=row, column=column).value
 
     # Define rows corresponding to each week's dates
     date_rows = [4, 11, 18, 25, 32, 39]  # Start rows for each week
@@ -328,17 +539,11 @@ def read_manual_shift4_assignments(filepath, calendar, doctors, schedule_month,
         5: 8,  # Saturday -> Column H
     }
     start_column = weekday_to_column[first_day_of_month.weekday()]
+    days_by_date = {cal_day.date: cal_day for cal_day in calendar}
 
-    # Reset shift counters before processing updated assignments
-    for doc in doctors:
-        doc.total_shifts = 0
-        doc.night_shifts = 0
-        doc.weekend_shifts = 0
-        doc.last_shift_date = datetime.min.date()
-
-    # Clear any previous Shift 4 assignments before applying new ones
+    # Clear any previous Shift 4 assignments (and the counters they added) before applying new ones
     for cal_day in calendar:
-        cal_day.shifts["s4"] = None  # Reset previous assignments
+        scheduler.unassign_shift(cal_day, "s4")
 
     # Iterate over each week
     for week_index, week_base_row in enumerate(date_rows):
@@ -355,7 +560,7 @@ def read_manual_shift4_assignments(filepath, calendar, doctors, schedule_month,
             shift_date = shift_date.date()  # Convert to datetime.date
 
             # Find corresponding calendar day
-            cal_day = next((day for day in calendar if day.date == shift_date), None)
+            cal_day = days_by_date.get(shift_date)
 
             # Debugging: Print column/row mapping
             #print(f"DEBUG: Processing {shift_date.strftime('%b %d')} | Row: {week_base_row + 4}, Column: {column} | CalDay: {cal_day}")
@@ -373,7 +578,7 @@ def read_manual_shift4_assignments(filepath, calendar, doctors, schedule_month,
             shift4_row = week_base_row + 4  # Shift 4 is always row 4 below the date row
 
             # Read doctor name from Excel
-            cell_value = color_sheet.cell(row=shift4_row, column=column).value
+            cell_value = color_cell(shift4_row, column)
 
             # Find the corresponding doctor object
             assigned_doctor = next((doc for doc in doctors if doc.name == cell_value), None)
@@ -424,15 +629,18 @@ def debug_print_doctor_shifts(doctors):
 
     print("=" * 70 + "\n")
 
-def clear_scheduled_shifts(filepath):
+def clear_scheduled_shifts(filepath, engine=None):
     """
     Clears all scheduled shifts (S1, S2, S3) from the Excel output file while keeping S4 intact.
 
+    Saving with openpyxl drops the formula results Excel cached in the file, so only clear a copy of
+    the input workbook that way (see run_schedule's output_path).
+
     Args:
         filepath (str): Path to the Excel file.
+        engine (str): "xlwings" or "openpyxl" (defaults to DEFAULT_EXCEL_ENGINE).
     """
-    wb = xw.Book(filepath)
-    sheet = wb.sheets["Color"]  # Adjust sheet name if needed
+    engine = engine or DEFAULT_EXCEL_ENGINE
 
     # Define the shift row groups: S1, S2, S3 are in these row sets, shifting down every 7 rows
     shift_row_groups = [(5, 6, 7), (12, 13, 14), (19, 20, 21), (26, 27, 28), (33, 34, 35), (40, 41, 42)]
@@ -440,10 +648,23 @@ def clear_scheduled_shifts(filepath):
     # Shift columns: B to H (Excel column 2 to 8)
     start_col, end_col = 2, 8
 
+    if engine == "openpyxl":
+        workbook = openpyxl.load_workbook(filepath)
+        sheet = workbook["Color"]
+        for s1, s2, s3 in shift_row_groups:
+            for row in [s1, s2, s3]:  # Clear only S1, S2, S3
+                for col in range(start_col, end_col + 1):
+                    sheet.cell(row=row, column=col).value = None
+        workbook.save(filepath)
+        return
+
+    wb = xw.Book(filepath)
+    sheet = wb.sheets["Color"]  # Adjust sheet name if needed
+
     # Loop through all shift row groups and clear the cells
     for s1, s2, s3 in shift_row_groups:
         for row in [s1, s2, s3]:  # Clear only S1, S2, S3
             sheet.range((row, start_col), (row, end_col)).value = None
 
     wb.save(filepath)
-    wb.close()
\ No newline at end of file
+    wb.close()